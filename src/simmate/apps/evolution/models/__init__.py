@@ -5,6 +5,7 @@
 # isort: skip_file
 
 from .steadystate_source import SteadystateSource
+from .search_individual import SearchIndividual
 from .fixed_composition import FixedCompositionSearch
 from .variable_nsites_composition import VariableNsitesCompositionSearch
 from .chemical_system import ChemicalSystemSearch
@@ -9,10 +9,12 @@ import numpy
 import pandas
 import plotly.express as plotly_express
 import plotly.graph_objects as plotly_go
+from django.db import transaction
+from django.db.models import F
 from rich.progress import track
 
 from simmate.apps.evolution import selectors as selector_module
-from simmate.apps.evolution.models import SteadystateSource
+from simmate.apps.evolution.models import SearchIndividual, SteadystateSource
 from simmate.configuration.dask import get_dask_client
 from simmate.database.base_data_types import Calculation, table_column
 from simmate.engine.execution import WorkItem
@@ -60,13 +62,8 @@ class FixedCompositionSearch(Calculation):
     # the time to sleep between file writing and steady-state checks.
     sleep_step = table_column.FloatField(null=True, blank=True)
 
-    # Loading all unique structures is an expensive operation so its only
-    # done on a cycle. This stores the list of unique ids.
-    unique_individuals_ids = table_column.JSONField(
-        default=list,
-        null=True,
-        blank=True,
-    )
+    # NOTE: which individuals are unique is stored in the SearchIndividual
+    # table (see the checked_individuals relation)
 
     # This is an optional an input for an expected structure in order to allow
     # creation of plots that show convergence vs. the expected. This is very
@@ -346,9 +343,17 @@ class FixedCompositionSearch(Calculation):
 
         # we iterate through each steady-state source and check to see how many
         # jobs are still running for it. If it's less than the target steady-state,
-        # then we need to submit more!
-        steadystate_sources_db = self.steadystate_sources.all()
+        # then we need to submit more! The counts for all sources are loaded
+        # with a single query.
+        steadystate_sources_db = SteadystateSource.with_workitem_counts(
+            self.steadystate_sources.all()
+        )
+        parameters_list = []
+        parameters_sources = []
         for source_db in steadystate_sources_db:
+            # warn the user of any workitems that failed since the last check
+            source_db.check_failed_workitems()
+
             # skip if we have a transformation but aren't ready for it yet
             if source_db.is_transformation and not ready_for_transformations:
                 continue
@@ -358,7 +363,7 @@ class FixedCompositionSearch(Calculation):
             # negative value. A value of 0 means we are at steady-state and can
             # just skip this loop.
             nflows_to_submit = max(
-                int(source_db.nsteadystate_target - source_db.nflow_runs), 0
+                int(source_db.nsteadystate_target - source_db.nworkitems_running), 0
             )
 
             if nflows_to_submit > 0:
@@ -367,28 +372,39 @@ class FixedCompositionSearch(Calculation):
                     f"'{source_db.name}'"
                 )
 
-            # disable the logs while we submit
-            logger = logging.getLogger()
-            logger.disabled = True
-
+            # Note, the structure won't be evuluated until the job actually
+            # starts. This allows our validator to have the most current
+            # information available when starting the structure creation
             for n in range(nflows_to_submit):
-                # submit the workflow for the new individual. Note, the structure
-                # won't be evuluated until the job actually starts. This allows
-                # our validator to have the most current information available
-                # when starting the structure creation
-                state = StructurePrediction__Toolkit__NewIndividual.run_cloud(
-                    search_id=self.id,
-                    steadystate_source_id=source_db.id,
+                parameters_list.append(
+                    dict(search_id=self.id, steadystate_source_id=source_db.id)
                 )
+                parameters_sources.append(source_db)
+
+        if not parameters_list:
+            return
 
-                # Attached the id to our source so we know how many
-                # associated jobs are running.
-                # NOTE: this is the WorkItem id and NOT the run_id!!!
-                source_db.workitem_ids.append(state.pk)
-                source_db.save()
+        # disable the logs while we submit
+        logger = logging.getLogger()
+        logger.disabled = True
+
+        # submit all new individuals at once (using bulk inserts)
+        states = StructurePrediction__Toolkit__NewIndividual.run_cloud_many(
+            parameters_list
+        )
+
+        # Attached the workitems to our sources so we know how many
+        # associated jobs are running.
+        SourceWorkItem = SteadystateSource.workitems.through
+        SourceWorkItem.objects.bulk_create(
+            [
+                SourceWorkItem(steadystatesource_id=source_db.id, workitem_id=state.pk)
+                for source_db, state in zip(parameters_sources, states)
+            ]
+        )
 
-            # reactivate logging
-            logger.disabled = False
+        # reactivate logging
+        logger.disabled = False
 
     # -------------------------------------------------------------------------
     # Core methods that help grab key information about the search
@@ -465,19 +481,49 @@ class FixedCompositionSearch(Calculation):
         use_cache: bool = False,
         as_queryset: bool = False,
     ):
+        """
+        Gives all unique individuals of the search, ordered by fitness.
+
+        #### Parameters
+
+        - `use_cache`:
+            whether to use the unique individuals tracked by
+            `update_unique_individuals` (a single query). Otherwise, uniqueness
+            is recomputed for the full pool, which is slow for large searches
+            but also resets the tracked individuals.
+
+        - `as_queryset`:
+            whether to return a queryset rather than toolkit structures
+        """
         # get the most-up-to-date results but is slow
         if not use_cache:
-            unique = self.validator.get_unique_from_pool()
+            validator = self.validator
+            unique = validator.get_unique_from_pool()
             # This is an expensive method as the calculation scales, so make sure
-            # we cache thes values
-            self.unique_individuals_ids = [s.database_object.id for s in unique]
-            self.save()
+            # we store these values
+            unique_ids = {s.database_object.id for s in unique}
+            with transaction.atomic():
+                self.checked_individuals.all().delete()
+                SearchIndividual.objects.bulk_create(
+                    [
+                        SearchIndividual(
+                            search=self,
+                            individual_id=source["database_id"],
+                            is_unique=source["database_id"] in unique_ids,
+                        )
+                        for source in validator.source_pool
+                    ],
+                    ignore_conflicts=True,
+                )
 
         # OPTIMIZE: this converts back to a queryset object but involves
         # another database query.
         if as_queryset or use_cache:
+            unique_ids = self.checked_individuals.filter(is_unique=True).values(
+                "individual_id"
+            )
             unique = (
-                self.individuals_completed.filter(id__in=self.unique_individuals_ids)
+                self.individuals_completed.filter(id__in=unique_ids)
                 .order_by(self.fitness_field)
                 .all()
             )
@@ -487,6 +533,85 @@ class FixedCompositionSearch(Calculation):
 
         return unique
 
+    def update_unique_individuals(self, validator=None) -> int:
+        """
+        Checks all individuals that completed since the last call and records
+        whether each is unique. New individuals are only compared to the
+        current unique individuals (rather than recomputing uniqueness for the
+        full pool), and better individuals are checked first. Returns the
+        number of new unique individuals.
+
+        #### Parameters
+
+        - `validator`:
+            the fingerprint validator of this search. Reusing a validator
+            between calls avoids rebuilding the fingerprint pool. If not given,
+            a new one is made.
+        """
+        checked_ids = self.checked_individuals.values("individual_id")
+        new_ids = list(
+            self.individuals_completed.exclude(id__in=checked_ids)
+            .order_by(self.fitness_field)
+            .values_list("id", flat=True)
+        )
+        if not new_ids:
+            return 0
+
+        validator = validator or self.validator
+        if validator.use_database:
+            validator.update_fingerprint_pool()
+
+        # The pool only grabs structures that were added since its last update,
+        # so individuals that were added before then (but completed after) can
+        # be missing. We add these to the pool here.
+        pool_ids = {source["database_id"] for source in validator.source_pool}
+        missing_ids = [i for i in new_ids if i not in pool_ids]
+        if missing_ids:
+            structures = self.individuals_completed.filter(
+                id__in=missing_ids
+            ).to_toolkit()
+            validator._add_many_to_pool(
+                validator._get_many_fingerprints(structures),
+                [structure.source for structure in structures],
+            )
+
+        fingerprints = validator.fingerprint_pool
+        rows = {
+            source["database_id"]: row
+            for row, source in enumerate(validator.source_pool)
+        }
+
+        # load the current unique individuals into their own index
+        unique_ids = self.checked_individuals.filter(is_unique=True).values_list(
+            "individual_id", flat=True
+        )
+        unique_index = validator.get_similarity_index(fingerprints.shape[1])
+        unique_index.add_many(fingerprints[[rows[i] for i in unique_ids if i in rows]])
+
+        new_entries = []
+        for individual_id in new_ids:
+            fingerprint = fingerprints[rows[individual_id]]
+            is_unique = not unique_index.has_match(
+                fingerprint, validator.distance_tolerance
+            )
+            if is_unique:
+                unique_index.add(fingerprint)
+            new_entries.append(
+                SearchIndividual(
+                    search=self,
+                    individual_id=individual_id,
+                    is_unique=is_unique,
+                )
+            )
+
+        # ignore_conflicts protects against two processes checking the same
+        # individuals at once
+        SearchIndividual.objects.bulk_create(new_entries, ignore_conflicts=True)
+
+        nunique = len([entry for entry in new_entries if entry.is_unique])
+        logging.info(f"Found {nunique} new unique individual(s)")
+        return nunique
+
     def get_best_individual_history(self):
         """
         Goes through all structures in order that they were created and creates
@@ -606,7 +731,7 @@ class FixedCompositionSearch(Calculation):
         self._write_structures(structures, directory)
 
     def write_unique_structures(self, directory: Path):
-        structures = self.get_unique_individuals(use_cache=False)
+        structures = self.get_unique_individuals(use_cache=True)
         self._write_structures(structures, directory)
 
     # TODO: consider making a utility elsewhere
@@ -701,27 +826,22 @@ class FixedCompositionSearch(Calculation):
         df.to_markdown(md_filename)
 
     def write_individuals_incomplete(self, directory: Path):
-        structure_sources = self.steadystate_sources.all()
-        sources = []
-        workitem_ids = []
-        statuses = []
-        created_at = []
-        for source in structure_sources:
-            workitem_ids += source.workitem_ids
-            # as an extra, keep a list of the source names
-            sources += [source.name] * len(source.workitem_ids)
-
-            for workitem_id in source.workitem_ids:
-                work_item = WorkItem.objects.get(id=workitem_id)
-                statuses.append(work_item.get_status_display())
-                created_at.append(work_item.created_at.strftime("%Y-%m-%d %H:%M:%S"))
-
+        workitems = (
+            WorkItem.objects.filter(
+                steadystate_sources__search=self,
+                status__in=["P", "R"],
+            )
+            .annotate(source=F("steadystate_sources__name"))
+            .order_by("id")
+        )
         df = pandas.DataFrame(
             {
-                "workitem_id": workitem_ids,
-                "source": sources,
-                "status": statuses,
-                "created_at": created_at,
+                "workitem_id": [item.id for item in workitems],
+                "source": [item.source for item in workitems],
+                "status": [item.get_status_display() for item in workitems],
+                "created_at": [
+                    item.created_at.strftime("%Y-%m-%d %H:%M:%S") for item in workitems
+                ],
             }
         )
 
@@ -781,7 +901,7 @@ class Correctness(PlotlyFigure):
         # See https://github.com/chrisdev/django-pandas/issues/138 for issue
 
         structures_dataframe["structure"] = [
-            Structure.from_str(s.structure, fmt="POSCAR")
+            Structure.from_database_string(s.structure)
             for _, s in structures_dataframe.iterrows()
         ]
 
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from django.db import models
+
+from simmate.database.base_data_types import DatabaseTable, table_column
+
+
+class SearchIndividual(DatabaseTable):
+    """
+    Records each completed individual of a search that has been checked for
+    uniqueness, along with the result of that check.
+
+    Individuals are stored in a table that is shared between many searches
+    (e.g. the table of the search's subworkflow), so rather than adding a
+    column to that table, we record the `individual_id` here. This is the same
+    approach used by the `Fingerprint` table.
+    """
+
+    class Meta:
+        app_label = "workflows"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["search", "individual_id"],
+                name="searchindividual_unique_per_search",
+            ),
+        ]
+        indexes = [
+            # selectors always load the unique individuals of a single search
+            models.Index(
+                fields=["search", "is_unique"],
+                name="searchindividual_unique",
+            ),
+        ]
+
+    individual_id = table_column.IntegerField()
+    """
+    The id of the individual in the search's `individuals_datatable`
+    """
+
+    is_unique = table_column.BooleanField()
+    """
+    Whether this individual was unique when compared to the other unique
+    individuals at the time it was checked.
+    """
+
+    search = table_column.ForeignKey(
+        "FixedCompositionSearch",
+        on_delete=table_column.CASCADE,
+        related_name="checked_individuals",
+    )
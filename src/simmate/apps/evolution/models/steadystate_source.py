@@ -2,6 +2,8 @@
 
 import logging
 
+from django.db import transaction
+from django.db.models import Count, Q
 from rich import print
 
 import simmate.toolkit.creators as creation_module
@@ -24,92 +26,148 @@ class SteadystateSource(DatabaseTable):
     is_creator = table_column.BooleanField()
     is_transformation = table_column.BooleanField()
 
-    # This list limits to ids that are submitted or running
+    # All workitems that were submitted for this source. We keep this as a
+    # relation (rather than a list of ids) so that the workitem counts of
+    # all sources can be found with a single query.
+    workitems = table_column.ManyToManyField(
+        WorkItem,
+        related_name="steadystate_sources",
+        blank=True,
+    )
+
+    # Older versions of Simmate stored the submitted workitems as a list of ids.
+    # This column is only kept so that `update_workitems` can move these ids
+    # over to `workitems` when the database is updated. It is always empty
+    # afterwards.
     workitem_ids = table_column.JSONField(default=list)
 
+    # The number of failed workitems that we have already warned the user about
+    nworkitems_failed = table_column.IntegerField(default=0)
+
     search = table_column.ForeignKey(
         "FixedCompositionSearch",
         on_delete=table_column.CASCADE,
         related_name="steadystate_sources",
     )
 
-    def update_flow_workitem_ids(self):
+    @staticmethod
+    def with_workitem_counts(queryset):
         """
-        Queries Prefect to see how many workflows are in a scheduled, running,
-        or pending state from the list of run ids that are associate with this
-        structure source.
+        Adds the number of running (`nworkitems_running`) and failed
+        (`nworkitems_failed_total`) workitems to each source of a queryset.
+        This is done in a single query, no matter how many sources there are.
         """
-
-        # Before updating our run ids, we first want to see if any of them
-        # failed (or "E" for ERRORED) -- so that we can warn the use to
-        # check their logs.
-        failed_ids = WorkItem.objects.filter(
-            id__in=self.workitem_ids,
-            status__in=["E", "C"],
-        ).values_list("id", flat=True)
-
-        if failed_ids:
-            logging.warning(
-                f"The following WorkItem IDs failed or were cancelled: {list(failed_ids)}."
-            )
-
-            print("\n------------------------------------------------------------\n")
-            print("Make sure you check your worker logs for more info.\n")
-            print("You can preview ALL failed jobs in the command line:")
-            print("simmate engine show-error-summary\n")
-            print("Or view a specific error (w. full trackback) in python:")
-            print("from simmate.engine.execution import WorkItem")
-            print(f"item = WorkItem.objects.get(id={failed_ids[0]})")
-            print("item.result()\n")
-            print(
-                "The call to `result()` will raise the error that caused your job "
-                "to fail. Please report this error if you think it's a bug "
-                "with Simmate.\n "
-            )
-            print(
-                "Note, ~0-1% of calculations failing can be normal during an "
-                "evolutionary search because generated structures may be "
-                "unreasonable (and cause programs like VASP to crash). "
-                "However, >1% can indicate a serious problem.\n"
+        return queryset.annotate(
+            nworkitems_running=Count(
+                "workitems",
+                filter=Q(workitems__status__in=["P", "R"]),
+            ),
+            nworkitems_failed_total=Count(
+                "workitems",
+                filter=Q(workitems__status__in=["E", "C"]),
+            ),
+        )
+
+    @classmethod
+    def update_workitems(cls, chunk_size: int = 1000) -> int:
+        """
+        Moves the workitem ids that were saved by older versions of Simmate
+        (as JSON in the `workitem_ids` column) to the `workitems` relation.
+        Without this, searches that were running during an upgrade think none
+        of their workitems are running and submit a full new round of them.
+        This is called by `simmate database update`. Returns the number of
+        sources updated.
+        """
+        # We page through by id because the rows change as we update them
+        sources = cls.objects.exclude(workitem_ids=[]).only("id", "workitem_ids")
+        through_table = cls.workitems.through
+        nupdated = 0
+        last_id = 0
+        while chunk := list(sources.filter(id__gt=last_id).order_by("id")[:chunk_size]):
+            # workitems may have been archived (and deleted) since they were
+            # submitted, so we only link the ones that still exist
+            all_ids = {i for source in chunk for i in source.workitem_ids}
+            existing_ids = set(
+                WorkItem.objects.filter(id__in=all_ids).values_list("id", flat=True)
             )
-            print("------------------------------------------------------------\n")
-
-        # check which ids are still running. Note, this is a separate
-        # method in case it's an async call to Prefect client
-        still_running_ids = self._check_still_running_ids(self.workitem_ids)
-
-        # we now have our new list of IDs! Let's update it to the database
-        self.workitem_ids = still_running_ids
-        self.save()
-
-        return still_running_ids
+            links = [
+                through_table(steadystatesource_id=source.id, workitem_id=i)
+                for source in chunk
+                for i in set(source.workitem_ids)
+                if i in existing_ids
+            ]
+            for source in chunk:
+                source.workitem_ids = []
+            with transaction.atomic():
+                through_table.objects.bulk_create(links, ignore_conflicts=True)
+                cls.objects.bulk_update(chunk, ["workitem_ids"])
+            nupdated += len(chunk)
+            last_id = chunk[-1].id
+        return nupdated
 
     @property
     def nflow_runs(self):
-        # update our ids before we report how many there are.
-        runs = self.update_flow_workitem_ids()
-        # now the currently running ones is just the length of ids!
-        return len(runs)
+        """
+        The number of workitems of this source that are pending or running
+        """
+        # use the value from with_workitem_counts if it was loaded
+        if hasattr(self, "nworkitems_running"):
+            return self.nworkitems_running
+        return self.workitems.filter(status__in=["P", "R"]).count()
 
-    @staticmethod
-    def _check_still_running_ids(workitem_ids):
+    def check_failed_workitems(self, nfailed: int = None):
         """
-        Queries Prefect to see check on a list of flow run ids and determines
-        which ones are still in a scheduled, running, or pending state.
-        From the list of ids given, it will return a list of the ones that
-        haven't finished yet.
-        This is normally used within `update_flow_workitem_ids` and shouldn't
-        be called directly.
+        Warns the user about any workitems of this source that failed (or "E"
+        for ERRORED) or were cancelled since the last check -- so that they
+        can check their logs.
+
+        #### Parameters
+
+        - `nfailed`:
+            the total number of failed workitems for this source (e.g. from
+            `with_workitem_counts`). If not given, it is queried.
         """
-        # The reason we have this code as a separate method is because we want
-        # to allow isolation of Prefect's async calls from Django's
-        # sync-restricted calls (i.e. django raises errors if called
-        # within an async context).
-        still_running_ids = WorkItem.objects.filter(
-            id__in=workitem_ids,
-            status__in=["P", "R"],
-        ).values_list("id", flat=True)
-        return list(still_running_ids)
+        if nfailed is None:
+            nfailed = getattr(self, "nworkitems_failed_total", None)
+        if nfailed is None:
+            nfailed = self.workitems.filter(status__in=["E", "C"]).count()
+
+        # we only query the failed ids when there are new failures
+        if nfailed <= self.nworkitems_failed:
+            return
+
+        failed_ids = list(
+            self.workitems.filter(status__in=["E", "C"])
+            .order_by("-id")
+            .values_list("id", flat=True)[: nfailed - self.nworkitems_failed]
+        )
+        self.nworkitems_failed = nfailed
+        self.save()
+
+        logging.warning(
+            f"The following WorkItem IDs failed or were cancelled: {failed_ids}."
+        )
+
+        print("\n------------------------------------------------------------\n")
+        print("Make sure you check your worker logs for more info.\n")
+        print("You can preview ALL failed jobs in the command line:")
+        print("simmate engine show-error-summary\n")
+        print("Or view a specific error (w. full trackback) in python:")
+        print("from simmate.engine.execution import WorkItem")
+        print(f"item = WorkItem.objects.get(id={failed_ids[0]})")
+        print("item.result()\n")
+        print(
+            "The call to `result()` will raise the error that caused your job "
+            "to fail. Please report this error if you think it's a bug "
+            "with Simmate.\n "
+        )
+        print(
+            "Note, ~0-1% of calculations failing can be normal during an "
+            "evolutionary search because generated structures may be "
+            "unreasonable (and cause programs like VASP to crash). "
+            "However, >1% can indicate a serious problem.\n"
+        )
+        print("------------------------------------------------------------\n")
 
     def to_toolkit(self):
         if self.is_transformation:
@@ -151,32 +209,3 @@ class SteadystateSource(DatabaseTable):
         except:
             raise Exception(f"Creator class {self.name} could not be found.")
         return creator
-
-    # This method is for Prefect 2.0
-    # from simmate.utilities import async_to_sync
-    # @staticmethod
-    # @async_to_sync
-    # async def _check_still_running_ids(workitem_ids):
-    #     """
-    #     Queries Prefect to see check on a list of flow run ids and determines
-    #     which ones are still in a scheduled, running, or pending state.
-    #     From the list of ids given, it will return a list of the ones that
-    #     haven't finished yet.
-    #     This is normally used within `update_flow_workitem_ids` and shouldn't
-    #     be called directly.
-    #     """
-    #     raise NotImplementedError("porting to general executor")
-    #     from prefect.client import get_client
-    #     from prefect.orion.schemas.filters import FlowRunFilter
-    #     # The reason we have this code as a separate method is because we want
-    #     # to isolate Prefect's async calls from Django's sync-restricted calls
-    #     # (i.e. django raises errors if called within an async context).
-    #     async with get_client() as client:
-    #         response = await client.read_flow_runs(
-    #             flow_run_filter=FlowRunFilter(
-    #                 id={"any_": workitem_ids},
-    #                 state={"type": {"any_": ["SCHEDULED", "PENDING", "RUNNING"]}},
-    #             ),
-    #         )
-    #     still_running_ids = [str(entry.id) for entry in response]
-    #     return still_running_ids
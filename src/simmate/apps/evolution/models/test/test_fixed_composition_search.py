@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from simmate.apps.evolution.models import FixedCompositionSearch
+from simmate.toolkit import Structure
+
+
+def make_search() -> FixedCompositionSearch:
+    return FixedCompositionSearch.objects.create(
+        composition="Na1 Cl1",
+        subworkflow_name="relaxation.vasp.staged",
+        fitness_field="energy_per_atom",
+        validator_name="PartialRdfFingerprint",
+        validator_kwargs={"use_database": True, "use_cache": False},
+    )
+
+
+def add_individual(search, lattice_size, energy_per_atom, shift=0):
+    # shifting all sites gives a duplicate structure with a new database entry
+    structure = Structure(
+        lattice=[[lattice_size, 0, 0], [0, lattice_size, 0], [0, 0, lattice_size]],
+        species=["Na", "Cl"],
+        coords=[[shift, shift, shift], [0.5 + shift, 0.5 + shift, 0.5 + shift]],
+    )
+    individual = search.individuals_datatable.from_toolkit(
+        structure=structure,
+        workflow_name=search.subworkflow_name,
+        energy_per_atom=energy_per_atom,
+    )
+    individual.save()
+    return individual
+
+
+def get_unique_ids(search) -> list[int]:
+    unique = search.get_unique_individuals(use_cache=True, as_queryset=True)
+    return list(unique.values_list("id", flat=True))
+
+
+@pytest.mark.django_db
+def test_unique_individuals_empty():
+    search = make_search()
+
+    assert search.validator.get_unique_from_pool() == []
+    assert search.update_unique_individuals() == 0
+    assert search.get_unique_individuals(as_queryset=True).count() == 0
+    assert search.checked_individuals.count() == 0
+
+
+@pytest.mark.django_db
+def test_unique_individuals_duplicates():
+    search = make_search()
+    best = add_individual(search, 3.0, -3)
+    duplicate = add_individual(search, 3.0, -2.5, shift=0.1)
+    other = add_individual(search, 4.0, -2)
+
+    assert search.update_unique_individuals() == 2
+    assert get_unique_ids(search) == [best.id, other.id]
+    assert not search.checked_individuals.get(individual_id=duplicate.id).is_unique
+
+    # the full recompute gives the same result
+    unique = search.get_unique_individuals(use_cache=False)
+    assert [s.database_object.id for s in unique] == [best.id, other.id]
+
+
+@pytest.mark.django_db
+def test_unique_individuals_incremental():
+    search = make_search()
+    add_individual(search, 3.0, -3)
+    add_individual(search, 4.0, -2)
+
+    # the validator is reused between updates, as is done in the search loop
+    validator = search.validator
+    assert search.update_unique_individuals(validator) == 2
+    assert search.update_unique_individuals(validator) == 0
+
+    # new individuals that are duplicates of old ones (and also of each other)
+    add_individual(search, 3.0, -2.9, shift=0.2)
+    add_individual(search, 5.0, -1.5)
+    add_individual(search, 5.0, -1.4, shift=0.3)
+    assert search.update_unique_individuals(validator) == 1
+    incremental_ids = get_unique_ids(search)
+    assert search.checked_individuals.count() == 5
+
+    # a full recompute (which also resets the tracked individuals) must agree
+    search.get_unique_individuals(use_cache=False)
+    assert get_unique_ids(search) == incremental_ids
+    assert search.checked_individuals.count() == 5
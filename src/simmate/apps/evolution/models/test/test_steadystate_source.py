@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+import cloudpickle
+import pytest
+
+from simmate.apps.evolution.models import FixedCompositionSearch, SteadystateSource
+from simmate.engine.execution import WorkItem
+
+
+@pytest.mark.django_db
+def test_workitem_counts(caplog):
+    search = FixedCompositionSearch.objects.create(composition="Na1 Cl1")
+
+    # each source gets a different mix of statuses, and one workitem is
+    # shared between two sources
+    source_statuses = {
+        "RandomSymStructure": ["P", "P", "R", "F", "E", "C"],
+        "from_ase.Heredity": ["R", "F", "F", "E"],
+        "from_ase.SoftMutation": [],
+    }
+    fxn = cloudpickle.dumps(sum)
+    sources = []
+    workitem_ids = {}
+    for name, statuses in source_statuses.items():
+        source = SteadystateSource.objects.create(
+            name=name,
+            is_creator=name == "RandomSymStructure",
+            is_transformation=name != "RandomSymStructure",
+            search=search,
+        )
+        workitems = [WorkItem.objects.create(fxn=fxn, status=s) for s in statuses]
+        source.workitems.add(*workitems)
+        sources.append(source)
+        workitem_ids[source.id] = [workitem.id for workitem in workitems]
+    sources[1].workitems.add(WorkItem.objects.get(id=workitem_ids[sources[0].id][0]))
+    workitem_ids[sources[1].id].append(workitem_ids[sources[0].id][0])
+
+    # compare to counting each source separately (as was done before)
+    annotated = SteadystateSource.with_workitem_counts(search.steadystate_sources.all())
+    assert len(annotated) == 3
+    for source in annotated:
+        ids = workitem_ids[source.id]
+        nrunning = WorkItem.objects.filter(id__in=ids, status__in=["P", "R"]).count()
+        nfailed = WorkItem.objects.filter(id__in=ids, status__in=["E", "C"]).count()
+        assert source.nworkitems_running == nrunning
+        assert source.nworkitems_failed_total == nfailed
+        # and the queries used when counts are not annotated
+        source_plain = SteadystateSource.objects.get(id=source.id)
+        assert source.nflow_runs == source_plain.nflow_runs == nrunning
+
+    counts = {
+        source.name: (source.nworkitems_running, source.nworkitems_failed_total)
+        for source in annotated
+    }
+    assert counts == {
+        "RandomSymStructure": (3, 2),
+        "from_ase.Heredity": (2, 1),
+        "from_ase.SoftMutation": (0, 0),
+    }
+
+    # failures are only reported once
+    source = annotated[0]
+    with caplog.at_level(logging.WARNING):
+        source.check_failed_workitems()
+    assert str(workitem_ids[source.id][-1]) in caplog.text
+    assert SteadystateSource.objects.get(id=source.id).nworkitems_failed == 2
+
+    caplog.clear()
+    source = SteadystateSource.with_workitem_counts(
+        SteadystateSource.objects.filter(id=source.id)
+    ).get()
+    with caplog.at_level(logging.WARNING):
+        source.check_failed_workitems()
+    assert not caplog.text
+
+    # a new failure is reported without the annotation too
+    new_failure = WorkItem.objects.create(fxn=fxn, status="E")
+    source = SteadystateSource.objects.get(id=source.id)
+    source.workitems.add(new_failure)
+    with caplog.at_level(logging.WARNING):
+        source.check_failed_workitems()
+    assert f"[{new_failure.id}]" in caplog.text
+    assert source.nworkitems_failed == 3
+
+
+@pytest.mark.django_db
+def test_update_workitems():
+    search = FixedCompositionSearch.objects.create(composition="Na1 Cl1")
+    fxn = cloudpickle.dumps(sum)
+    workitems = [WorkItem.objects.create(fxn=fxn, status=s) for s in "PRF"]
+    ids = [workitem.id for workitem in workitems]
+
+    # sources saved by older versions only have the list of ids. One of the
+    # ids was already linked and another no longer exists (e.g. archived).
+    source_old = SteadystateSource.objects.create(
+        name="RandomSymStructure",
+        is_creator=True,
+        is_transformation=False,
+        search=search,
+        workitem_ids=ids + [ids[-1] + 100],
+    )
+    source_old.workitems.add(workitems[0])
+    source_new = SteadystateSource.objects.create(
+        name="from_ase.Heredity",
+        is_creator=False,
+        is_transformation=True,
+        search=search,
+    )
+    source_new.workitems.add(workitems[1])
+
+    assert SteadystateSource.update_workitems(chunk_size=1) == 1
+    source_old.refresh_from_db()
+    assert source_old.workitem_ids == []
+    assert set(source_old.workitems.values_list("id", flat=True)) == set(ids)
+    assert source_old.nflow_runs == 2
+    assert list(source_new.workitems.values_list("id", flat=True)) == [ids[1]]
+
+    # nothing is left to update
+    assert SteadystateSource.update_workitems() == 0
@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import threading
+import time
+from collections import OrderedDict
+
+import numpy
 import pandas
+from django.db.models import Count, Max
 
 
 class Selector:
@@ -49,6 +55,29 @@ class Selector:
         """
         return cls.__name__
 
+    @classmethod
+    def select_indices(
+        cls,
+        nselect: int,
+        fitnesses: numpy.ndarray,
+    ) -> numpy.ndarray:
+        """
+        A fast version of `select` that is given a 1D array of fitness values
+        and returns the indices of the selected individuals.
+
+        By default, this converts the fitnesses to a dataframe and calls
+        `select`. Subclasses should overwrite this with a vectorized version.
+        """
+        individuals = pandas.DataFrame(
+            {"id": numpy.arange(len(fitnesses)), "fitness": fitnesses}
+        )
+        parents = cls.select(
+            nselect=nselect,
+            individuals=individuals,
+            fitness_column="fitness",
+        )
+        return parents.id.values
+
     @classmethod
     def select_from_datatable(
         cls,
@@ -56,36 +85,68 @@ class Selector:
         datatable,  # Queryset
         fitness_column: str = None,
         query_limit: str = None,
+        cache_timeout: float = None,
     ):
-        # our selectors just require a dataframe where we specify the fitness
-        # column. So we query our individuals database to give this as an input.
-        datatable_cleaned = datatable
-        if fitness_column:
-            datatable_cleaned = datatable_cleaned.order_by(fitness_column)
-        if query_limit:
-            datatable_cleaned = datatable_cleaned[:query_limit]
+        """
+        Selects parent individuals from a database table and returns their
+        ids and toolkit structures.
 
-        individuals_df = datatable_cleaned.to_dataframe()
+        #### Parameters
 
-        # From these individuals, select our parent structures
-        parents_df = cls.select(
-            nselect=nselect,
-            individuals=individuals_df,
-            fitness_column=fitness_column,
-        )
+        - `nselect`:
+            the number of parents to select
+
+        - `datatable`:
+            a queryset of the individuals to select from
 
-        # grab the id column of the parents and convert it to a list
-        parent_ids = parents_df.id.values.tolist()
+        - `fitness_column`:
+            the column to use as the fitness (lower is better). If not given,
+            the full table is loaded as a dataframe and passed to `select`,
+            which is then responsible for picking the parents.
+
+        - `query_limit`:
+            the number of best individuals to select from. If not given, all
+            individuals are used.
+
+        - `cache_timeout`:
+            the time (in seconds) to reuse a previously loaded fitness table
+            for the same queryset. This is useful when many selections are
+            made within a single process. A table is never reused once new
+            individuals are added. By default, no caching is done.
+        """
+        # Without a fitness column there is nothing to vectorize, so we fall
+        # back to giving the selector the full table
+        if not fitness_column:
+            datatable_cleaned = datatable
+            if query_limit:
+                datatable_cleaned = datatable_cleaned[:query_limit]
+            parents_df = cls.select(
+                nselect=nselect,
+                individuals=datatable_cleaned.to_dataframe(),
+                fitness_column=fitness_column,
+            )
+            parent_ids = parents_df.id.values.tolist()
+
+        else:
+            ids, fitnesses = cls.get_fitness_table(
+                datatable=datatable,
+                fitness_column=fitness_column,
+                query_limit=query_limit,
+                cache_timeout=cache_timeout,
+            )
+            # From these individuals, select our parent structures
+            parent_ids = ids[cls.select_indices(nselect, fitnesses)].tolist()
 
         # Now lets grab these structures from our database and convert them
-        # to a list of pymatgen structures.
-        # We have to make separate queries for this instead of doing "id__in=parent_ids".
-        # This is because (1) order may be important and (2) we may have duplicate
-        # entries. For example, a hereditary mutation can request parent ids of [123,123]
-        # in which case we want to give the same input structure twice!
+        # to a list of pymatgen structures. Order may be important and we
+        # may have duplicate entries (for example, a hereditary mutation can
+        # request parent ids of [123,123] in which case we want to give the
+        # same input structure twice!). So we query the unique ids and then
+        # reorder them afterwards.
+        parents_db = datatable.filter(id__in=set(parent_ids)).only("id", "structure")
+        parents_dict = {parent.id: parent for parent in parents_db}
         parent_structures = [
-            datatable.only("structure").get(id=parent_id).to_toolkit()
-            for parent_id in parent_ids
+            parents_dict[parent_id].to_toolkit() for parent_id in parent_ids
         ]
 
         # When there's only one structure selected we return the structure and
@@ -96,3 +157,61 @@ class Selector:
 
         # for record keeping, we also want to return the ids for each structure
         return parent_ids, parent_structures
+
+    @staticmethod
+    def get_fitness_table(
+        datatable,  # Queryset
+        fitness_column: str,
+        query_limit: str = None,
+        cache_timeout: float = None,
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Loads only the id and fitness columns of a queryset as numpy arrays
+        (ordered by fitness). See `select_from_datatable` for the parameters.
+        """
+        datatable_cleaned = datatable.order_by(fitness_column)
+        if query_limit:
+            datatable_cleaned = datatable_cleaned[:query_limit]
+
+        if cache_timeout:
+            # The SQL query is used in the key, so that a table is only reused
+            # for the exact same query (e.g. the same search). The latest id
+            # and count of individuals are included too, so a table is never
+            # reused once an individual is added (or completed). Finding these
+            # is a single aggregate query, which is much cheaper than loading
+            # the full table.
+            latest = datatable.aggregate(latest_id=Max("id"), count=Count("id"))
+            cache_key = (
+                str(datatable_cleaned.query),
+                fitness_column,
+                latest["latest_id"],
+                latest["count"],
+            )
+            with _FITNESS_TABLES_LOCK:
+                cached = _FITNESS_TABLES.get(cache_key)
+                if cached and time.time() - cached[0] < cache_timeout:
+                    _FITNESS_TABLES.move_to_end(cache_key)
+                    return cached[1], cached[2]
+
+        data = list(datatable_cleaned.values_list("id", fitness_column))
+        ids = numpy.array([row[0] for row in data], dtype=int)
+        fitnesses = numpy.array([row[1] for row in data], dtype=float)
+
+        if cache_timeout:
+            with _FITNESS_TABLES_LOCK:
+                _FITNESS_TABLES[cache_key] = (time.time(), ids, fitnesses)
+                _FITNESS_TABLES.move_to_end(cache_key)
+                while len(_FITNESS_TABLES) > _FITNESS_TABLES_SIZE:
+                    _FITNESS_TABLES.popitem(last=False)
+
+        return ids, fitnesses
+
+
+# Fitness tables that were loaded by Selector.get_fitness_table, which are
+# stored as {cache_key: (load_time, ids, fitnesses)}. Outdated tables are never
+# reused (see the cache key), so only a few of the most recently used are kept.
+_FITNESS_TABLES = OrderedDict()
+_FITNESS_TABLES_SIZE = 8
+
+# Workers with several slots can run selections from multiple threads at once
+_FITNESS_TABLES_LOCK = threading.Lock()
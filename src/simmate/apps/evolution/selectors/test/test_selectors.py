@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pandas
+import pytest
+
+from simmate.apps.evolution.selectors import (
+    Selector,
+    TournamentSelection,
+    TruncatedSelection,
+)
+from simmate.apps.evolution.selectors import base as selector_module
+from simmate.website.test_app.models import TestThermodynamics
+
+
+def get_frequencies(indices: numpy.ndarray, nindividuals: int) -> numpy.ndarray:
+    return numpy.bincount(indices, minlength=nindividuals) / len(indices)
+
+
+@pytest.mark.parametrize("selector", [TournamentSelection, TruncatedSelection])
+def test_select_indices(selector):
+    numpy.random.seed(123)
+    nindividuals = 40
+    fitnesses = numpy.random.permutation(nindividuals) * 0.1 - 2
+    individuals = pandas.DataFrame(
+        {"id": numpy.arange(nindividuals), "fitness": fitnesses}
+    )
+
+    # The vectorized version uses random numbers differently, so a single
+    # selection does not match. Instead, we compare how often each
+    # individual is picked over many selections from a fixed seed.
+    nselect = 20_000
+    numpy.random.seed(123)
+    old_indices = selector.select(
+        nselect=nselect,
+        individuals=individuals,
+        fitness_column="fitness",
+    ).id.values.astype(int)
+    numpy.random.seed(123)
+    new_indices = selector.select_indices(nselect, fitnesses)
+
+    assert len(new_indices) == nselect
+    old_frequencies = get_frequencies(old_indices, nindividuals)
+    new_frequencies = get_frequencies(new_indices, nindividuals)
+    assert numpy.abs(old_frequencies - new_frequencies).max() < 0.02
+
+
+def test_select_indices_deterministic():
+    fitnesses = numpy.array([0.5, -1.0, 2.0, -0.5, 0.0, 1.0])
+    individuals = pandas.DataFrame({"id": range(6), "fitness": fitnesses})
+
+    # when all individuals are in every tournament, the best always wins
+    old = TournamentSelection.select(4, individuals, "fitness", tournament_size=1)
+    new = TournamentSelection.select_indices(4, fitnesses, tournament_size=1)
+    assert old.id.tolist() == new.tolist() == [1, 1, 1, 1]
+
+    # selecting the full truncated pool without duplicates gives the best 3
+    old = TruncatedSelection.select(
+        3, individuals, "fitness", ntruncate_min=3, allow_duplicate=False
+    )
+    new = TruncatedSelection.select_indices(
+        3, fitnesses, ntruncate_min=3, allow_duplicate=False
+    )
+    assert set(old.id) == set(new) == {1, 3, 4}
+
+    # we never have tournaments or truncation larger than the pool
+    assert len(TournamentSelection.select_indices(2, fitnesses[:2])) == 2
+    assert set(TruncatedSelection.select_indices(10, fitnesses[:2])) <= {0, 1}
+
+
+@pytest.mark.django_db
+def test_select_from_datatable(sample_structures):
+    structure = sample_structures["C_mp-48_primitive"]
+    entries = [
+        TestThermodynamics.from_toolkit(structure=structure, energy_per_atom=energy)
+        for energy in [-1, -3, -2]
+    ]
+    TestThermodynamics.objects.bulk_create(entries)
+    datatable = TestThermodynamics.objects.all()
+    best_id = datatable.order_by("energy_per_atom").first().id
+
+    parent_id, parent = TournamentSelection.select_from_datatable(
+        nselect=1,
+        datatable=datatable,
+        fitness_column="energy_per_atom",
+    )
+    assert parent_id in datatable.values_list("id", flat=True)
+    assert parent == structure
+
+    # without a fitness column, the selector is given the full table
+    class FirstSelection(Selector):
+        @staticmethod
+        def select(nselect, individuals, fitness_column):
+            assert fitness_column is None
+            assert "energy_per_atom" in individuals.columns
+            return individuals.nsmallest(nselect, "energy_per_atom")
+
+    parent_ids, parents = FirstSelection.select_from_datatable(2, datatable)
+    assert parent_ids[0] == best_id
+    assert len(parents) == 2
+
+
+@pytest.mark.django_db
+def test_fitness_table_cache(sample_structures, monkeypatch):
+    structure = sample_structures["C_mp-48_primitive"]
+    monkeypatch.setattr(selector_module, "_FITNESS_TABLES_SIZE", 2)
+    selector_module._FITNESS_TABLES.clear()
+
+    TestThermodynamics.from_toolkit(structure=structure, energy_per_atom=-1).save()
+    datatable = TestThermodynamics.objects.all()
+
+    ids, fitnesses = Selector.get_fitness_table(
+        datatable, "energy_per_atom", cache_timeout=100
+    )
+    ids_cached, _ = Selector.get_fitness_table(
+        datatable, "energy_per_atom", cache_timeout=100
+    )
+    assert ids_cached is ids
+
+    # a new individual means the cached table is outdated
+    new = TestThermodynamics.from_toolkit(structure=structure, energy_per_atom=-2)
+    new.save()
+    ids_new, fitnesses_new = Selector.get_fitness_table(
+        datatable, "energy_per_atom", cache_timeout=100
+    )
+    assert ids_new[0] == new.id
+    assert fitnesses_new.tolist() == [-2, -1]
+
+    # as is an individual that completes later on
+    new.energy_per_atom = None
+    new.save()
+    datatable = TestThermodynamics.objects.filter(energy_per_atom__isnull=False)
+    Selector.get_fitness_table(datatable, "energy_per_atom", cache_timeout=100)
+    new.energy_per_atom = -3
+    new.save()
+    ids_new, _ = Selector.get_fitness_table(
+        datatable, "energy_per_atom", cache_timeout=100
+    )
+    assert ids_new[0] == new.id
+
+    # the cache only keeps the most recently used tables
+    assert len(selector_module._FITNESS_TABLES) == 2
+    selector_module._FITNESS_TABLES.clear()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import numpy
 import pandas
 
 from simmate.apps.evolution.selectors import Selector
@@ -39,3 +40,25 @@ class TournamentSelection(Selector):
         df_parents = df_parents.reset_index(drop=True)  # in case of duplicates
 
         return df_parents
+
+    @staticmethod
+    def select_indices(
+        nselect: int,
+        fitnesses: numpy.ndarray,
+        tournament_size: float = 0.20,
+        tournament_min: int = 3,
+    ) -> numpy.ndarray:
+        # same as above, but we can't have more participants than individuals
+        nindividuals = len(fitnesses)
+        ntournament = int(nindividuals * tournament_size)
+        ntournament = min(max(ntournament, tournament_min), nindividuals)
+
+        # Run all tournaments at once. Each row of random values is partitioned
+        # to give ntournament random individuals without replacement.
+        random_values = numpy.random.random((nselect, nindividuals))
+        participants = numpy.argpartition(random_values, ntournament - 1, axis=1)
+        participants = participants[:, :ntournament]
+
+        # and the winner of each tournament is the one with the lowest fitness
+        winners = fitnesses[participants].argmin(axis=1)
+        return participants[numpy.arange(nselect), winners]
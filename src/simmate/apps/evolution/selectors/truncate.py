@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import numpy
 import pandas
 
 from simmate.apps.evolution.selectors import Selector
@@ -39,3 +40,19 @@ class TruncatedSelection(Selector):
 
         # return the list of indexes to be selected
         return df_parents
+
+    @staticmethod
+    def select_indices(
+        nselect: int,
+        fitnesses: numpy.ndarray,
+        percentile: float = 0.05,
+        ntruncate_min: int = 5,
+        ntruncate_max: int = 50,
+        allow_duplicate: bool = True,
+    ) -> numpy.ndarray:
+        # same as above, but we can't truncate to more than all individuals
+        ntruncate = int(len(fitnesses) * percentile)
+        ntruncate = min(max(ntruncate, ntruncate_min), ntruncate_max, len(fitnesses))
+
+        truncated = numpy.argsort(fitnesses, kind="stable")[:ntruncate]
+        return numpy.random.choice(truncated, nselect, replace=allow_duplicate)
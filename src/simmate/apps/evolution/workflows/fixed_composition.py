@@ -114,8 +114,9 @@ class StructurePrediction__Toolkit__FixedComposition(Workflow):
         # fingerprint pool in the database. To prevent this race, we generate
         # the pool up front. This is acheive just by accessing the validator.
         # This also makes sure the Fingerprints are all up to date before
-        # submitting workers below
-        search_datatable.validator
+        # submitting workers below. We keep this validator to track which
+        # individuals are unique throughout the search.
+        validator = search_datatable.validator
 
         logging.info("Finished setup")
         logging.info(
@@ -163,6 +164,11 @@ class StructurePrediction__Toolkit__FixedComposition(Workflow):
             # table -- e.g. the workflow to run, the validators, etc.
             # self._check_triggered_actions()
 
+            # Check any newly completed individuals for uniqueness, so that
+            # the steady-state sources below always select from an up-to-date
+            # set of unique individuals.
+            search_datatable.update_unique_individuals(validator)
+
             # Go through the running workflows and see if we need to submit
             # new ones to meet our steadystate target(s)
             search_datatable._check_steadystate_workflows()
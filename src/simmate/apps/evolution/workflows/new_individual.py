@@ -47,13 +47,10 @@ class StructurePrediction__Toolkit__NewIndividual(Workflow):
         if source_db.is_transformation:
             transformer = source_db.to_toolkit()
 
-            # Check the cache first to save time (even though it might be outdated)
-            # and then actually calculate all unique as a backup
-            # We only activate the caching once we have >200 unique structures,
-            # as that is when it starts to cut into CPU time.
-            use_cache = bool(len(search_db.unique_individuals_ids) >= 400)
+            # The unique individuals are kept up to date by the search (see
+            # update_unique_individuals), so this is a single query.
             unique_queryset = search_db.get_unique_individuals(
-                use_cache=use_cache,
+                use_cache=True,
                 as_queryset=True,
             )
 
@@ -63,6 +60,9 @@ class StructurePrediction__Toolkit__NewIndividual(Workflow):
                 select_kwargs=dict(
                     fitness_column=search_db.fitness_field,
                     # query_limit=200,  # OPTIMIZE: Smarter way to do this...?
+                    # workers often run many individuals back-to-back, so we
+                    # reuse the fitness table for a short time
+                    cache_timeout=60,
                 ),
                 validators=[validator],
             )
@@ -29,7 +29,7 @@ def write_and_submit_structures(
 
     nalready_submitted = 0
     directory = get_directory(foldername)
-    states = []
+    parameters_list = []
     for i, s in enumerate(track(structures)):
         # check if the structure has been submitted before, and if so, skip it
         if workflow.all_results.filter(source=s.source).exists():
@@ -39,11 +39,10 @@ def write_and_submit_structures(
         i_cleaned = str(i).zfill(3)  # converts 1 to 001
         s.to(filename=str(directory / f"{i_cleaned}.cif"), fmt="cif")
 
-        state = workflow.run_cloud(
-            structure=s,
-            **workflow_kwargs,
-        )
-        states.append(state)
+        parameters_list.append(dict(structure=s, **workflow_kwargs))
+
+    # submit all runs together, which lets us use bulk inserts on the queue
+    states = workflow.run_cloud_many(parameters_list) if parameters_list else []
 
     logger.disabled = False
 
@@ -102,6 +102,24 @@ def load_data(filename: Path = "database_dump.json"):
     load_database_from_json(filename=filename)
 
 
+@database_app.command()
+def update_structure_strings(chunk_size: int = 1000):
+    """
+    Rewrites all stored structures so they use the latest string format
+
+    Structures saved by older versions of Simmate are stored as POSCAR or CIF
+    strings. These can still be read, but the newer format is smaller and
+    much faster to load.
+
+    - `--chunk-size`: the number of rows to update at a time
+    """
+
+    from simmate.database import connect
+    from simmate.database.utilities import update_structure_strings
+
+    update_structure_strings(chunk_size=chunk_size)
+
+
 @database_app.command()
 def load_remote_archives(parallel: bool = False):
     """
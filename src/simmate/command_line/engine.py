@@ -26,6 +26,8 @@ def start_worker(
     close_on_empty_queue: bool = False,
     waittime_on_empty_queue: float = 1,
     tag: list[str] = ["simmate"],
+    nslots: int = 1,
+    claim_batch_size: int = 1,
 ):
     """
     Starts a Simmate Worker which will query the database for jobs to run
@@ -44,6 +46,12 @@ def start_worker(
 
     - `tags`: tags to filter tasks by for submission. defaults to just 'simmate'
 
+    - `nslots`: the number of jobs that this worker runs at the same time.
+    defaults to 1, which runs jobs in serial
+
+    - `claim_batch_size`: the number of jobs to grab from the queue at once.
+    this is useful when there are many short jobs. defaults to 1
+
     """
 
     from simmate.engine import Worker
@@ -54,6 +62,8 @@ def start_worker(
         close_on_empty_queue,
         waittime_on_empty_queue,
         tag,  # this is actually "tags" --> a list of strings
+        nslots=nslots,
+        claim_batch_size=claim_batch_size,
     )
     worker.start()
 
@@ -81,6 +91,9 @@ def start_cluster(
     nworkers: int,
     type: str = "local",
     continuous: bool = False,
+    max_nworkers: int = None,
+    tag: list[str] = ["simmate"],
+    nitems_per_worker: int = 1,
 ):
     """
     This starts many Simmate Workers that each run in a local subprocess
@@ -92,6 +105,15 @@ def start_cluster(
     - `continuous`: whether to do a single submission of workers or hold nworkers
     at a steady-state number (runs endlessly)
 
+    - `max_nworkers`: when running continuously, autoscale the number of
+    workers between nworkers and this value, based on the size of the queue
+
+    - `tags`: when autoscaling, the tags of the workitems that the workers run.
+    defaults to just 'simmate'
+
+    - `nitems_per_worker`: when autoscaling, the number of queued workitems
+    that each worker should be responsible for. defaults to 1
+
     """
 
     from simmate.engine.execution.utilities import start_cluster
@@ -100,6 +122,9 @@ def start_cluster(
         nworkers=nworkers,
         cluster_type=type,
         continuous=continuous,
+        max_nworkers=max_nworkers,
+        tags=tag,  # this is actually "tags" --> a list of strings
+        nitems_per_worker=nitems_per_worker,
     )
 
 
@@ -123,6 +148,17 @@ def show_stats():
     SimmateExecutor.show_stats()
 
 
+@engine_app.command()
+def shutdown_workers():
+    """
+    Asks all running workers to shut down once their current workitems finish
+    """
+    from simmate.engine.execution import SimmateExecutor
+
+    nworkers = SimmateExecutor.shutdown_workers()
+    print(f"Requested shutdown of {nworkers} workers")
+
+
 @engine_app.command()
 def delete_finished(confirm: bool = False):
     """
@@ -133,6 +169,23 @@ def delete_finished(confirm: bool = False):
     SimmateExecutor.delete_finished(confirm)
 
 
+@engine_app.command()
+def archive_done(older_than_days: float = 1):
+    """
+    Moves all done workitems (finished, errored, or cancelled) into a separate
+    archive table, which keeps the queue table small and fast
+
+    - `older_than_days`: only archive workitems that were last updated more
+    than this many days ago. defaults to 1
+    """
+    from datetime import timedelta
+
+    from simmate.engine.execution import SimmateExecutor
+
+    narchived = SimmateExecutor.archive_done(older_than=timedelta(days=older_than_days))
+    print(f"Archived {narchived} workitems")
+
+
 @engine_app.command()
 def delete_all(confirm: bool = False):
     """
@@ -5,6 +5,7 @@ from pathlib import Path
 import pytest
 
 from simmate.command_line.database import database_app
+from simmate.website.test_app.models import TestStructure
 
 
 @pytest.fixture  # BUG: is this test actually running...?
@@ -44,3 +45,28 @@ def test_database_dump_and_load(command_line_runner):
 
     # delete the dump file
     Path("database_dump.json").unlink()
+
+
+@pytest.mark.django_db
+def test_update_structure_strings(command_line_runner, structure):
+    # save a structure the way older versions of simmate did. POSCAR strings
+    # kept site properties, so these must survive the update too
+    selective_dynamics = [[True, False, True]] * len(structure)
+    structure = structure.copy(
+        site_properties={"selective_dynamics": selective_dynamics}
+    )
+    structure_db = TestStructure.from_toolkit(structure=structure)
+    structure_db.structure = structure.to(fmt="POSCAR")
+    structure_db.save()
+
+    result = command_line_runner.invoke(
+        database_app,
+        ["update-structure-strings", "--chunk-size", "1"],
+    )
+    assert result.exit_code == 0
+
+    structure_db.refresh_from_db()
+    assert structure_db.structure.startswith("@simmate-structure v1")
+    structure_new = structure_db.to_toolkit()
+    assert structure_new.matches(structure)
+    assert structure_new.site_properties == {"selective_dynamics": selective_dynamics}
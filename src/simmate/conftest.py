@@ -25,6 +25,8 @@ from simmate.apps.vasp.inputs import Potcar
 from simmate.database.base_data_types import Spacegroup
 from simmate.engine import S3Workflow
 from simmate.toolkit import Composition, Structure, base_data_types
+from simmate.toolkit.symmetry import wyckoff
+from simmate.toolkit.validators.fingerprint.cache import FingerprintCache
 from simmate.utilities import get_directory
 from simmate.website.test_app.models import TestStructure
 
@@ -191,6 +193,19 @@ def command_line_runner():
     return CliRunner()
 
 
+@pytest.fixture(autouse=True)
+def cache_directories(tmp_path, monkeypatch):
+    """
+    Some toolkit utilities cache their results to files in `~/simmate`. We
+    point these to the temporary directory of each test so that tests never
+    write to (or read from) the user's real cache.
+    """
+    monkeypatch.setattr(wyckoff, "WYCKOFF_CACHE_DIRECTORY", tmp_path / "wyckoff_cache")
+    monkeypatch.setattr(
+        FingerprintCache, "base_directory", tmp_path / "fingerprint_cache"
+    )
+
+
 # !!! Disable harness until prefect is reimplemented
 # from prefect.testing.utilities import prefect_test_harness
 # @pytest.fixture(autouse=True, scope="session")
@@ -8,24 +8,33 @@ See the `simmate.database.base_data_types` (which is the parent module of
 this one) for example usage.
 """
 
+import collections
 import inspect
+import itertools
 import json
 import logging
 import shutil
 import urllib
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from functools import cache
 from pathlib import Path
 
 import pandas
 import yaml
-from django.db import models  # , transaction
+from django.core.management.color import no_style
+from django.db import connection
+from django.db import models
 from django.db import models as table_column
+from django.db import transaction
 from django.utils.module_loading import import_string
 from django.utils.timezone import datetime
 from django_filters import rest_framework as django_api_filters
-from django_pandas.io import read_frame
-from rich.progress import track
+from django_pandas.io import read_frame, to_fields
+from django_pandas.utils import update_with_verbose
+from rich.progress import Progress, track
+
+from simmate.utilities import init_worker_process
 
 # The "as table_column" line does NOTHING but rename a module.
 # I have this because I want to use "table_column.CharField(...)" instead
@@ -122,7 +131,127 @@ class SearchResults(models.QuerySet):
         # pymatgen objects as a list
         return [obj.to_toolkit() for obj in self]
 
-    def to_archive(self, filename: Path | str = None):
+    def iter_toolkit(self, chunk_size: int = 1000, nprocesses: int = 1):
+        """
+        Iterates through your SearchResults as pymatgen objects. Unlike
+        `to_toolkit`, only a few chunks of rows are held in memory at a time,
+        so this can be used on tables with millions of rows.
+
+        ``` python
+        for structure in search_results.iter_toolkit(nprocesses=4):
+            ...
+        ```
+
+        #### Parameters
+
+        - `chunk_size`:
+            the number of rows to load from the database at a time
+
+        - `nprocesses`:
+            the number of processes to decode structures with. This only applies
+            to structure tables -- other tables are always converted in the
+            main process.
+        """
+        from simmate.database.base_data_types import Structure as DatabaseStructure
+
+        if not hasattr(self.model, "to_toolkit"):
+            raise Exception(
+                "This database table does not have a to_toolkit method implemented"
+            )
+
+        # iterator() streams rows from the database (with a server-side cursor
+        # when supported) instead of caching the full queryset.
+        entries = self.iterator(chunk_size=chunk_size)
+
+        if nprocesses == 1 or not issubclass(self.model, DatabaseStructure):
+            for entry in entries:
+                yield entry.to_toolkit()
+            return
+
+        # Only the structure strings are sent to the other processes. We keep
+        # at most a couple of chunks per process submitted at once, so that the
+        # pool never gets far ahead of whoever is consuming this generator.
+        executor = ProcessPoolExecutor(
+            max_workers=nprocesses,
+            initializer=init_worker_process,
+        )
+        pending = collections.deque()
+        try:
+            while chunk := list(itertools.islice(entries, chunk_size)):
+                future = executor.submit(
+                    _get_toolkit_structures,
+                    [entry.structure for entry in chunk],
+                )
+                pending.append((chunk, future))
+                if len(pending) < nprocesses * 2:
+                    continue
+                yield from _link_database_objects(*pending.popleft())
+            while pending:
+                yield from _link_database_objects(*pending.popleft())
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def iter_dataframes(
+        self,
+        chunk_size: int = 10_000,
+        fieldnames: list[str] = (),
+        verbose: bool = True,
+        index: str = None,
+        coerce_float: str = False,
+        datetime_index: str = False,
+    ):
+        """
+        Iterates through your SearchResults as Pandas DataFrames of (at most)
+        `chunk_size` rows each. Unlike `to_dataframe`, the rows are streamed
+        from a single query, so memory use does not grow with the size of
+        the table.
+
+        ``` python
+        for dataframe in search_results.iter_dataframes(chunk_size=50_000):
+            dataframe.to_csv("results.csv", mode="a")
+        ```
+
+        #### Parameters
+
+        - `chunk_size`:
+            the number of rows in each DataFrame
+
+        All other parameters are the same as `to_dataframe`.
+        """
+
+        # This mirrors how django_pandas' read_frame selects columns, but
+        # we iterate through the rows rather than loading them all at once.
+        if fieldnames:
+            fieldnames = list(pandas.unique(fieldnames))
+            if index is not None and index not in fieldnames:
+                fieldnames.append(index)
+            fields = list(to_fields(self, fieldnames))
+        else:
+            fields = self.model._meta.fields
+            fieldnames = [field.name for field in fields]
+            fieldnames += list(self.query.annotation_select.keys())
+
+        rows = self.values_list(*fieldnames).iterator(chunk_size=chunk_size)
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            dataframe = pandas.DataFrame.from_records(
+                chunk,
+                columns=fieldnames,
+                coerce_float=coerce_float,
+            )
+            if verbose:
+                update_with_verbose(dataframe, fieldnames, fields)
+            if index is not None:
+                dataframe.set_index(index, inplace=True)
+            if datetime_index:
+                dataframe.index = pandas.to_datetime(dataframe.index, errors="ignore")
+            yield dataframe
+
+    def to_archive(
+        self,
+        filename: Path | str = None,
+        chunk_size: int = 10_000,
+        include_all_columns: bool = False,
+    ):
         """
         Writes a compressed zip file using the table's `archive_fieldset`
         attribute. Underneath, the file is written in a csv format.
@@ -130,6 +259,11 @@ class SearchResults(models.QuerySet):
         This is useful for small making archive files and reloading fixtures
         to a separate database.
 
+        If the filename ends with `.parquet`, a parquet file is written instead
+        (this requires `pyarrow`). Parquet archives keep the type of each
+        column and are written in chunks, so large tables (e.g. third-party
+        data with 100k+ rows) never need to be held in memory all at once.
+
         This method is attached to the table manager for scenarios to allow
         queryset filtering before dumping data.
 
@@ -141,7 +275,19 @@ class SearchResults(models.QuerySet):
         - `filename`:
             The filename to write the zip file to. By defualt, None will make
             a filename named MyExampleTableName-2022-01-25.zip, where the date
-            will be the current day (for versioning).
+            will be the current day (for versioning). Use a `.parquet` ending
+            to write a parquet archive instead.
+
+        - `chunk_size`:
+            The number of rows that are loaded from the database and written
+            at a time. This is only used for parquet archives.
+
+        - `include_all_columns`:
+            Whether to write every column of the table, rather than just
+            the `archive_fieldset`. This makes for larger archives, but
+            `load_archive` can then insert rows directly instead of
+            recalculating columns (which is very slow for structures). This is
+            only supported for parquet archives.
         """
 
         # Generate the file name if one wasn't given.
@@ -163,6 +309,14 @@ class SearchResults(models.QuerySet):
         # convert to path obj
         filename = Path(filename)
 
+        if filename.suffix == ".parquet":
+            return self._to_parquet_archive(filename, chunk_size, include_all_columns)
+        elif include_all_columns:
+            raise Exception(
+                "include_all_columns is only supported for parquet archives. "
+                "Use a filename that ends with '.parquet'."
+            )
+
         # grab the list of fields that we want to store
         fieldset = self.model.archive_fieldset
 
@@ -193,6 +347,45 @@ class SearchResults(models.QuerySet):
         # we can now delete the csv file
         csv_filename.unlink()
 
+    def _to_parquet_archive(
+        self,
+        filename: Path,
+        chunk_size: int,
+        include_all_columns: bool,
+    ):
+        pyarrow = _import_pyarrow()
+        from pyarrow import parquet
+
+        fieldset = self.model.archive_fieldset
+        if include_all_columns:
+            # foreign keys are stored using their id (e.g. "spacegroup_id")
+            fieldset = fieldset + [
+                column.attname
+                for column in self.model._meta.concrete_fields
+                if column.name not in fieldset
+            ]
+        schema = _get_archive_schema(self.model, fieldset)
+
+        # Rows are pulled from the database with a server-side cursor (where
+        # supported) and each chunk is written as a separate parquet row group.
+        # We write to a temporary file and rename it at the end so that a
+        # failed dump never leaves behind a partial archive.
+        rows = self.values_list(*fieldset).iterator(chunk_size=chunk_size)
+        temp_filename = filename.with_suffix(".parquet.tmp")
+        with parquet.ParquetWriter(temp_filename, schema, compression="zstd") as writer:
+            while chunk := list(itertools.islice(rows, chunk_size)):
+                columns = []
+                for column, values in zip(schema, zip(*chunk)):
+                    # JSON columns are stored as text (see _get_archive_schema)
+                    if column.metadata and column.metadata.get(b"json"):
+                        values = [
+                            json.dumps(value) if value is not None else None
+                            for value in values
+                        ]
+                    columns.append(pyarrow.array(values, type=column.type))
+                writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+        temp_filename.replace(filename)
+
     def filter_by_tags(self, tags: list[str]):
         """
         A utility filter() method that
@@ -856,10 +1049,22 @@ class DatabaseTable(models.Model):
         confirm_override: bool = False,
         parallel: bool = False,
         confirm_sqlite_parallel: bool = False,
+        validate: bool = False,
+        nprocesses: int = 1,
+        chunk_size: int = 5000,
     ):
         """
         Reads a compressed zip file made by `objects.to_archive` and loads the data
-        back into the Simmate database.
+        back into the Simmate database. Parquet archives (files ending with
+        `.parquet`) are also supported.
+
+        Rows are read and loaded in chunks, so the full archive is never held
+        in memory. Each chunk is written with a single `bulk_create` inside
+        of a transaction. If the archive holds every column of the table (see
+        the `include_all_columns` option of `to_archive`), rows are inserted
+        as-is. Otherwise, the remaining columns are filled in with
+        `from_toolkit` (e.g. reading each structure and finding its symmetry),
+        which is by far the slowest step of loading.
 
         Typically, users won't call this method directly, but instead use the
         `load_remote_archive` method, which handles downloading the archive
@@ -869,9 +1074,9 @@ class DatabaseTable(models.Model):
 
         - `filename`:
             The filename to write the zip file to. By defualt, None will try to
-            find a file named "MyExampleTableName-2022-01-25.zip", where the date
-            corresponds to version/timestamp. If multiple files match this format
-            the most recent date will be used.
+            find a file named "MyExampleTableName-2022-01-25.zip" (or ".parquet"),
+            where the date corresponds to version/timestamp. If multiple files
+            match this format the most recent date will be used.
 
         - `delete_on_completion`:
             Whether to delete the archive file once all data is loaded into the
@@ -888,10 +1093,26 @@ class DatabaseTable(models.Model):
             to the cluster. This provides substansial speed-ups for loading
             large datasets into the dataset. Default is False.
 
+            Note, this option is the original (row-by-row) loader. In most cases,
+            the default bulk loader with `nprocesses` set is much faster.
+
         - `confirm_sqlite_parallel`:
             If the database backend is sqlite, this parameter ensures the user
             knows what they are doing and know the risks of parallelization.
             Default is False.
+
+        - `validate`:
+            Whether to recalculate all columns with `from_toolkit`, even if
+            the archive already has them. Default is False, where archived
+            columns are trusted.
+
+        - `nprocesses`:
+            The number of processes to use when calculating columns with
+            `from_toolkit`. Database writes always happen in the main process.
+            Default is 1.
+
+        - `chunk_size`:
+            The number of rows to load and insert at a time.
         """
 
         # We disable warnings while loading archives because pymatgen prints
@@ -915,12 +1136,14 @@ class DatabaseTable(models.Model):
             matching_files = [
                 file
                 for file in Path.cwd().iterdir()
-                if file.name.startswith(cls.table_name) and file.suffix == ".zip"
+                if file.name.startswith(cls.table_name)
+                and file.suffix in [".zip", ".parquet"]
             ]
             # make sure there is at least one file
             if not matching_files:
                 raise FileNotFoundError(
-                    f"No file found matching the {cls.table_name}-*.zip format"
+                    f"No file found matching the {cls.table_name}-*.zip "
+                    "(or *.parquet) format"
                 )
             # sort the files by date and grab the first
             matching_files.sort(reverse=True)
@@ -930,25 +1153,31 @@ class DatabaseTable(models.Model):
         # manipulations easier below.
         filename = Path(filename).absolute()
 
-        # uncompress the zip file to the same directory that it is located in
-        shutil.unpack_archive(
-            filename,
-            extract_dir=filename.parent,
-        )
-
-        # We will now have a csv file of the same name, which we load into
-        # a pandas dataframe
-        csv_filename = filename.with_suffix(".csv")  # was ".zip"
-        df = pandas.read_csv(csv_filename)
+        # Both archive formats are read as chunks of entries (lists of dicts),
+        # where each entry is a row of data.
+        if filename.suffix == ".parquet":
+            csv_filename = None
+            nentries, entry_chunks = cls._read_parquet_archive(filename, chunk_size)
+        else:
+            # uncompress the zip file to the same directory that it is located in
+            shutil.unpack_archive(
+                filename,
+                extract_dir=filename.parent,
+            )
+            # We will now have a csv file of the same name
+            csv_filename = filename.with_suffix(".csv")  # was ".zip"
+            nentries = None
+            entry_chunks = cls._read_csv_archive(csv_filename, chunk_size)
 
-        # BUG: NaN values throw errors when read into SQL databases, so we
-        # convert all NaN entries to None. This hacky line was taken from
-        #   https://stackoverflow.com/questions/39279824/
-        df = df.astype(object).where(df.notna(), None)
+        if not parallel:
+            cls._bulk_load_entries(entry_chunks, nentries, validate, nprocesses)
 
-        # convert the dataframe to a list of dictionaries that we will iterate
-        # through.
-        entries = df.to_dict(orient="records")
+            # We can now delete the files. The archive is only deleted if requested.
+            if csv_filename:
+                csv_filename.unlink()
+            if delete_on_completion:
+                filename.unlink()  # the zip or parquet archive
+            return
 
         # to enable parallelization, we define a function to load a single
         # entry (or row) of data. This allows us to submit the function to Dask.
@@ -967,39 +1196,153 @@ class DatabaseTable(models.Model):
             # OPTIMIZE: is there a better way to do decide which entries need to be
             # converted to toolkit objects?
 
-            # BUG: some columns don't properly convert to python objects, but
-            # it seems inconsistent when this is done... For now I just manually
-            # convert JSON columns
-            json_parsing_columns = ["site_forces", "lattice_stress"]
-            for column in json_parsing_columns:
-                if column in entry:
-                    if entry[column]:  # sometimes it has a value of None
-                        entry[column] = json.loads(entry[column])
-            # OPTIMIZE: consider applying this to the df column for faster loading
-
             entry_db = cls.from_toolkit(**entry)
             entry_db.save()
 
-        # now iterate through all entries to save them to the database
-        if not parallel:
-            # If user doesn't want parallelization, we run these in the main
-            # thread and monitor progress
-            for entry in track(entries):
-                load_single_entry(entry)
-        # otherwise we use dask to submit these in batches!
-        else:
-            from simmate.configuration.dask import batch_submit
+        # we use dask to submit these in batches!
+        from simmate.configuration.dask import batch_submit
 
+        for entries in entry_chunks:
             batch_submit(
                 function=load_single_entry,
                 args_list=entries,
                 batch_size=15000,
             )
 
-        # We can now delete the files. The zip file is only deleted if requested.
-        csv_filename.unlink()
+        # We can now delete the files. The archive is only deleted if requested.
+        if csv_filename:
+            csv_filename.unlink()
         if delete_on_completion:
-            filename.unlink()  # the zip archive
+            filename.unlink()  # the zip or parquet archive
+
+    @classmethod
+    def _bulk_load_entries(
+        cls,
+        entry_chunks: list[list[dict]],
+        nentries: int = None,
+        validate: bool = False,
+        nprocesses: int = 1,
+    ):
+        # Loads chunks of archive entries to the database with bulk_create.
+        # Columns that are missing from the archive (or all of them, if we
+        # are validating) are filled in with from_toolkit, which can be done
+        # in a process pool.
+
+        all_columns = {column.attname for column in cls._meta.concrete_fields}
+
+        # Rows that are already in the table are updated (just like save()
+        # would do), so we need the list of columns that can be updated.
+        primary_key = cls._meta.pk.name
+        update_fields = [
+            column.name
+            for column in cls._meta.concrete_fields
+            if not column.primary_key
+        ]
+
+        def iter_rows(executor):
+            for entries in entry_chunks:
+                if not entries:
+                    continue
+                elif not validate and all_columns.issubset(entries[0].keys()):
+                    yield entries
+                elif not executor:
+                    yield _get_archive_rows(cls, entries)
+                else:
+                    # split the chunk so that every process gets some of it
+                    size = len(entries) // nprocesses + 1
+                    subchunks = [
+                        entries[i : i + size] for i in range(0, len(entries), size)
+                    ]
+                    yield [
+                        row
+                        for rows in executor.map(
+                            _get_archive_rows, [cls] * len(subchunks), subchunks
+                        )
+                        for row in rows
+                    ]
+
+        executor = (
+            ProcessPoolExecutor(
+                max_workers=nprocesses,
+                initializer=init_worker_process,
+            )
+            if nprocesses > 1
+            else None
+        )
+        try:
+            with Progress() as progress:
+                task = progress.add_task("Loading...", total=nentries)
+                for rows in iter_rows(executor):
+                    with transaction.atomic():
+                        cls.objects.bulk_create(
+                            [cls(**row) for row in rows],
+                            update_conflicts=True,
+                            unique_fields=[primary_key],
+                            update_fields=update_fields,
+                        )
+                    progress.update(task, advance=len(rows))
+        finally:
+            if executor:
+                executor.shutdown()
+
+        # Because primary keys were given explicitly, databases such as Postgres
+        # don't advance their id counter. We reset it so that new rows don't
+        # collide with the ones we just loaded.
+        reset_queries = connection.ops.sequence_reset_sql(no_style(), [cls])
+        if reset_queries:
+            with connection.cursor() as cursor:
+                for query in reset_queries:
+                    cursor.execute(query)
+
+    @staticmethod
+    def _read_csv_archive(csv_filename: Path, chunk_size: int = 15000):
+        # Reads the csv file of a zip archive in chunks of entries
+        with pandas.read_csv(csv_filename, chunksize=chunk_size) as reader:
+            for df in reader:
+                # BUG: NaN values throw errors when read into SQL databases, so we
+                # convert all NaN entries to None. This hacky line was taken from
+                #   https://stackoverflow.com/questions/39279824/
+                df = df.astype(object).where(df.notna(), None)
+
+                # convert the dataframe to a list of dictionaries
+                entries = df.to_dict(orient="records")
+
+                # BUG: some columns don't properly convert to python objects, but
+                # it seems inconsistent when this is done... For now I just
+                # manually convert JSON columns
+                json_parsing_columns = ["site_forces", "lattice_stress"]
+                for entry in entries:
+                    for column in json_parsing_columns:
+                        if column in entry:
+                            if entry[column]:  # sometimes it has a value of None
+                                entry[column] = json.loads(entry[column])
+
+                yield entries
+
+    @staticmethod
+    def _read_parquet_archive(filename: Path, chunk_size: int = 15000):
+        # Gives the number of entries in a parquet archive, along with a
+        # generator that reads them in chunks
+        _import_pyarrow()
+        from pyarrow import parquet
+
+        archive = parquet.ParquetFile(filename)
+        json_columns = [
+            column.name
+            for column in archive.schema_arrow
+            if column.metadata and column.metadata.get(b"json")
+        ]
+
+        def iter_chunks():
+            for batch in archive.iter_batches(batch_size=chunk_size):
+                entries = batch.to_pylist()
+                for entry in entries:
+                    for column in json_columns:
+                        if entry[column] is not None:
+                            entry[column] = json.loads(entry[column])
+                yield entries
+
+        return archive.metadata.num_rows, iter_chunks()
 
     @classmethod
     def load_remote_archive(
@@ -1008,6 +1351,7 @@ class DatabaseTable(models.Model):
         confirm_override: bool = False,
         parallel: bool = False,
         confirm_sqlite_parallel: bool = False,
+        nprocesses: int = 1,
     ):
         """
         Downloads a compressed zip file made by `objects.to_archive` and loads
@@ -1038,6 +1382,10 @@ class DatabaseTable(models.Model):
             If the database backend is sqlite, this parameter ensures the user
             knows what they are doing and know the risks of parallelization.
             Default is False.
+
+        - `nprocesses`:
+            The number of processes to use when calculating columns for the
+            loaded rows. See `load_archive` for details. Default is 1.
         """
 
         # make sure the user actually wants to do this!
@@ -1082,6 +1430,7 @@ class DatabaseTable(models.Model):
             confirm_override=True,  # we already confirmed this above
             parallel=parallel,
             confirm_sqlite_parallel=True,  # we already confirmed this above
+            nprocesses=nprocesses,
         )
         logging.info("Done.")
 
@@ -1345,3 +1694,89 @@ class DatabaseTable(models.Model):
             if column not in columns_w_mixin and column != "id"
         ]
         return extra_columns
+
+
+def _get_archive_rows(table: DatabaseTable, entries: list[dict]) -> list[dict]:
+    """
+    Fills in all columns of archive entries using `from_toolkit`. The returned
+    dictionaries can be given directly to the table (e.g. `table(**row)`).
+    """
+    from simmate.toolkit import Structure as ToolkitStructure
+
+    rows = []
+    for entry in entries:
+        # older archives stored structures under a different column name
+        if "structure_string" in entry:
+            entry["structure"] = entry.pop("structure_string")
+        # We read the structure once here, rather than in every mix-in
+        if isinstance(entry.get("structure"), str):
+            entry["structure"] = ToolkitStructure.from_database_string(
+                entry["structure"]
+            )
+        rows.append(table.from_toolkit(as_dict=True, **entry))
+    return rows
+
+
+def _get_toolkit_structures(structure_strings: list[str]) -> list:
+    """
+    Converts the strings of a structure table's `structure` column to
+    toolkit structures (see `SearchResults.iter_toolkit`).
+    """
+    from simmate.toolkit import Structure as ToolkitStructure
+
+    return [ToolkitStructure.from_database_string(s) for s in structure_strings]
+
+
+def _link_database_objects(entries: list, future) -> list:
+    # For ease of access, we link each toolkit structure to its database
+    # entry -- just like `to_toolkit` does.
+    structures = future.result()
+    for entry, structure in zip(entries, structures):
+        structure.database_object = entry
+    return structures
+
+
+def _import_pyarrow():
+    # pyarrow is an optional dependency that is only needed for parquet archives
+    try:
+        import pyarrow
+    except ImportError:
+        raise Exception(
+            "Parquet archives require pyarrow, which is not installed. "
+            "Please install it with `pip install pyarrow`"
+        )
+    return pyarrow
+
+
+def _get_archive_schema(model: DatabaseTable, fieldset: list[str]):
+    """
+    Builds the pyarrow schema (i.e. column types) of a parquet archive using
+    the table's columns. JSON columns are stored as text and are marked with
+    `json` metadata so that they can be decoded when loading the archive.
+    """
+    pyarrow = _import_pyarrow()
+
+    columns = []
+    for name in fieldset:
+        column = model._meta.get_field(name)
+        # foreign keys have the same type as the column they point to
+        if column.is_relation:
+            column = column.target_field
+        column_type = column.get_internal_type()
+        metadata = None
+        if "Integer" in column_type or "AutoField" in column_type:
+            arrow_type = pyarrow.int64()
+        elif column_type == "FloatField":
+            arrow_type = pyarrow.float64()
+        elif column_type == "BooleanField":
+            arrow_type = pyarrow.bool_()
+        elif column_type == "DateTimeField":
+            arrow_type = pyarrow.timestamp("us", tz="UTC")
+        elif column_type == "JSONField":
+            arrow_type = pyarrow.string()
+            metadata = {"json": "true"}
+        else:
+            arrow_type = pyarrow.string()
+        columns.append(pyarrow.field(name, arrow_type, metadata=metadata))
+
+    return pyarrow.schema(columns)
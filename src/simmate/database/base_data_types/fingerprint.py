@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import numpy
+from django.db import connection, models, transaction
+from django.db.models import Max
+
 from simmate.database.base_data_types import DatabaseTable, table_column
 
 
@@ -45,15 +49,38 @@ class Fingerprint(DatabaseTable):
 
     class Meta:
         app_label = "core_components"
+        constraints = [
+            # Each structure should only have one fingerprint per pool. This
+            # also lets us add many fingerprints at once with an "upsert".
+            models.UniqueConstraint(
+                fields=["pool", "database_id"],
+                name="fingerprint_unique_per_pool",
+            ),
+        ]
+
+    dtype = numpy.float32
+    """
+    The numpy data type that fingerprints are stored as. float32 halves the
+    size of each row compared to float64, and its precision is well beyond
+    what is needed when comparing fingerprint distances.
+    """
 
     database_id = table_column.IntegerField(blank=True, null=True)
     """
     The id of the structure that this fingerprint came from
     """
 
+    fingerprint_binary = table_column.BinaryField(blank=True, null=True)
+    """
+    The resulting fingerprint, stored as the raw bytes of a 1D numpy array.
+    Use the `fingerprint_array` property to access it as an array.
+    """
+
     fingerprint = table_column.JSONField(blank=True, null=True)
     """
-    The resulting fingerprint. This is typically a 1D array.
+    The fingerprint as a JSON list, which is how older versions of Simmate
+    stored it. This is always empty for new rows, and existing rows are moved
+    to `fingerprint_binary` by `update_fingerprint_binaries`.
     """
 
     pool = table_column.ForeignKey(
@@ -77,3 +104,142 @@ class Fingerprint(DatabaseTable):
             "database_table": self.pool.database_table,
             "database_id": self.database_id,
         }
+
+    @property
+    def fingerprint_array(self) -> numpy.ndarray:
+        """
+        The resulting fingerprint as a 1D array
+        """
+        # rows from older versions may not have been moved over yet
+        if self.fingerprint_binary is None and self.fingerprint is not None:
+            return numpy.array(self.fingerprint, dtype=self.dtype).astype(float)
+        return self.decode_fingerprint(self.fingerprint_binary)
+
+    @fingerprint_array.setter
+    def fingerprint_array(self, fingerprint: list[float]):
+        self.fingerprint_binary = self.encode_fingerprint(fingerprint)
+        self.fingerprint = None
+
+    @classmethod
+    def encode_fingerprint(cls, fingerprint: list[float]) -> bytes:
+        """
+        Converts a fingerprint to bytes for the `fingerprint_binary` column
+        """
+        if fingerprint is None:
+            return None
+        return numpy.asarray(fingerprint, dtype=cls.dtype).tobytes()
+
+    @classmethod
+    def decode_fingerprint(cls, fingerprint_binary: bytes) -> numpy.ndarray:
+        """
+        Converts the bytes of the `fingerprint_binary` column to a 1D array
+        """
+        if fingerprint_binary is None:
+            return None
+        # note, postgres gives a memoryview rather than bytes
+        return numpy.frombuffer(fingerprint_binary, dtype=cls.dtype).astype(float)
+
+    @classmethod
+    def upsert_many(
+        cls,
+        pool: FingerprintPool,
+        database_ids: list[int],
+        fingerprints: list[list[float]],
+        batch_size: int = 1000,
+    ):
+        """
+        Adds many fingerprints to a pool in a few queries. If a structure
+        already has a fingerprint in the pool, it is replaced.
+
+        #### Parameters
+
+        - `pool`:
+            the FingerprintPool that the fingerprints belong to
+
+        - `database_ids`:
+            the id of the structure that each fingerprint came from
+
+        - `fingerprints`:
+            the list of fingerprints (in the same order as `database_ids`)
+
+        - `batch_size`:
+            the maximum number of rows to write in a single query
+        """
+        entries = [
+            cls(
+                pool=pool,
+                database_id=database_id,
+                fingerprint_binary=cls.encode_fingerprint(fingerprint),
+            )
+            for database_id, fingerprint in zip(database_ids, fingerprints)
+        ]
+        cls.objects.bulk_create(
+            entries,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["pool", "database_id"],
+            update_fields=["fingerprint_binary", "updated_at"],
+        )
+
+    # -------------------------------------------------------------------------
+    # Methods for updating rows saved by older versions of Simmate
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def remove_duplicates(cls) -> int:
+        """
+        Deletes all but the newest fingerprint of each structure in a pool.
+        Older versions of Simmate could add duplicates in a race between
+        workers, and these must be removed before the unique constraint of
+        this table can be added. Returns the number of fingerprints deleted.
+
+        This is called by `simmate database update` BEFORE migrating, so it
+        only uses columns that exist in both the old and new tables.
+        """
+        if cls._meta.db_table not in connection.introspection.table_names():
+            return 0
+
+        fingerprints = cls.objects.filter(
+            pool__isnull=False,
+            database_id__isnull=False,
+        )
+        newest_ids = (
+            fingerprints.values("pool", "database_id")
+            .annotate(newest_id=Max("id"))
+            .values("newest_id")
+        )
+        # We find the ids first because some databases (e.g. MySQL) don't
+        # allow a subquery of the same table within a DELETE
+        duplicate_ids = list(
+            fingerprints.exclude(id__in=newest_ids).values_list("id", flat=True)
+        )
+        nduplicates = len(duplicate_ids)
+        for start in range(0, nduplicates, 1000):
+            cls.objects.filter(id__in=duplicate_ids[start : start + 1000]).delete()
+        return nduplicates
+
+    @classmethod
+    def update_fingerprint_binaries(cls, chunk_size: int = 1000) -> int:
+        """
+        Moves fingerprints that were saved by older versions of Simmate (as
+        JSON in the `fingerprint` column) to the `fingerprint_binary` column.
+        Without this, these fingerprints are ignored by validators and
+        recalculated. This is called by `simmate database update`. Returns the
+        number of fingerprints updated.
+        """
+        # We page through by id because the rows change as we update them
+        fingerprints = (
+            cls.objects.filter(fingerprint__isnull=False)
+            .only("id", "fingerprint")
+            .order_by("id")
+        )
+        nupdated = 0
+        last_id = 0
+        while chunk := list(fingerprints.filter(id__gt=last_id)[:chunk_size]):
+            for fingerprint in chunk:
+                fingerprint.fingerprint_array = fingerprint.fingerprint
+            with transaction.atomic():
+                cls.objects.bulk_update(chunk, ["fingerprint_binary", "fingerprint"])
+            nupdated += len(chunk)
+            last_id = chunk[-1].id
+        return nupdated
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 from django_filters import rest_framework as django_api_filters
 from scipy.constants import Avogadro
 
 from simmate.database.base_data_types import DatabaseTable, Spacegroup, table_column
+from simmate.file_converters.structure.compact import CompactStringAdapter
 from simmate.toolkit import Structure as ToolkitStructure
-from simmate.utilities import get_chemical_subsystems
+from simmate.utilities import get_chemical_subsystems, init_worker_process
 
 
 class Structure(DatabaseTable):
@@ -214,14 +219,6 @@ class Structure(DatabaseTable):
         # already be in this format...
         structure = ToolkitStructure.from_dynamic(structure)
 
-        # OPTIMIZE: I currently store files as poscar strings for ordered structures
-        # and as CIFs for disordered structures. Both of this include excess information
-        # that slightly inflates file size, so I will be making a new string format in
-        # the future. This will largely be based off the POSCAR format, but will
-        # account for disordered structures and all limit repeated data (such as the
-        # header line, "direct", listing each element/composition, etc.).
-        storage_format = "POSCAR" if structure.is_ordered else "CIF"
-
         # OPTIMIZE
         # This attempts to match the structure to an AFLOW prototype and it is
         # by far the slowest step of loading structures to the database. Try
@@ -236,29 +233,7 @@ class Structure(DatabaseTable):
         # object, but will NOT save it to the database yet. The kwargs input
         # is only if you inherit from this class and add extra fields.
         structure_dict = dict(
-            structure=structure.to(fmt=storage_format),
-            nsites=structure.num_sites,
-            nelements=len(structure.composition),
-            elements=[str(e) for e in structure.composition.elements],
-            chemical_system=structure.composition.chemical_system,
-            density=float(structure.density),
-            density_atomic=structure.num_sites / structure.volume,
-            volume=structure.volume,
-            # 1e-27 is to convert from cubic angstroms to Liter and then 1e3 to
-            # mL. Therefore this value is in mL/mol
-            # OPTIMIZE: move this to a class method
-            volume_molar=(structure.volume / structure.num_sites)
-            * Avogadro
-            * 1e-27
-            * 1e3,
-            # OPTIMIZE SPACEGROUP INFO
-            spacegroup_id=structure.get_space_group_info(
-                symprec=0.1,
-                # angle_tolerance=5.0,
-            )[1],
-            formula_full=structure.composition.formula,
-            formula_reduced=structure.composition.reduced_formula,
-            formula_anonymous=structure.composition.anonymized_formula,
+            **get_structure_columns(structure),
             # prototype=prototype_name,
             **kwargs,  # this allows subclasses to add fields with ease
         )
@@ -266,8 +241,231 @@ class Structure(DatabaseTable):
         # return the dictionary
         return structure_dict if as_dict else cls(**structure_dict)
 
+    @classmethod
+    def from_toolkits(
+        cls,
+        structures: list[ToolkitStructure | str],
+        extra_columns: list[dict] = None,
+        nprocesses: int = 1,
+        as_dict: bool = False,
+        **kwargs,
+    ) -> list:
+        """
+        The same as calling `from_toolkit` on each structure, but columns that
+        are calculated from the structure (e.g. the spacegroup) are found for
+        many structures at once. Identical structures are only analyzed once,
+        and the remaining ones can be split across a process pool.
+
+        The returned objects are not saved, so they can be written with
+        `MyTable.objects.bulk_create(...)`.
+
+        #### Parameters
+
+        - `structures`:
+            The list of structures (or database strings of structures) to
+            convert.
+
+        - `extra_columns`:
+            A list of extra columns (e.g. `dict(energy=-1.23)`) for each of the
+            structures. These are passed to `from_toolkit`.
+
+        - `nprocesses`:
+            The number of processes to use when analyzing structures.
+            Default is 1.
+
+        - `as_dict`:
+            Whether to return dictionaries instead of database objects.
+            Defaults to False.
+
+        - `**kwargs`:
+            Any extra columns that are the same for all structures (e.g.
+            `relaxation=my_relaxation`). These are passed to `from_toolkit`.
+        """
+
+        structures = [
+            ToolkitStructure.from_database_string(structure)
+            if isinstance(structure, str)
+            else structure
+            for structure in structures
+        ]
+
+        extra_columns = extra_columns or [{}] * len(structures)
+
+        executor = (
+            ProcessPoolExecutor(
+                max_workers=nprocesses,
+                initializer=init_worker_process,
+            )
+            if nprocesses > 1
+            else None
+        )
+
+        # We go through the structures in chunks so that only the columns of
+        # one chunk are held in memory at a time
+        chunk_size = 1000
+        results = []
+        try:
+            for start in range(0, len(structures), chunk_size):
+                chunk = structures[start : start + chunk_size]
+
+                # Find all structures that haven't been analyzed before. Identical
+                # structures have the same key, so each is only analyzed once.
+                chunk_columns = {}
+                missing = {}
+                for structure in chunk:
+                    key = _get_structure_key(structure)
+                    if key in chunk_columns or key in missing:
+                        continue
+                    columns = _get_cached_structure_columns(key)
+                    if columns:
+                        chunk_columns[key] = columns
+                    else:
+                        missing[key] = structure
+
+                if executor and len(missing) > 1:
+                    all_columns = executor.map(
+                        get_structure_columns,
+                        missing.values(),
+                        chunksize=max(len(missing) // (nprocesses * 4), 1),
+                    )
+                else:
+                    all_columns = map(get_structure_columns, missing.values())
+                for key, columns in zip(missing.keys(), all_columns):
+                    chunk_columns[key] = columns
+                    _cache_structure_columns(key, columns)
+
+                # The columns are handed to get_structure_columns directly (and
+                # not through the cache, which may be too small or turned off),
+                # so from_toolkit won't need to analyze any of the structures
+                # again
+                _CHUNK_STRUCTURE_COLUMNS.columns = chunk_columns
+                try:
+                    results += [
+                        cls.from_toolkit(
+                            as_dict=as_dict,
+                            structure=structure,
+                            **extra,
+                            **kwargs,
+                        )
+                        for structure, extra in zip(
+                            chunk, extra_columns[start : start + chunk_size]
+                        )
+                    ]
+                finally:
+                    _CHUNK_STRUCTURE_COLUMNS.columns = {}
+        finally:
+            if executor:
+                executor.shutdown()
+
+        return results
+
     def to_toolkit(self) -> ToolkitStructure:
         """
         Converts the database object to toolkit Structure object.
         """
         return ToolkitStructure.from_database_object(self)
+
+
+def get_structure_columns(structure: ToolkitStructure) -> dict:
+    """
+    Gives the columns of the `Structure` table that are calculated from a
+    toolkit structure. Results for identical structures are cached, so saving
+    the same structure many times (e.g. when loading archives or in searches)
+    only analyzes it once.
+    """
+    key = _get_structure_key(structure)
+    columns = getattr(_CHUNK_STRUCTURE_COLUMNS, "columns", {}).get(key)
+    if not columns:
+        columns = _get_cached_structure_columns(key)
+    if columns:
+        # elements is the only mutable value, so we copy it
+        return {**columns, "elements": list(columns["elements"])}
+
+    # Structures are stored with a compact string format, which is written
+    # and read with numpy (see simmate.file_converters.structure.compact).
+    # We call the adapter directly rather than structure.to_database_string
+    # because this function is also given plain pymatgen structures.
+    columns = dict(
+        structure=CompactStringAdapter.get_string(structure),
+        nsites=structure.num_sites,
+        nelements=len(structure.composition),
+        elements=[str(e) for e in structure.composition.elements],
+        chemical_system=structure.composition.chemical_system,
+        density=float(structure.density),
+        density_atomic=structure.num_sites / structure.volume,
+        volume=structure.volume,
+        # 1e-27 is to convert from cubic angstroms to Liter and then 1e3 to
+        # mL. Therefore this value is in mL/mol
+        # OPTIMIZE: move this to a class method
+        volume_molar=(structure.volume / structure.num_sites) * Avogadro * 1e-27 * 1e3,
+        # OPTIMIZE SPACEGROUP INFO
+        # This is the slowest step by far. Note, pymatgen calls spglib here.
+        spacegroup_id=structure.get_space_group_info(
+            symprec=0.1,
+            # angle_tolerance=5.0,
+        )[1],
+        formula_full=structure.composition.formula,
+        formula_reduced=structure.composition.reduced_formula,
+        formula_anonymous=structure.composition.anonymized_formula,
+    )
+    _cache_structure_columns(key, columns)
+    return {**columns, "elements": list(columns["elements"])}
+
+
+# Results of get_structure_columns, where the oldest entries are removed
+# once the cache is full. This cache is shared by the whole process, so it is
+# kept small by default (each entry is a few kB for typical structures). Use
+# set_structure_columns_cache_size to change this.
+_STRUCTURE_COLUMNS_CACHE = OrderedDict()
+_STRUCTURE_COLUMNS_CACHE_SIZE = 1000
+
+# Workers with several slots save structures from multiple threads at once.
+# Reads also reorder the cache, so all access is done with this lock.
+_STRUCTURE_COLUMNS_LOCK = threading.Lock()
+
+# Columns of the chunk that from_toolkits is currently converting (per thread)
+_CHUNK_STRUCTURE_COLUMNS = threading.local()
+
+
+def set_structure_columns_cache_size(size: int):
+    """
+    Sets the maximum number of structures whose calculated columns are cached
+    by `get_structure_columns` (default is 1000). Use 0 to turn the cache off.
+    Entries beyond the new size are removed right away.
+    """
+    global _STRUCTURE_COLUMNS_CACHE_SIZE
+    if size < 0:
+        raise Exception("The structure columns cache size cannot be negative")
+    with _STRUCTURE_COLUMNS_LOCK:
+        _STRUCTURE_COLUMNS_CACHE_SIZE = size
+        while len(_STRUCTURE_COLUMNS_CACHE) > size:
+            _STRUCTURE_COLUMNS_CACHE.popitem(last=False)
+
+
+def _get_structure_key(structure: ToolkitStructure) -> tuple:
+    # A quick key that is only equal for identical structures. Site properties
+    # (e.g. selective dynamics or magnetic moments) can change the columns, so
+    # these are included too.
+    return (
+        structure.lattice.matrix.tobytes(),
+        structure.frac_coords.tobytes(),
+        tuple(str(species) for species in structure.species_and_occu),
+        repr(structure.site_properties),
+    )
+
+
+def _get_cached_structure_columns(key: tuple) -> dict:
+    with _STRUCTURE_COLUMNS_LOCK:
+        columns = _STRUCTURE_COLUMNS_CACHE.get(key)
+        if columns:
+            _STRUCTURE_COLUMNS_CACHE.move_to_end(key)
+    return columns
+
+
+def _cache_structure_columns(key: tuple, columns: dict):
+    with _STRUCTURE_COLUMNS_LOCK:
+        if not _STRUCTURE_COLUMNS_CACHE_SIZE:
+            return
+        _STRUCTURE_COLUMNS_CACHE[key] = columns
+        if len(_STRUCTURE_COLUMNS_CACHE) > _STRUCTURE_COLUMNS_CACHE_SIZE:
+            _STRUCTURE_COLUMNS_CACHE.popitem(last=False)
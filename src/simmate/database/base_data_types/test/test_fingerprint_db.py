@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from django.db import IntegrityError, connection
+
+from simmate.database.base_data_types import Fingerprint, FingerprintPool
+
+
+@pytest.mark.django_db
+def test_fingerprint_upsert():
+    pool = FingerprintPool.objects.create(method="test", database_table="Test")
+
+    Fingerprint.upsert_many(pool, [1, 2], [[0.5, 1.5], [2, 3]])
+    # existing rows are replaced rather than duplicated
+    Fingerprint.upsert_many(pool, [2, 3], [[4, 5], [6, 7]])
+
+    fingerprints = {
+        fp.database_id: fp.fingerprint_array.tolist() for fp in pool.fingerprints.all()
+    }
+    assert fingerprints == {1: [0.5, 1.5], 2: [4, 5], 3: [6, 7]}
+
+    with pytest.raises(IntegrityError):
+        Fingerprint.objects.create(
+            pool=pool,
+            database_id=1,
+            fingerprint_binary=Fingerprint.encode_fingerprint([0, 0]),
+        )
+
+
+@pytest.mark.django_db
+def test_update_fingerprint_binaries():
+    pool = FingerprintPool.objects.create(method="test", database_table="Test")
+
+    # rows saved by older versions only have the json column
+    Fingerprint.objects.create(pool=pool, database_id=1, fingerprint=[0.5, 1.5])
+    Fingerprint.upsert_many(pool, [2], [[2, 3]])
+    assert Fingerprint.objects.get(database_id=1).fingerprint_array.tolist() == [
+        0.5,
+        1.5,
+    ]
+
+    assert Fingerprint.update_fingerprint_binaries(chunk_size=1) == 1
+    assert Fingerprint.update_fingerprint_binaries() == 0
+    fingerprint = Fingerprint.objects.get(database_id=1)
+    assert fingerprint.fingerprint is None
+    assert Fingerprint.decode_fingerprint(fingerprint.fingerprint_binary).tolist() == [
+        0.5,
+        1.5,
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fingerprint_remove_duplicates(monkeypatch):
+    # Older versions of Simmate didn't have the unique constraint, so we
+    # remove it to add the duplicates that they could make. Note, SQLite
+    # rebuilds the table from the model, so we remove it there too.
+    constraint = Fingerprint._meta.constraints[0]
+    monkeypatch.setattr(Fingerprint._meta, "constraints", [])
+    with connection.schema_editor() as editor:
+        editor.remove_constraint(Fingerprint, constraint)
+
+    try:
+        pool = FingerprintPool.objects.create(method="test", database_table="Test")
+        other_pool = FingerprintPool.objects.create(method="test2")
+        for database_id, fingerprint in [(1, [0]), (1, [1]), (2, [2]), (1, [3])]:
+            Fingerprint.objects.create(
+                pool=pool, database_id=database_id, fingerprint=fingerprint
+            )
+        Fingerprint.objects.create(pool=other_pool, database_id=1, fingerprint=[4])
+        # rows without a structure id are never duplicates
+        for _ in range(2):
+            Fingerprint.objects.create(pool=pool, fingerprint=[5])
+
+        assert Fingerprint.remove_duplicates() == 2
+        assert Fingerprint.remove_duplicates() == 0
+
+        # the newest fingerprint of each structure is kept
+        remaining = Fingerprint.objects.order_by("id").values_list(
+            "pool", "database_id", "fingerprint"
+        )
+        assert list(remaining) == [
+            (pool.id, 2, [2]),
+            (pool.id, 1, [3]),
+            (other_pool.id, 1, [4]),
+            (pool.id, None, [5]),
+            (pool.id, None, [5]),
+        ]
+
+    finally:
+        Fingerprint.objects.all().delete()
+        monkeypatch.undo()
+        with connection.schema_editor() as editor:
+            editor.add_constraint(Fingerprint, constraint)
@@ -49,3 +49,22 @@ def test_forces_table(structure, tmp_path):
         confirm_override=True,
         delete_on_completion=True,
     )
+
+
+@pytest.mark.django_db
+def test_forces_parquet_archive(structure, tmp_path):
+    pytest.importorskip("pyarrow")
+
+    example_forces = [[0.5, 0.5, 0.5]] * structure.num_sites
+    TestForces.from_toolkit(structure=structure, site_forces=example_forces).save()
+    TestForces.from_toolkit(structure=structure).save()
+
+    # write with small chunks so that multiple row groups are made
+    archive_filename = tmp_path / "archive.parquet"
+    TestForces.objects.to_archive(archive_filename, chunk_size=1)
+    TestForces.objects.all().delete()
+
+    TestForces.load_archive(archive_filename, confirm_override=True)
+    assert TestForces.objects.count() == 2
+    entry = TestForces.objects.filter(site_forces__isnull=False).get()
+    assert entry.site_forces == example_forces
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import pandas
 import pytest
 from pandas import DataFrame
 
+from simmate.database.base_data_types import structure as structure_module
 from simmate.toolkit import Structure
 from simmate.website.test_app.models import TestStructure
 
@@ -44,3 +46,110 @@ def test_structure_archives():
         confirm_override=True,
         delete_on_completion=True,
     )
+
+
+@pytest.mark.django_db
+def test_structure_archives_bulk(sample_structures, tmp_path):
+    TestStructure.objects.all().delete()
+    for name in ["C_mp-48_primitive", "Fe_mp-13_primitive", "SiO2_mp-7029_primitive"]:
+        TestStructure.from_toolkit(structure=sample_structures[name]).save()
+    expected = list(TestStructure.objects.order_by("id").values())
+
+    # Reloading a zip archive needs all columns to be calculated again,
+    # which we do using a process pool
+    archive_filename = tmp_path / "archive.zip"
+    TestStructure.objects.to_archive(archive_filename)
+    TestStructure.objects.all().delete()
+    TestStructure.load_archive(archive_filename, confirm_override=True, nprocesses=2)
+
+    loaded = list(TestStructure.objects.order_by("id").values())
+    for row in expected + loaded:
+        row.pop("created_at")
+        row.pop("updated_at")
+    assert loaded == expected
+
+
+@pytest.mark.django_db
+def test_structure_from_toolkits(sample_structures):
+    names = ["C_mp-48_primitive", "Fe_mp-13_primitive", "SiO2_mp-7029_primitive"]
+    structures = [sample_structures[name] for name in names] * 2
+    expected = [
+        TestStructure.from_toolkit(structure=structure, as_dict=True)
+        for structure in structures
+    ]
+
+    # analyze again without the cache, which also tests the process pool
+    structure_module._STRUCTURE_COLUMNS_CACHE.clear()
+    results = TestStructure.from_toolkits(structures, nprocesses=2, as_dict=True)
+    assert results == expected
+    assert len(structure_module._STRUCTURE_COLUMNS_CACHE) == len(names)
+
+    # objects should be ready for bulk_create
+    TestStructure.objects.all().delete()
+    TestStructure.objects.bulk_create(TestStructure.from_toolkits(structures))
+    assert TestStructure.objects.count() == len(structures)
+
+
+def test_structure_columns_cache_size(sample_structures, monkeypatch):
+    names = ["C_mp-48_primitive", "Fe_mp-13_primitive", "SiO2_mp-7029_primitive"]
+    structures = [sample_structures[name] for name in names] * 2
+    expected = [
+        TestStructure.from_toolkit(structure=structure, as_dict=True)
+        for structure in structures
+    ]
+
+    # count how often structures are analyzed
+    nanalyzed = []
+    get_string = structure_module.CompactStringAdapter.get_string
+    monkeypatch.setattr(
+        structure_module.CompactStringAdapter,
+        "get_string",
+        lambda structure: nanalyzed.append(1) or get_string(structure),
+    )
+
+    try:
+        # with the cache off, from_toolkits still only analyzes each unique
+        # structure once
+        structure_module.set_structure_columns_cache_size(0)
+        assert len(structure_module._STRUCTURE_COLUMNS_CACHE) == 0
+        results = TestStructure.from_toolkits(structures, as_dict=True)
+        assert results == expected
+        assert len(nanalyzed) == len(names)
+        assert len(structure_module._STRUCTURE_COLUMNS_CACHE) == 0
+
+        # the oldest entries are removed when the cache is made smaller
+        structure_module.set_structure_columns_cache_size(3)
+        TestStructure.from_toolkits(structures)
+        assert len(structure_module._STRUCTURE_COLUMNS_CACHE) == 3
+        structure_module.set_structure_columns_cache_size(1)
+        assert len(structure_module._STRUCTURE_COLUMNS_CACHE) == 1
+
+        with pytest.raises(Exception):
+            structure_module.set_structure_columns_cache_size(-1)
+    finally:
+        structure_module.set_structure_columns_cache_size(1000)
+
+
+@pytest.mark.django_db
+def test_structure_iterators(sample_structures):
+    TestStructure.objects.all().delete()
+    for name in ["C_mp-48_primitive", "Fe_mp-13_primitive", "SiO2_mp-7029_primitive"]:
+        TestStructure.from_toolkit(structure=sample_structures[name]).save()
+    search_results = TestStructure.objects.order_by("id")
+
+    # chunks are decoded in other processes, but order must be kept
+    expected = search_results.to_toolkit()
+    for nprocesses in [1, 2]:
+        structures = list(
+            search_results.iter_toolkit(chunk_size=2, nprocesses=nprocesses)
+        )
+        assert structures == expected
+        assert [s.database_object.id for s in structures] == [
+            s.database_object.id for s in expected
+        ]
+
+    dataframes = list(search_results.iter_dataframes(chunk_size=2))
+    assert [len(df) for df in dataframes] == [2, 1]
+    assert pandas.concat(dataframes, ignore_index=True).equals(
+        search_results.to_dataframe()
+    )
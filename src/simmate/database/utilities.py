@@ -6,6 +6,7 @@ from pathlib import Path
 
 from django.apps import apps
 from django.core.management import call_command
+from django.db import transaction
 
 from simmate.configuration.django.settings import DATABASES
 
@@ -20,10 +21,26 @@ def update_database(apps_to_migrate=APPS_TO_MIGRATE, show_logs: bool = True):
     if show_logs:
         logging.info("Checking for and applying updates...")
 
+    # Some rows must be cleaned up before new constraints can be added
+    from simmate.database.base_data_types import Fingerprint
+
+    Fingerprint.remove_duplicates()
+
     # execute the following commands to update the database
     call_command("makemigrations", *apps_to_migrate)
     call_command("migrate")
 
+    # New columns that are calculated from other columns need to be filled
+    # in for existing rows
+    from simmate.engine.execution import WorkItem
+
+    WorkItem.update_tags_strings()
+    Fingerprint.update_fingerprint_binaries()
+    if apps.is_installed("simmate.apps.evolution"):
+        from simmate.apps.evolution.models import SteadystateSource
+
+        SteadystateSource.update_workitems()
+
     # Let the user know everything succeeded
     if show_logs:
         logging.info("Success! Your database tables are now up to date. :sparkles:")
@@ -211,6 +228,56 @@ def load_database_from_json(filename="database_dump.json"):
     )
 
 
+def update_structure_strings(chunk_size: int = 1000):
+    """
+    Rewrites the `structure` column of every structure table so that all rows
+    use the current (compact) string format. Older rows were stored as POSCAR
+    or CIF strings, which are still readable, but are larger and slower to
+    load.
+
+    #### Parameters
+
+    - `chunk_size`:
+        the number of rows to load, convert, and save at a time
+    """
+    from simmate.database.base_data_types import Structure as DatabaseStructure
+    from simmate.file_converters.structure.compact import CompactStringAdapter
+    from simmate.toolkit import Structure as ToolkitStructure
+
+    for model in apps.get_models():
+        if not issubclass(model, DatabaseStructure) or model._meta.proxy:
+            continue
+
+        # We page through the table by primary key (rather than with offsets)
+        # so that each query stays fast and rows that we've already updated
+        # are never revisited.
+        queryset = (
+            model.objects.exclude(structure__isnull=True)
+            .exclude(structure__startswith=CompactStringAdapter.header)
+            .only("pk", "structure")
+            .order_by("pk")
+        )
+        nupdated = 0
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            entries = list(chunk[:chunk_size])
+            if not entries:
+                break
+            for entry in entries:
+                structure = ToolkitStructure.from_database_string(entry.structure)
+                entry.structure = CompactStringAdapter.get_string(structure)
+            with transaction.atomic():
+                model.objects.bulk_update(entries, ["structure"])
+            nupdated += len(entries)
+            last_pk = entries[-1].pk
+
+        if nupdated:
+            logging.info(f"Updated {nupdated} structures in {model.__name__}")
+
+    logging.info("Success! All structures use the latest format. :sparkles:")
+
+
 # BUG: This function isn't working as intended
 # def graph_database(filename="database_graph.png"):
 
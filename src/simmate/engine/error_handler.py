@@ -6,8 +6,13 @@ If this is of particular interest to you, please let our team know so that
 we can prioritize creating these guides for you.
 """
 
+import mmap
+import os
+import re
 import subprocess
+import threading
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -53,6 +58,13 @@ class ErrorHandler(ABC):
     that occur early in the run but do not cause immediate failure.
     """
 
+    monitor_interval: float = None
+    """
+    If this error handler is a monitor, this is how often (in seconds) it
+    should check for errors when a S3Workflow uses asyncio (`use_async=True`).
+    By default, the S3Workflow's `polling_timestep * monitor_freq` is used.
+    """
+
     has_custom_termination: bool = False
     """
     If this error handler has a custom method to end the job. This is useful in
@@ -124,22 +136,19 @@ class ErrorHandler(ABC):
         # establish the full path to the output file
         filename = directory / self.filename_to_check
 
-        # check to see that the file is there first
-        if filename.exists():
-            # read the file content and then close it
-            with filename.open() as file:
-                file_text = file.read()
-            # Check if each error is present
-            for message in self.possible_error_messages:
-                # if the error is NOT present, find() returns a -1
-                if file_text.find(message) != -1:
-                    # If one of the messages is found, we immediately return that
-                    # the error has been found.
-                    return True
-
-        # If the file doesn't exist, then we are not seeing any error yet. This line
-        # will also be reached if no error was found above.
-        return False
+        # Monitors call this method over and over while output files grow
+        # (sometimes to several GB), and many handlers check the same file.
+        # So rather than reading the full file each time, we use a scanner
+        # that is shared by all handlers and only reads newly added content.
+        # If the file doesn't exist, then we are not seeing any error yet.
+        scanner = FileScanner.get_scanner(filename)
+        scanner.add_messages(self.possible_error_messages)
+        messages_found = scanner.scan()
+
+        # If one of the messages is found, we return that the error has been found.
+        return any(
+            message in messages_found for message in self.possible_error_messages
+        )
 
     @abstractmethod
     def correct(self, directory: Path) -> str:
@@ -199,3 +208,156 @@ class ErrorHandler(ABC):
             "This error handler is missing a terminate_job method even though"
             " has_custom_termination=True."
         )
+
+
+class FileScanner:
+    """
+    Searches a file for a series of messages, while only reading the content
+    that was added since the last scan. This is used by the default
+    `ErrorHandler.check` method.
+
+    There is a single scanner per file (see `get_scanner`), and it searches for
+    the messages of all handlers at once. Therefore, when many handlers check
+    the same file, only the first check of each monitoring step reads anything
+    new. Large reads are done with mmap to avoid copying the file into memory.
+
+    If the file is truncated or replaced (e.g. a command is restarted), the
+    scanner starts over from the beginning of the file. Scanners are removed
+    once the command in their directory finishes (see `forget`), so they only
+    live as long as the run they belong to.
+    """
+
+    mmap_min_size: int = 1_000_000
+    """
+    Reads larger than this (in bytes) are done with mmap
+    """
+
+    anchor_size: int = 64
+    """
+    The number of bytes at the end of the scanned content that we recheck to
+    make sure the file wasn't rewritten since our last scan.
+    """
+
+    _scanners: dict = {}
+    _scanners_lock = threading.Lock()
+
+    def __init__(self, filename: Path):
+        self.filename = Path(filename)
+        self.messages = set()
+        self._lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def get_scanner(cls, filename: Path):
+        """
+        Gives the shared scanner for a file, creating it if needed
+        """
+        filename = Path(filename).absolute()
+        with cls._scanners_lock:
+            if filename not in cls._scanners:
+                cls._scanners[filename] = cls(filename)
+            return cls._scanners[filename]
+
+    @classmethod
+    def forget(cls, directory: Path):
+        """
+        Removes all scanners for files within the given directory. This is
+        done each time a command is (re)started in the directory, and once
+        supervision of the directory has finished.
+        """
+        directory = Path(directory).absolute()
+        with cls._scanners_lock:
+            for filename in list(cls._scanners.keys()):
+                if directory in filename.parents:
+                    cls._scanners.pop(filename)
+
+    def reset(self):
+        """
+        Forgets everything that was scanned, so the next scan starts over
+        """
+        self.offset = 0
+        self.inode = None
+        self.anchor = b""
+        self.messages_scanned = set()
+        self.messages_found = set()
+
+    def add_messages(self, messages: list[str]):
+        """
+        Registers messages to search for. New messages are searched for in
+        the full file during the next scan.
+        """
+        self.messages.update(messages)
+
+    def scan(self) -> set[str]:
+        """
+        Reads any new content of the file and returns all of the messages
+        that have been found in the file so far.
+        """
+        with self._lock:
+            if not self.filename.exists():
+                self.reset()
+                return set()
+
+            with self.filename.open("rb") as file:
+                stats = os.fstat(file.fileno())
+                size = stats.st_size
+
+                if self._was_replaced(file, stats):
+                    self.reset()
+
+                new_messages = self.messages - self.messages_scanned
+                if size == self.offset and not new_messages:
+                    return set(self.messages_found)
+
+                # Messages can be split between two reads, so we back up to
+                # include the end of the previous read.
+                overlap = max([len(m.encode()) for m in self.messages] + [1]) - 1
+                start_old = max(self.offset - overlap, 0)
+                start = 0 if new_messages else start_old
+
+                if size - start >= self.mmap_min_size:
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        self._search(data, start_old, size, self.messages_scanned)
+                        self._search(data, 0, size, new_messages)
+                        self.anchor = data[max(size - self.anchor_size, 0) : size]
+                else:
+                    file.seek(start)
+                    data = file.read(size - start)
+                    size = start + len(data)
+                    self._search(data, start_old - start, None, self.messages_scanned)
+                    self._search(data, 0, None, new_messages)
+                    self.anchor = data[-self.anchor_size :]
+
+            self.offset = size
+            self.inode = stats.st_ino
+            self.messages_scanned.update(new_messages)
+            return set(self.messages_found)
+
+    def _was_replaced(self, file, stats) -> bool:
+        if not self.offset:
+            return False
+        if stats.st_ino != self.inode or stats.st_size < self.offset:
+            return True
+        file.seek(self.offset - len(self.anchor))
+        return file.read(len(self.anchor)) != self.anchor
+
+    def _search(self, data, start: int, end: int, messages: set[str]):
+        messages = [m for m in messages if m not in self.messages_found]
+        if not messages:
+            return
+        end = len(data) if end is None else end
+
+        # All messages are searched for in a single pass. Errors are rare, so
+        # this is typically the only pass. Only if something is found do we
+        # check which of the messages it was.
+        pattern = _compile_messages(tuple(sorted(messages)))
+        if not pattern.search(data, start, end):
+            return
+        for message in messages:
+            if data.find(message.encode(), start, end) != -1:
+                self.messages_found.add(message)
+
+
+@lru_cache(maxsize=256)
+def _compile_messages(messages: tuple[str]) -> re.Pattern:
+    return re.compile(b"|".join(re.escape(m.encode()) for m in messages))
@@ -1,5 +1,12 @@
 # -*- coding: utf-8 -*-
 
-from .database import WorkItem
+from .database import (
+    WorkerRecord,
+    WorkItem,
+    WorkItemArchive,
+    WorkItemPayload,
+    as_completed,
+    wait,
+)
 from .executor import SimmateExecutor
 from .worker import SimmateWorker
@@ -1,27 +1,169 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import math
+import os
 import time
+import uuid
+
+from simmate.engine.execution.database import WorkerRecord, WorkItem
 
 
 class Cluster:
     @classmethod
-    def start_cluster(cls, nworkers: int, sleep_step: float = 5):
+    def start_cluster(
+        cls,
+        nworkers: int,
+        sleep_step: float = 5,
+        max_nworkers: int = None,
+        tags: list[str] = ["simmate"],
+        nitems_per_worker: int = 1,
+    ):
+        """
+        Submits workers and then monitors them endlessly, submitting new
+        workers whenever we drop below our target. This runs until the user
+        closes the script.
+
+        By default, the target is a fixed number of workers. If `max_nworkers`
+        is given, the cluster instead autoscales: the target is sized from
+        the number of WorkItems in the queue (pending or running), and then
+        bounded by `nworkers` and `max_nworkers`. When there are more workers
+        than needed, idle workers are asked to shut down. Only workers that
+        were submitted by this cluster are ever shut down (see `submit_jobs`).
+
+        #### Parameters
+
+        - `nworkers`:
+            the number of workers to keep running. When autoscaling, this is
+            instead the minimum number of workers.
+
+        - `sleep_step`:
+            the time (in seconds) between checks of the jobs and queue
+
+        - `max_nworkers`:
+            the maximum number of workers to scale up to. If not given, the
+            cluster will not autoscale.
+
+        - `tags`:
+            the tags of WorkItems that these workers run. This is only used
+            when autoscaling and should match the tags that the workers were
+            started with.
+
+        - `nitems_per_worker`:
+            when autoscaling, the number of WorkItems in the queue that each
+            worker should be responsible for. For example, a value of 4 with
+            20 WorkItems in the queue will give a target of 5 workers.
+        """
+
+        if max_nworkers is not None and max_nworkers < nworkers:
+            raise Exception("max_nworkers cannot be smaller than nworkers")
+
         logging.info(f"Starting cluster with {nworkers} workers")
 
+        # Each cluster gets a unique id, which its workers record so that we
+        # can tell them apart from other workers using the same database.
+        cluster_id = str(uuid.uuid4())
+
         # on start-up we need to submit the target number of jobs
-        job_ids = cls.submit_jobs(nworkers)
+        job_ids = cls.submit_jobs(nworkers, cluster_id)
 
         # we now monitor the jobs running and submit new workers whenever
         # we drop below out target.
         # We do this endlessly until the user closes the script
         while True:
             job_ids = cls.update_jobs_list(job_ids)
-            njobs_needed = nworkers - len(job_ids)
-            if njobs_needed > 0:
-                job_ids += cls.submit_jobs(njobs_needed)
+            job_ids = cls.scale_jobs(
+                job_ids=job_ids,
+                min_nworkers=nworkers,
+                max_nworkers=max_nworkers,
+                tags=tags,
+                nitems_per_worker=nitems_per_worker,
+                cluster_id=cluster_id,
+            )
             time.sleep(sleep_step)
 
+    @classmethod
+    def scale_jobs(
+        cls,
+        job_ids: list,
+        min_nworkers: int,
+        max_nworkers: int = None,
+        tags: list[str] = ["simmate"],
+        nitems_per_worker: int = 1,
+        cluster_id: str = None,
+    ) -> list:
+        """
+        Submits or shuts down workers to reach the target number of workers
+        and returns the updated list of job ids. See `start_cluster` for
+        details on the parameters. Workers are only shut down when the
+        `cluster_id` that they were submitted with is given.
+        """
+        target = cls.get_target_nworkers(
+            min_nworkers=min_nworkers,
+            max_nworkers=max_nworkers,
+            tags=tags,
+            nitems_per_worker=nitems_per_worker,
+        )
+        njobs_needed = target - len(job_ids)
+        if njobs_needed > 0:
+            job_ids += cls.submit_jobs(njobs_needed, cluster_id)
+        elif njobs_needed < 0:
+            # Jobs are never killed directly, as they may be in the middle of
+            # a WorkItem. Workers that were asked to shut down will leave
+            # the jobs list once they exit.
+            cls.shutdown_idle_workers(-njobs_needed, cluster_id)
+        return job_ids
+
+    @staticmethod
+    def get_target_nworkers(
+        min_nworkers: int,
+        max_nworkers: int = None,
+        tags: list[str] = ["simmate"],
+        nitems_per_worker: int = 1,
+    ) -> int:
+        """
+        Gives the number of workers that the cluster should have
+        """
+        # if we aren't autoscaling, the target is always the minimum
+        if max_nworkers is None:
+            return min_nworkers
+
+        nitems = (
+            WorkItem.objects.filter(status__in=["P", "R"]).filter_by_tags(tags).count()
+        )
+        nworkers_needed = math.ceil(nitems / nitems_per_worker)
+        return max(min_nworkers, min(max_nworkers, nworkers_needed))
+
+    @staticmethod
+    def shutdown_idle_workers(nworkers: int, cluster_id: str) -> int:
+        """
+        Asks up to `nworkers` idle workers of a cluster to shut down. Workers
+        that were already asked to shut down count toward this number.
+        Returns the number of workers that were newly asked to shut down.
+        """
+        # Workers that were started elsewhere (by hand or by another cluster)
+        # have a different (or no) cluster id, so they are never touched.
+        if not cluster_id:
+            return 0
+        workers = list(
+            WorkerRecord.get_active().filter(cluster_id=cluster_id).order_by("-id")
+        )
+
+        shutdown_state = WorkerRecord.RequestedStateOptions.SHUTDOWN
+        nstopping = len([w for w in workers if w.requested_state == shutdown_state])
+        idle_ids = [
+            worker.id
+            for worker in workers
+            if worker.requested_state != shutdown_state and not worker.running_ids
+        ]
+        ids_to_stop = idle_ids[: max(nworkers - nstopping, 0)]
+
+        if ids_to_stop:
+            WorkerRecord.request_shutdown(ids_to_stop)
+            logging.info(f"{len(ids_to_stop)} idle workers were asked to shut down")
+
+        return len(ids_to_stop)
+
     @classmethod
     def wait_for_jobs(cls, job_ids: list[int], sleep_step: float = 5):
         # loop until the job id list is empty
@@ -30,18 +172,32 @@ class Cluster:
             time.sleep(sleep_step)
 
     @classmethod
-    def submit_jobs(cls, njobs: int) -> list[int]:
+    def submit_jobs(cls, njobs: int, cluster_id: str = None) -> list[int]:
         """
         Calls submit_to_queue a set number of times and returns the new job ids
+
+        If a `cluster_id` is given, it is set as the `SIMMATE_CLUSTER_ID`
+        environment variable of the submit command only, which the jobs then
+        inherit (SLURM jobs copy the environment they were submitted from by
+        default). Each worker then records it in its `WorkerRecord`. We don't
+        set it in `os.environ` because that would leak into any other
+        subprocesses and clusters started from this process.
         """
-        job_ids = [cls.submit_job() for n in range(njobs)]
+        env = {**os.environ, "SIMMATE_CLUSTER_ID": cluster_id} if cluster_id else None
+        job_ids = [cls.submit_job(env=env) for n in range(njobs)]
         logging.info(f"{njobs} new workers have been submitted")
         return job_ids
 
     @staticmethod
-    def submit_job() -> int:
+    def submit_job(env: dict = None) -> int:
         """
         Submits a new job to the queue and returns the job id
+
+        #### Parameters
+
+        - `env`:
+            The environment variables to submit the job with. If not given,
+            the environment of the current process is used.
         """
         raise NotImplementedError(
             "add a custom submit_job method to your cluster class"
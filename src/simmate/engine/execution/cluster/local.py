@@ -16,7 +16,7 @@ class LocalCluster(Cluster):
     worker_command: str = "simmate engine start-worker"
 
     @classmethod
-    def submit_job(cls) -> subprocess.Popen:
+    def submit_job(cls, env: dict = None) -> subprocess.Popen:
         output_file = (
             Path.cwd()
             / mkstemp(
@@ -31,6 +31,7 @@ class LocalCluster(Cluster):
             shell=True,
             stdout=output_file.open("w"),
             stderr=output_file.open("w"),
+            env=env,
         )
         return popen
 
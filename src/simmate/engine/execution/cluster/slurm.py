@@ -13,7 +13,7 @@ class SlurmCluster(Cluster):
     """
 
     @staticmethod
-    def submit_job() -> int:
+    def submit_job(env: dict = None) -> int:
         """
         Submits a new job to the queue and returns the job id
         """
@@ -22,33 +22,92 @@ class SlurmCluster(Cluster):
             shell=True,
             capture_output=True,
             text=True,
+            env=env,
         )
         job_id = int(process.stdout.strip().split()[-1])
         return job_id
 
-    @staticmethod
-    def update_jobs_list(job_ids: list[int]) -> list[int]:
+    active_states = [
+        "PENDING",
+        "CONFIGURING",
+        "RUNNING",
+        "COMPLETING",
+        "REQUEUED",
+        "RESIZING",
+        "SUSPENDED",
+    ]
+    """
+    SLURM job states that mean the job is still in the queue (see `sacct`)
+    """
+
+    @classmethod
+    def update_jobs_list(cls, job_ids: list[int]) -> list[int]:
         """
         Given a list of job ids, it will check which ones are still running and
         which are finished. It will then return a list of the job id that are
         still running.
+
+        All jobs are checked with a single call to `squeue` (or `sacct` as a
+        backup), so this stays fast even with hundreds of workers.
         """
 
-        # OPTIMIZE: is there a way to queue a list of ids?
+        if not job_ids:
+            return []
+
+        active_ids = cls.get_active_job_ids(job_ids)
+
+        # If both squeue and sacct failed, we can't tell which jobs finished.
+        # Rather than submitting a flood of new workers, we assume that they
+        # are all still running and try again later.
+        if active_ids is None:
+            logging.warning("Unable to check the status of slurm jobs")
+            return job_ids
+
         still_running = []
         for job_id in job_ids:
-            process = subprocess.run(
-                f"squeue -j {job_id}",
-                shell=True,
-                capture_output=True,
-                text=True,
-            )
-            # An error is return if the job is no longer in the queue.
-            # If the job is still running, then two lines will be printed to
-            # stdout AND the return code will be 0.
-            if process.returncode == 0 and process.stdout.count("\n") == 2:
+            if str(job_id) in active_ids:
                 still_running.append(job_id)
             else:
                 logging.info(f"Slurm job {job_id} completed")
 
         return still_running
+
+    @classmethod
+    def get_active_job_ids(cls, job_ids: list[int]) -> set[str]:
+        """
+        Gives the ids (as strings) of jobs that are still in the queue. None
+        is returned if the queue could not be checked.
+        """
+        job_ids_str = ",".join([str(job_id) for job_id in job_ids])
+
+        process = subprocess.run(
+            f"squeue --noheader --format=%i --jobs={job_ids_str}",
+            shell=True,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode == 0:
+            return set(process.stdout.split())
+
+        # Some versions of SLURM return an error if ANY of the ids have
+        # already left the queue. When this happens, we ask the accounting
+        # database instead -- which remembers finished jobs.
+        process = subprocess.run(
+            "sacct --noheader --allocations --parsable2 --format=JobID,State "
+            f"--jobs={job_ids_str}",
+            shell=True,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            return None
+
+        active_ids = set()
+        for line in process.stdout.splitlines():
+            if "|" not in line:
+                continue
+            job_id, state = line.split("|")[:2]
+            # states can have extra info (e.g. "CANCELLED by 123")
+            if state.split(" ")[0] in cls.active_states:
+                active_ids.add(job_id)
+        return active_ids
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from simmate.engine.execution import SimmateExecutor, WorkerRecord
+from simmate.engine.execution.cluster import SlurmCluster
+
+# These scripts replace the slurm commands. Submitted job ids are written to
+# a "queue" file, and squeue only reports the ids that are still in it.
+FAKE_SBATCH = """#!/bin/bash
+njobs=$(cat {tmp_path}/submitted 2>/dev/null | wc -l)
+job_id=$((njobs + 100))
+echo $job_id >> {tmp_path}/submitted
+echo $job_id >> {tmp_path}/queue
+echo "$job_id $SIMMATE_CLUSTER_ID" >> {tmp_path}/cluster_ids
+echo "Submitted batch job $job_id"
+"""
+
+FAKE_SQUEUE = """#!/bin/bash
+echo "$@" >> {tmp_path}/squeue_calls
+for job_id in $(echo "${{@: -1}}" | sed 's/--jobs=//' | tr ',' ' '); do
+    grep -x $job_id {tmp_path}/queue
+done
+exit 0
+"""
+
+
+@pytest.fixture
+def fake_slurm(tmp_path, monkeypatch):
+    for name, script in [("sbatch", FAKE_SBATCH), ("squeue", FAKE_SQUEUE)]:
+        filename = tmp_path / name
+        filename.write_text(script.format(tmp_path=tmp_path))
+        filename.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.django_db
+def test_slurm_cluster(fake_slurm, monkeypatch):
+    monkeypatch.delenv("SIMMATE_CLUSTER_ID", raising=False)
+
+    job_ids = SlurmCluster.submit_jobs(3)
+    assert job_ids == [100, 101, 102]
+
+    # jobs that leave the queue are removed with a single squeue call
+    (fake_slurm / "queue").write_text("100\n102\n")
+    assert SlurmCluster.update_jobs_list(job_ids) == [100, 102]
+    assert (fake_slurm / "squeue_calls").read_text().count("\n") == 1
+
+    # autoscaling submits one worker per workitem (within the bounds)
+    SimmateExecutor.map(pow, range(5), range(5), tags=["test"])
+    job_ids = SlurmCluster.scale_jobs(
+        job_ids=[100, 102],
+        min_nworkers=1,
+        max_nworkers=4,
+        tags=["test"],
+        cluster_id="cluster-1",
+    )
+    assert job_ids == [100, 102, 103, 104]
+
+    # only the new jobs are given the cluster id, and it doesn't leak into
+    # the environment of this process
+    assert (fake_slurm / "cluster_ids").read_text().splitlines() == [
+        "100 ",
+        "101 ",
+        "102 ",
+        "103 cluster-1",
+        "104 cluster-1",
+    ]
+    assert "SIMMATE_CLUSTER_ID" not in os.environ
+
+    # when there is no work, idle workers are asked to shut down -- but only
+    # the ones that this cluster submitted
+    SimmateExecutor.delete_all(confirm=True)
+    for _ in range(4):
+        WorkerRecord.objects.create(
+            hostname="test", tags=["test"], cluster_id="cluster-1"
+        )
+    other_workers = [
+        WorkerRecord.objects.create(hostname="test", tags=["test"]),
+        WorkerRecord.objects.create(
+            hostname="test", tags=["test"], cluster_id="cluster-2"
+        ),
+    ]
+    job_ids = SlurmCluster.scale_jobs(
+        job_ids=job_ids,
+        min_nworkers=1,
+        max_nworkers=4,
+        tags=["test"],
+        cluster_id="cluster-1",
+    )
+    assert len(job_ids) == 4
+    stopping = WorkerRecord.objects.filter(requested_state="shutdown")
+    assert stopping.count() == 3
+    assert not stopping.filter(id__in=[w.id for w in other_workers]).exists()
+
+    # without a cluster id, we can't tell which workers are ours
+    assert SlurmCluster.shutdown_idle_workers(5, cluster_id=None) == 0
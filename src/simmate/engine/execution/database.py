@@ -1,17 +1,235 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import logging
+import select
 import time
+import zlib
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, FIRST_EXCEPTION
+from datetime import timedelta
+from functools import lru_cache
 
 # import pickle
 import cloudpickle  # needed to serialize Prefect workflow runs and tasks
-from django.db import transaction
+from django.db import connection, models, transaction
+from django.utils import timezone
 
-from simmate.database.base_data_types import DatabaseTable, table_column
+from simmate.database.base_data_types import DatabaseTable, SearchResults, table_column
 
 # BUG: I have this database table within a module that calls "database.connect"
 # at a higher level... Will this cause circular import issues?
 
 
+class WorkItemSearchResults(SearchResults):
+    """
+    Adds queue-specific filters to the default SearchResults
+    """
+
+    def filter_by_tags(self, tags: list[str]):
+        """
+        Filters to WorkItems that were submitted with all of the given tags.
+        If no tags are given, only WorkItems that have NO tags are returned.
+
+        This uses the `tags_string` column (rather than the JSON `tags` column).
+        Matching untagged WorkItems is an exact lookup that the indexes on
+        this column can serve. Matching tags is a `LIKE '%|tag|%'` lookup,
+        which no b-tree index can serve -- the database instead uses the
+        `status` part of the `workitem_status_tags` index to limit the
+        check to rows with the requested status (e.g. the few pending ones).
+        """
+        if tags:
+            new_query = self
+            for tag in tags:
+                tag_cleaned = WorkItem.get_tags_string([tag])
+                new_query = new_query.filter(tags_string__contains=tag_cleaned)
+        else:
+            new_query = self.filter(tags_string="")
+        return new_query
+
+
+WorkItemManager = models.Manager.from_queryset(WorkItemSearchResults)
+
+
+class WorkerRecord(DatabaseTable):
+    """
+    A record of a `SimmateWorker` that is (or was) running. Workers register
+    themselves here when they start and then keep their row up to date via
+    their heartbeat thread. This lets us see how many workers are running,
+    what they are working on, and how fast they are going -- and it lets us
+    ask a worker to shut down from anywhere that can reach the database.
+    """
+
+    class Meta:
+        app_label = "engine"
+
+    source = None
+    """
+    Source column is not needed so setting this to None disable the column
+    """
+
+    hostname = table_column.CharField(max_length=255)
+    """
+    The name of the machine that the worker is running on
+    """
+
+    pid = table_column.IntegerField(blank=True, null=True)
+    """
+    The process id of the worker on its machine
+    """
+
+    tags = table_column.JSONField(default=list)
+    """
+    The tags that the worker is grabbing WorkItems for
+    """
+
+    nslots = table_column.IntegerField(default=1)
+    """
+    The number of WorkItems that the worker can run at once
+    """
+
+    cluster_id = table_column.CharField(max_length=36, blank=True, null=True)
+    """
+    The id of the `Cluster` that submitted this worker (if any). Workers read
+    this from the `SIMMATE_CLUSTER_ID` environment variable, which the cluster
+    sets for its jobs, so a cluster only ever shuts down its own workers.
+    """
+
+    last_heartbeat = table_column.DateTimeField(default=timezone.now)
+    """
+    The last time the worker reported that it was alive
+    """
+
+    stopped_at = table_column.DateTimeField(blank=True, null=True)
+    """
+    When the worker shut down. This is empty while the worker is running, or
+    if it was killed without a chance to shut down (e.g. a cancelled SLURM job)
+    """
+
+    running_ids = table_column.JSONField(default=list)
+    """
+    The ids of the WorkItems that the worker currently has claimed
+    """
+
+    nitems_finished = table_column.IntegerField(default=0)
+    """
+    The number of WorkItems that the worker completed successfully
+    """
+
+    nitems_errored = table_column.IntegerField(default=0)
+    """
+    The number of WorkItems that the worker completed with an error
+    """
+
+    class RequestedStateOptions(table_column.TextChoices):
+        RUNNING = "running"
+        SHUTDOWN = "shutdown"
+
+    requested_state = table_column.CharField(
+        max_length=10,
+        choices=RequestedStateOptions.choices,
+        default=RequestedStateOptions.RUNNING,
+    )
+    """
+    The state that the worker should be in. Setting this to "shutdown" tells
+    the worker to stop grabbing new WorkItems, finish the ones it is running,
+    and then shut down. Workers check this with each heartbeat.
+    """
+
+    @classmethod
+    def get_active(cls, heartbeat_timeout: float = 600):
+        """
+        Gives all workers that haven't shut down and have sent a heartbeat
+        within the timeout (in seconds).
+        """
+        return cls.objects.filter(
+            stopped_at__isnull=True,
+            last_heartbeat__gte=timezone.now() - timedelta(seconds=heartbeat_timeout),
+        )
+
+    @property
+    def throughput(self) -> float:
+        """
+        The average number of WorkItems completed per hour
+        """
+        end_time = self.stopped_at or timezone.now()
+        hours = (end_time - self.created_at).total_seconds() / 3600
+        nitems = self.nitems_finished + self.nitems_errored
+        return nitems / hours if hours else 0
+
+    @classmethod
+    def request_shutdown(cls, worker_ids: list[int] = None) -> int:
+        """
+        Asks workers to shut down once they finish their current WorkItems.
+        If no ids are given, all workers that are still running are asked.
+        Returns the number of workers that were asked to shut down.
+        """
+        query = cls.objects.filter(stopped_at__isnull=True)
+        if worker_ids is not None:
+            query = query.filter(id__in=worker_ids)
+        return query.update(requested_state=cls.RequestedStateOptions.SHUTDOWN)
+
+    @staticmethod
+    def get_orphans(heartbeat_timeout: float = 600):
+        """
+        Gives all RUNNING WorkItems whose worker has stopped sending heartbeats.
+        See `requeue_orphans` for details.
+        """
+        cutoff = timezone.now() - timedelta(seconds=heartbeat_timeout)
+
+        # We filter with a subquery of the dead workers rather than on
+        # `worker__last_heartbeat`. That lookup would add a LEFT OUTER JOIN
+        # to the WorkerRecord table, and PostgreSQL does not allow
+        # "FOR UPDATE" on the nullable side of an outer join -- which breaks
+        # the select_for_update in requeue_orphans.
+        dead_worker_ids = WorkerRecord.objects.filter(last_heartbeat__lt=cutoff).values(
+            "id"
+        )
+        return WorkItem.objects.filter(status="R").filter(
+            models.Q(worker_id__in=dead_worker_ids)
+            | models.Q(worker_id__isnull=True, updated_at__lt=cutoff)
+        )
+
+    @staticmethod
+    def requeue_orphans(heartbeat_timeout: float = 600) -> int:
+        """
+        Finds RUNNING WorkItems whose worker has stopped sending heartbeats
+        (e.g. the worker was killed along with its SLURM job) and puts them
+        back in the queue as PENDING. Returns the number of WorkItems requeued.
+
+        WorkItems without a worker (e.g. claimed by an older version of simmate)
+        are judged by their `updated_at` column, which the heartbeat refreshes.
+
+        #### Parameters
+
+        - `heartbeat_timeout`:
+            the number of seconds since the last heartbeat before a worker is
+            considered dead. This must be longer than the `heartbeat_interval`
+            of all workers, or healthy workers will lose their WorkItems.
+        """
+        with transaction.atomic():
+            orphan_ids = list(
+                WorkerRecord.get_orphans(heartbeat_timeout)
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)
+            )
+            if not orphan_ids:
+                return 0
+
+            logging.warning(
+                f"Requeueing {len(orphan_ids)} orphaned WorkItem(s) whose "
+                "worker stopped sending heartbeats"
+            )
+            # note: auto_now is not applied for update() calls, so we set
+            # the timestamp manually.
+            WorkItem.objects.filter(pk__in=orphan_ids, status="R").update(
+                status="P",
+                worker=None,
+                updated_at=timezone.now(),
+            )
+
+        return len(orphan_ids)
+
+
 class WorkItem(DatabaseTable):
     """
     A WorkItem is a future-like
@@ -27,6 +245,26 @@ class WorkItem(DatabaseTable):
 
     class Meta:
         app_label = "engine"
+        indexes = [
+            # Workers always query by status and tags together. Untagged
+            # workers use both columns of this index, while tagged workers
+            # use its status prefix (see filter_by_tags).
+            models.Index(
+                fields=["status", "tags_string"],
+                name="workitem_status_tags",
+            ),
+            # The queue can hold millions of finished rows, while only a few
+            # are pending. A partial index on just the pending rows keeps
+            # workers' queries fast as the table grows. Note, this index is
+            # skipped for databases that don't support partial indexes.
+            models.Index(
+                fields=["tags_string", "id"],
+                condition=models.Q(status="P"),
+                name="workitem_pending",
+            ),
+        ]
+
+    objects = WorkItemManager()
 
     tags = table_column.JSONField(default=list)
     """
@@ -34,6 +272,18 @@ class WorkItem(DatabaseTable):
     for a specific type of task/workflow. (e.g. ["simmate", "custom"])
     """
 
+    tags_string = table_column.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+    )
+    """
+    A normalized copy of the `tags` column that can be indexed. Tags are
+    lowercased, sorted, and joined by "|" with a "|" at each end (e.g.
+    "|custom|simmate|"). This is set automatically when saving. Rows saved
+    before this column existed are filled in by `update_tags_strings`.
+    """
+
     # These states were originally based on the python queue module, but we
     # updated them to match Prefect states that have more flexibility:
     # https://docs.prefect.io/concepts/states/
@@ -44,12 +294,11 @@ class WorkItem(DatabaseTable):
         ERRORED = "E"
         FINISHED = "F"
 
-    # TODO -- I should consider indexing this column for speed because it's
-    # the most queried column by far.
     status = table_column.CharField(
         max_length=1,
         choices=StatusOptions.choices,
         default=StatusOptions.PENDING,
+        db_index=True,
     )
     """
     the status/state of the workitem
@@ -94,14 +343,166 @@ class WorkItem(DatabaseTable):
     the output of fxn(*args, **kwargs)
     """
 
+    # Large pickled objects are not stored in the columns above, but are
+    # instead compressed and stored in the WorkItemPayload table. There, they
+    # are only stored once -- even if thousands of workitems use the same
+    # function or inputs. These columns give the hash of those payloads.
+
+    fxn_hash = table_column.CharField(max_length=64, blank=True, null=True)
+    """
+    The hash of the WorkItemPayload that holds `fxn` (if it is stored there)
+    """
+
+    args_hash = table_column.CharField(max_length=64, blank=True, null=True)
+    """
+    The hash of the WorkItemPayload that holds `args` (if it is stored there)
+    """
+
+    kwargs_hash = table_column.CharField(max_length=64, blank=True, null=True)
+    """
+    The hash of the WorkItemPayload that holds `kwargs` (if it is stored there)
+    """
+
+    result_hash = table_column.CharField(max_length=64, blank=True, null=True)
+    """
+    The hash of the WorkItemPayload that holds `result_binary` (if it is
+    stored there)
+    """
+
+    payload_columns: dict = {
+        "fxn": "fxn_hash",
+        "args": "args_hash",
+        "kwargs": "kwargs_hash",
+        "result_binary": "result_hash",
+    }
+    """
+    Maps each pickled column to the column that holds its payload hash
+    """
+
     source = None
     """
     Source column is not needed so setting this to None disable the column
     """
 
-    # TODO: Consider creating a separate table for Worker and linking it to this
-    # table via a foreign key.
-    # worker_id = table_column.CharField(max_length=50, blank=True, null=True)
+    worker = table_column.ForeignKey(
+        WorkerRecord,
+        on_delete=table_column.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="workitems",
+    )
+    """
+    The worker that claimed this workitem (if it is RUNNING)
+    """
+
+    @staticmethod
+    def get_tags_string(tags: list[str]) -> str:
+        """
+        Converts a list of tags into the normalized format used by the
+        `tags_string` column.
+        """
+        if not tags:
+            return ""
+        tags_cleaned = sorted({str(tag).lower() for tag in tags})
+        tags_string = "|" + "|".join(tags_cleaned) + "|"
+
+        # A longer string would be cut off (or rejected) by the database, and
+        # workers would then never find the WorkItem
+        max_length = WorkItem._meta.get_field("tags_string").max_length
+        if len(tags_string) > max_length:
+            raise Exception(
+                f"The tags {tags_cleaned} are too long. When joined together, "
+                f"tags can have at most {max_length} characters."
+            )
+        return tags_string
+
+    @classmethod
+    def update_tags_strings(cls, chunk_size: int = 1000) -> int:
+        """
+        Fills in the `tags_string` column for WorkItems that were saved before
+        this column existed. Without this, their tags are invisible to workers
+        (see `filter_by_tags`). This is called by `simmate database update`.
+        Returns the number of WorkItems updated.
+        """
+        # We page through by id because the rows change as we update them
+        workitems = (
+            cls.objects.filter(tags_string="")
+            .exclude(tags=[])
+            .only("id", "tags")
+            .order_by("id")
+        )
+        nupdated = 0
+        last_id = 0
+        while chunk := list(workitems.filter(id__gt=last_id)[:chunk_size]):
+            for workitem in chunk:
+                workitem.tags_string = cls.get_tags_string(workitem.tags)
+            with transaction.atomic():
+                cls.objects.bulk_update(chunk, ["tags_string"])
+            nupdated += len(chunk)
+            last_id = chunk[-1].id
+        return nupdated
+
+    def save(self, *args, **kwargs):
+        # make sure the normalized tags are always in sync with the tags
+        self.tags_string = self.get_tags_string(self.tags)
+        super().save(*args, **kwargs)
+
+    # -------------------------------------------------------------------------
+    # Methods for storing and loading the pickled columns
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def get_pickled_fields(cls, column: str, data_list: list[bytes]) -> list[dict]:
+        """
+        Given a list of pickled objects for one of the pickled columns (fxn,
+        args, kwargs, or result_binary), this gives the column values to set
+        for each. Large objects are stored in the WorkItemPayload table and
+        referenced by their hash, while small ones are stored inline.
+
+        All payloads are stored using one query, so this method should be
+        preferred over calling it on one object at a time.
+        """
+        hash_column = cls.payload_columns[column]
+        payload_hashes = WorkItemPayload.store_many(data_list)
+        return [
+            {column: b"", hash_column: payload_hash}
+            if payload_hash
+            else {column: data, hash_column: None}
+            for data, payload_hash in zip(data_list, payload_hashes)
+        ]
+
+    def get_pickled(self, column: str) -> bytes:
+        """
+        Gives the pickled object for one of the pickled columns (fxn, args,
+        kwargs, or result_binary), whether it is stored inline or in the
+        WorkItemPayload table.
+        """
+        payload_hash = getattr(self, self.payload_columns[column])
+        if payload_hash:
+            return WorkItemPayload.load(payload_hash)
+        return getattr(self, column)
+
+    def load_fxn(self) -> callable:
+        """
+        Unpickles and returns the function to call. Functions stored in the
+        WorkItemPayload table are cached by their hash, so a worker only
+        needs to load and unpickle each one once.
+        """
+        if self.fxn_hash:
+            return _load_cached_function(self.fxn_hash)
+        return cloudpickle.loads(self.fxn)
+
+    def load_args(self) -> tuple:
+        """
+        Unpickles and returns the positional arguments for the function
+        """
+        return cloudpickle.loads(self.get_pickled("args"))
+
+    def load_kwargs(self) -> dict:
+        """
+        Unpickles and returns the keyword arguments for the function
+        """
+        return cloudpickle.loads(self.get_pickled("kwargs"))
 
     # -------------------------------------------------------------------------
     # The methods below turn this into a future-like object
@@ -136,6 +537,7 @@ class WorkItem(DatabaseTable):
                 # This does not delete the task from the queue database though
                 workitem.status = "C"
                 workitem.save()
+                notify_workitems_done([workitem.pk])
                 return True
 
     def is_cancelled(self) -> bool:
@@ -194,43 +596,503 @@ class WorkItem(DatabaseTable):
         will be raised.
 
         If the call raised, this method will raise the same exception.
+
+        While waiting, the database is checked with an increasing time between
+        checks, where `sleep_step` is the longest time between them. On
+        PostgreSQL, we are also notified the moment a worker finishes the call.
+        See the `wait` function for more details.
         """
-        # if no timeout was set, use infinity so we wait forever.
-        if not timeout:
-            timeout = float("inf")
-
-        # Loop endlessly until the job completes or we timeout
-        time_start = time.time()
-
-        while (time.time() - time_start) < timeout:
-            # I don't use a lock to check the status here
-            workitem = WorkItem.objects.only("status", "result_binary").get(pk=self.pk)
-            status = workitem.status
-
-            if status == "F" or status == "E":  # FINISHED or ERRORED
-                # grab the result, unpickle it, and return it
-                result = cloudpickle.loads(workitem.result_binary)
-                # if the result is an Error or Exception, raise it
-                if isinstance(result, Exception) and raise_error:
-                    raise result
-                # otherwise return the result as-is
-                else:
-                    return result
-
-            elif status == "C":  # CANCELED
-                raise CancelledError(
-                    "This item was cancelled and has no result. If this is unexpected, "
-                    "be sure to check your worker logs. Misconfiguration or a `command "
-                    "not found` error can be the cause of your job getting cancelled."
-                )
 
-            elif status == "P" or status == "R":  # PENDING or RUNNING
-                # sleep the set amount before restarting the while loop
-                time.sleep(sleep_step)
+        # Wait until the job completes or we timeout
+        done, _ = wait([self], timeout=timeout, sleep_step=sleep_step)
+
+        # if the item isn't done, then we've hit the timeout
+        if not done:
+            raise TimeoutError(
+                "The time-limit to wait for this result has been exceeded"
+            )
+
+        # I don't use a lock to check the status here. If the workitem is no
+        # longer in the queue, it may have been moved to the archive table.
+        columns = ["status", "result_binary", "result_hash"]
+        try:
+            workitem = WorkItem.objects.only(*columns).get(pk=self.pk)
+        except WorkItem.DoesNotExist:
+            workitem = WorkItemArchive.objects.only(*columns).get(pk=self.pk)
+        status = workitem.status
 
-        # if the loop exits and we reached this line, then we've hit the timeout
-        raise TimeoutError("The time-limit to wait for this result has been exceeded")
+        if status == "C":  # CANCELED
+            raise CancelledError(
+                "This item was cancelled and has no result. If this is unexpected, "
+                "be sure to check your worker logs. Misconfiguration or a `command "
+                "not found` error can be the cause of your job getting cancelled."
+            )
+
+        # Otherwise the status is FINISHED or ERRORED, so we grab the result,
+        # unpickle it, and return it
+        if workitem.result_hash:
+            result = cloudpickle.loads(WorkItemPayload.load(workitem.result_hash))
+        else:
+            result = cloudpickle.loads(workitem.result_binary)
+        # if the result is an Error or Exception, raise it
+        if isinstance(result, Exception) and raise_error:
+            raise result
+        # otherwise return the result as-is
+        else:
+            return result
 
 
 class CancelledError(Exception):
     pass
+
+
+class WorkItemPayload(DatabaseTable):
+    """
+    Holds large pickled objects (functions, inputs, and results) for WorkItems.
+
+    Payloads are content-addressed: each is stored once under the hash of its
+    pickled bytes, so thousands of WorkItems that submit the same workflow
+    (or the same inputs) share a single row. Payloads are also compressed,
+    using zstandard when it is installed and zlib otherwise.
+    """
+
+    class Meta:
+        app_label = "engine"
+
+    payload_hash = table_column.CharField(max_length=64, unique=True)
+    """
+    The sha256 hash of the (uncompressed) pickled bytes
+    """
+
+    compression = table_column.CharField(max_length=4)
+    """
+    The method used to compress the data (either "zstd" or "zlib")
+    """
+
+    data = table_column.BinaryField()
+    """
+    The compressed, pickled bytes
+    """
+
+    source = None
+    """
+    Source column is not needed so setting this to None disable the column
+    """
+
+    min_size: int = 1024
+    """
+    Pickled objects smaller than this (in bytes) are not worth the extra
+    query, so they are stored inline on the WorkItem instead.
+    """
+
+    @staticmethod
+    def get_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def compress(data: bytes) -> tuple[str, bytes]:
+        """
+        Compresses the data and returns the method used along with the
+        compressed data.
+        """
+        try:
+            import zstandard
+        except ImportError:
+            return "zlib", zlib.compress(data)
+        return "zstd", zstandard.ZstdCompressor().compress(data)
+
+    @staticmethod
+    def decompress(compression: str, data: bytes) -> bytes:
+        if compression == "zlib":
+            return zlib.decompress(data)
+        elif compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise Exception(
+                    "This payload was compressed with zstandard, which is not "
+                    "installed. Please install it with `pip install zstandard`"
+                )
+            return zstandard.ZstdDecompressor().decompress(data)
+        else:
+            raise Exception(f"Unknown compression method: {compression}")
+
+    @classmethod
+    def store_many(cls, data_list: list[bytes]) -> list[str]:
+        """
+        Stores many pickled objects and returns the hash for each. Objects
+        smaller than `min_size` are not stored, and None is given for their hash.
+
+        Only payloads that aren't already in the table are compressed and
+        saved, which takes (at most) three queries.
+
+        This must be called in the same transaction that saves the WorkItems
+        which use these payloads (see `delete_unused`).
+        """
+        payload_hashes = [
+            cls.get_hash(data) if len(data) >= cls.min_size else None
+            for data in data_list
+        ]
+
+        # gather the unique payloads that need to be stored
+        new_payloads = {
+            payload_hash: data
+            for payload_hash, data in zip(payload_hashes, data_list)
+            if payload_hash
+        }
+        if not new_payloads:
+            return payload_hashes
+
+        # Payloads that already exist could be removed by `delete_unused`
+        # before our WorkItems are saved. Updating the rows locks them until
+        # our transaction ends, so `delete_unused` will skip them. If
+        # `delete_unused` locked them first, this waits until it is done and
+        # the deleted payloads are then missing from the query below -- so we
+        # store them again.
+        cls.objects.filter(payload_hash__in=new_payloads.keys()).update(
+            updated_at=timezone.now()
+        )
+        existing = cls.objects.filter(payload_hash__in=new_payloads.keys()).values_list(
+            "payload_hash", flat=True
+        )
+        for payload_hash in existing:
+            new_payloads.pop(payload_hash)
+
+        payloads = []
+        for payload_hash, data in new_payloads.items():
+            compression, data_compressed = cls.compress(data)
+            payloads.append(
+                cls(
+                    payload_hash=payload_hash,
+                    compression=compression,
+                    data=data_compressed,
+                )
+            )
+        # another process may have stored the same payload since we checked,
+        # which is fine because it will be identical.
+        cls.objects.bulk_create(payloads, ignore_conflicts=True)
+
+        return payload_hashes
+
+    @classmethod
+    def load(cls, payload_hash: str) -> bytes:
+        """
+        Loads and decompresses the pickled bytes for the given hash
+        """
+        payload = cls.objects.only("compression", "data").get(payload_hash=payload_hash)
+        return cls.decompress(payload.compression, bytes(payload.data))
+
+    @classmethod
+    def delete_unused(cls) -> int:
+        """
+        Deletes all payloads that are no longer referenced by a WorkItem (or
+        an archived WorkItem). Returns the number of payloads deleted.
+
+        This is safe to run while WorkItems are being submitted. Payloads
+        that a submission is reusing are locked (see `store_many`) and
+        skipped here.
+        """
+        with transaction.atomic():
+            unused_ids = list(
+                cls.get_unused()
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)
+            )
+            # We check for references again because WorkItems that use these
+            # payloads may have been saved since the query above started.
+            # No new WorkItems can use them now that we hold the locks.
+            ndeleted, _ = cls.get_unused().filter(id__in=unused_ids).delete()
+        return ndeleted
+
+    @classmethod
+    def get_unused(cls):
+        """
+        Gives all payloads that are not referenced by a WorkItem (or an
+        archived WorkItem)
+        """
+        query = cls.objects.all()
+        for table in [WorkItem, WorkItemArchive]:
+            for hash_column in WorkItem.payload_columns.values():
+                query = query.exclude(
+                    payload_hash__in=table.objects.filter(
+                        **{f"{hash_column}__isnull": False}
+                    ).values(hash_column)
+                )
+        return query
+
+
+@lru_cache(maxsize=128)
+def _load_cached_function(payload_hash: str) -> callable:
+    # Payloads never change for a given hash, so this cache is always valid
+    return cloudpickle.loads(WorkItemPayload.load(payload_hash))
+
+
+class WorkItemArchive(DatabaseTable):
+    """
+    Holds WorkItems that are done (finished, errored, or cancelled) and were
+    moved out of the main `WorkItem` table. The queue table is queried
+    constantly by workers, so keeping it small keeps their queries fast.
+
+    Rows keep the same id that they had in the queue table, so calling
+    `result()` on an archived WorkItem still works. See
+    `SimmateExecutor.archive_done` for moving rows into this table.
+    """
+
+    class Meta:
+        app_label = "engine"
+
+    tags = table_column.JSONField(default=list)
+    status = table_column.CharField(
+        max_length=1,
+        choices=WorkItem.StatusOptions.choices,
+    )
+    command_not_found_failures = table_column.IntegerField(default=0)
+    fxn = table_column.BinaryField(blank=True, null=True)
+    args = table_column.BinaryField(blank=True, null=True)
+    kwargs = table_column.BinaryField(blank=True, null=True)
+    result_binary = table_column.BinaryField(blank=True, null=True)
+    fxn_hash = table_column.CharField(max_length=64, blank=True, null=True)
+    args_hash = table_column.CharField(max_length=64, blank=True, null=True)
+    kwargs_hash = table_column.CharField(max_length=64, blank=True, null=True)
+    result_hash = table_column.CharField(max_length=64, blank=True, null=True)
+
+    source = None
+    """
+    Source column is not needed so setting this to None disable the column
+    """
+
+    # The timestamps are copied from the queue table, so unlike other tables,
+    # they must not be set automatically when the row is saved
+    created_at = table_column.DateTimeField(blank=True, null=True)
+    """
+    Timestamp of when the WorkItem was first added to the queue
+    """
+
+    updated_at = table_column.DateTimeField(blank=True, null=True)
+    """
+    Timestamp of when the WorkItem was last changed before it was archived
+    """
+
+    archived_at = table_column.DateTimeField(auto_now_add=True)
+    """
+    Timestamp of when this row was moved out of the queue table
+    """
+
+
+# -----------------------------------------------------------------------------
+# Utilities for waiting on many WorkItems at once. These are modeled after the
+# functions of the same name in python's concurrent.futures module.
+# -----------------------------------------------------------------------------
+
+NOTIFY_CHANNEL = "simmate_workitems"
+"""
+The PostgreSQL channel that workers send a message to when a WorkItem is done.
+The message is simply the id of the WorkItem.
+"""
+
+
+def notify_workitems_done(workitem_ids: list[int]):
+    """
+    Lets anyone waiting on these WorkItems know that they are done (i.e.
+    they are finished, errored, or cancelled).
+
+    This only has an effect on PostgreSQL, where a NOTIFY is sent for each id.
+    When called within a transaction, the notifications are only sent once
+    the transaction is committed. For other database backends, waiting is
+    done by polling and there is nothing to do here.
+    """
+    if connection.vendor != "postgresql" or not workitem_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, id::text) FROM unnest(%s) AS id",
+            [NOTIFY_CHANNEL, list(workitem_ids)],
+        )
+
+
+class WorkItemListener:
+    """
+    Blocks until one of the given WorkItems is reported as done or until a
+    timeout is hit.
+
+    On PostgreSQL, this uses LISTEN/NOTIFY so we wake up the moment a worker
+    finishes a WorkItem. For all other database backends (or when we are inside
+    of a transaction, where notifications are never delivered), this just
+    sleeps for the full timeout.
+
+    This class is meant to be used as a context manager:
+
+    ``` python
+    with WorkItemListener() as listener:
+        listener.wait(timeout=5, workitem_ids=[1, 2, 3])
+    ```
+    """
+
+    def __init__(self):
+        self.enabled = (
+            connection.vendor == "postgresql" and not connection.in_atomic_block
+        )
+
+    def __enter__(self):
+        if self.enabled:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # the connection may have been closed while we were waiting
+        if self.enabled and connection.connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"UNLISTEN {NOTIFY_CHANNEL}")
+
+    def wait(self, timeout: float, workitem_ids: list[int]) -> bool:
+        """
+        Returns True if one of the workitems was reported as done, and False
+        if the timeout was hit instead.
+        """
+
+        if not self.enabled:
+            time.sleep(timeout)
+            return False
+
+        workitem_ids = {str(workitem_id) for workitem_id in workitem_ids}
+        pg_connection = connection.connection
+        time_end = time.time() + timeout
+
+        # Notifications for other WorkItems are common (many workers share
+        # the same channel), so we ignore those and keep waiting.
+        while (time_left := time_end - time.time()) > 0:
+            readable, _, _ = select.select([pg_connection], [], [], time_left)
+            if not readable:
+                return False
+            pg_connection.poll()
+            payloads = {notify.payload for notify in pg_connection.notifies}
+            pg_connection.notifies.clear()
+            if payloads & workitem_ids:
+                return True
+
+        return False
+
+
+def wait(
+    workitems: list[WorkItem],
+    timeout: float = None,
+    return_when: str = ALL_COMPLETED,
+    sleep_step: float = 5,
+    sleep_start: float = 0.1,
+) -> tuple[set[WorkItem], set[WorkItem]]:
+    """
+    Wait for the given WorkItems to complete, and returns a tuple of two sets
+    `(done, not_done)`. This mirrors `concurrent.futures.wait`.
+
+    All WorkItems are checked with a single query per tick. The time between
+    ticks starts at `sleep_start` and doubles each tick until it reaches
+    `sleep_step`. On PostgreSQL, we also wake up the moment a worker reports
+    that one of the WorkItems is done (via LISTEN/NOTIFY).
+
+    #### Parameters
+
+    - `workitems`:
+        the WorkItems (futures) to wait on
+
+    - `timeout`:
+        the maximum number of seconds to wait. If None, there is no limit.
+
+    - `return_when`:
+        when this function should return. Options are FIRST_COMPLETED,
+        FIRST_EXCEPTION (i.e. errored or cancelled), or ALL_COMPLETED.
+
+    - `sleep_step`:
+        the longest time (in seconds) between checks of the database
+
+    - `sleep_start`:
+        the time (in seconds) between the first checks of the database
+    """
+
+    if return_when not in [FIRST_COMPLETED, FIRST_EXCEPTION, ALL_COMPLETED]:
+        raise Exception(f"Unknown return_when provided: {return_when}")
+
+    # if no timeout was set, use infinity so we wait forever.
+    time_end = time.time() + (timeout if timeout is not None else float("inf"))
+
+    workitems = list(workitems)
+    done = set()
+    not_done = set(workitems)
+    sleep_time = sleep_start
+
+    with WorkItemListener() as listener:
+        while True:
+            # A single query to see which of the remaining items are done.
+            # Items that are no longer in the queue table have been archived
+            # (or deleted), which can only happen once they are done.
+            pending_ids = [workitem.pk for workitem in not_done]
+            found = dict(
+                WorkItem.objects.filter(pk__in=pending_ids).values_list("id", "status")
+            )
+            statuses = {i: found.get(i, "F") for i in pending_ids}
+            statuses = {i: s for i, s in statuses.items() if s in ["F", "E", "C"]}
+            newly_done = {w for w in not_done if w.pk in statuses.keys()}
+            done |= newly_done
+            not_done -= newly_done
+
+            # check if we've hit the requested condition
+            if not not_done:
+                break
+            elif return_when == FIRST_COMPLETED and done:
+                break
+            elif return_when == FIRST_EXCEPTION and (
+                set(statuses.values()) & {"E", "C"}
+            ):
+                break
+
+            # check if we've hit the timeout
+            time_left = time_end - time.time()
+            if time_left <= 0:
+                break
+
+            # and then wait a bit before checking again
+            listener.wait(
+                timeout=min(sleep_time, time_left),
+                workitem_ids=[w.pk for w in not_done],
+            )
+            sleep_time = min(sleep_time * 2, sleep_step)
+
+    return done, not_done
+
+
+def as_completed(
+    workitems: list[WorkItem],
+    timeout: float = None,
+    sleep_step: float = 5,
+):
+    """
+    Returns an iterator that yields the given WorkItems as they complete.
+    This mirrors `concurrent.futures.as_completed`.
+
+    If the timeout is hit before all WorkItems complete, a TimeoutError is
+    raised. See the `wait` function for details on how the database is checked.
+    """
+
+    # if no timeout was set, use infinity so we wait forever.
+    time_end = time.time() + (timeout if timeout is not None else float("inf"))
+
+    # we keep the order of the inputs for items that finish at the same time
+    not_done = list(workitems)
+
+    while not_done:
+        time_left = time_end - time.time()
+        if time_left <= 0:
+            raise TimeoutError(
+                f"{len(not_done)} (of {len(workitems)}) workitems did not "
+                "complete within the time limit"
+            )
+
+        done, _ = wait(
+            not_done,
+            timeout=time_left,
+            return_when=FIRST_COMPLETED,
+            sleep_step=sleep_step,
+        )
+        for workitem in [w for w in not_done if w in done]:
+            not_done.remove(workitem)
+            yield workitem
@@ -4,10 +4,19 @@ import logging
 from datetime import timedelta
 
 import cloudpickle  # needed to serialize Prefect workflow runs and tasks
+from django.db import connection, transaction
 from django.utils import timezone
 from rich import print
 
-from simmate.engine.execution.database import WorkItem
+from simmate.engine.execution.database import (
+    WorkerRecord,
+    WorkItem,
+    WorkItemArchive,
+    WorkItemPayload,
+    as_completed,
+    wait,
+)
+from simmate.utilities import chunk_list
 
 
 class SimmateExecutor:
@@ -51,38 +60,180 @@ class SimmateExecutor:
         # No lock is needed to do this because adding a new row is handled
         # by the database with ease, even if some different Executor is
         # adding another WorkItem at the same time.
+        # Large pickled objects are stored separately (and only once) in the
+        # WorkItemPayload table. See WorkItem.get_pickled_fields for details.
+        # Payloads must be saved in the same transaction as the WorkItem so
+        # that they can't be cleaned up before the WorkItem exists.
         # TODO - should I put pickling in a "try" in case it fails?
-        workitem = WorkItem.objects.create(
-            fxn=cloudpickle.dumps(fxn),
-            args=cloudpickle.dumps(args),
-            kwargs=cloudpickle.dumps(kwargs),
-            tags=tags,  # should be json serializable already
-        )
+        with transaction.atomic():
+            workitem = WorkItem.objects.create(
+                **WorkItem.get_pickled_fields("fxn", [cloudpickle.dumps(fxn)])[0],
+                **WorkItem.get_pickled_fields("args", [cloudpickle.dumps(args)])[0],
+                **WorkItem.get_pickled_fields("kwargs", [cloudpickle.dumps(kwargs)])[0],
+                tags=tags,  # should be json serializable already
+            )
 
         # and return the workitem/future for use
         return workitem
 
     @staticmethod
-    def wait(workitems: list[WorkItem]):
+    def submit_many(
+        fxn: callable,
+        args_list: list[tuple] = None,
+        kwargs_list: list[dict] = None,
+        tags: list[str] = [],
+        chunksize: int = 500,
+    ) -> list[WorkItem]:
+        """
+        Submits many calls of the same function to the queue and returns the
+        list of WorkItems (futures) in the same order as the inputs.
+
+        This is the same as calling `submit` in a for-loop, but the function
+        is only pickled once and the WorkItems are inserted using chunked
+        `bulk_create` calls. So submitting 10k calls only takes 10k/chunksize
+        database queries.
+
+        #### Parameters
+
+        - `fxn`:
+            the function to call for each workitem
+
+        - `args_list`:
+            a list of positional arguments (as tuples) for each call. If
+            kwargs_list is also given, the two lists must be the same length.
+
+        - `kwargs_list`:
+            a list of keyword arguments (as dictionaries) for each call
+
+        - `tags`:
+            the tags to submit all of the workitems with
+
+        - `chunksize`:
+            the maximum number of workitems to insert with a single query
+        """
+
+        # make sure we have lists to iterate through (generators are allowed)
+        args_list = list(args_list) if args_list is not None else None
+        kwargs_list = list(kwargs_list) if kwargs_list is not None else None
+
+        if args_list is None and kwargs_list is None:
+            raise Exception("Either args_list or kwargs_list must be given")
+        elif args_list is None:
+            args_list = [()] * len(kwargs_list)
+        elif kwargs_list is None:
+            kwargs_list = [{}] * len(args_list)
+        elif len(args_list) != len(kwargs_list):
+            raise Exception("args_list and kwargs_list must be the same length")
+
+        # The function is the same for all workitems, so we only pickle it once
+        fxn_pickled = cloudpickle.dumps(fxn)
+
+        # Not all database backends return the new ids from bulk_create. If
+        # they don't, our futures would be useless, so we fall back to
+        # inserting one at a time.
+        use_bulk = connection.features.can_return_rows_from_bulk_insert
+
+        all_workitems = []
+        for args_chunk, kwargs_chunk in zip(
+            chunk_list(args_list, chunksize),
+            chunk_list(kwargs_list, chunksize),
+        ):
+            args_pickled = [cloudpickle.dumps(tuple(args)) for args in args_chunk]
+            kwargs_pickled = [cloudpickle.dumps(kwargs) for kwargs in kwargs_chunk]
+
+            # Large inputs are moved to the WorkItemPayload table, which only
+            # takes a couple queries per chunk. These payloads must be saved in
+            # the same transaction as the WorkItems so that they can't be
+            # cleaned up before the WorkItems exist (see
+            # WorkItemPayload.delete_unused).
+            with transaction.atomic():
+                fxn_fields = WorkItem.get_pickled_fields("fxn", [fxn_pickled])[0]
+                args_fields = WorkItem.get_pickled_fields("args", args_pickled)
+                kwargs_fields = WorkItem.get_pickled_fields("kwargs", kwargs_pickled)
+                workitems = [
+                    WorkItem(
+                        **fxn_fields,
+                        **args_entry,
+                        **kwargs_entry,
+                        tags=tags,  # should be json serializable already
+                        # bulk_create skips the save() method, so we set this here
+                        tags_string=WorkItem.get_tags_string(tags),
+                    )
+                    for args_entry, kwargs_entry in zip(args_fields, kwargs_fields)
+                ]
+                if use_bulk:
+                    WorkItem.objects.bulk_create(workitems)
+                else:
+                    for workitem in workitems:
+                        workitem.save()
+            all_workitems += workitems
+
+        return all_workitems
+
+    @classmethod
+    def map(
+        cls,
+        fxn: callable,
+        *iterables,
+        tags: list[str] = [],
+        chunksize: int = 500,
+    ) -> list[WorkItem]:
+        """
+        Submits `fxn(*args)` for every set of args from the iterables (just
+        like python's built-in `map`) and returns a list of WorkItems (futures).
+
+        Unlike `concurrent.futures.Executor.map`, this does not wait on the
+        results. Use `wait` to collect them.
+
+        ``` python
+        futures = SimmateExecutor.map(sum, [[1, 2], [3, 4]])
+        results = SimmateExecutor.wait(futures)  # gives [3, 7]
+        ```
+
+        See `submit_many` for more details on the `tags` and `chunksize` inputs.
+        """
+        return cls.submit_many(
+            fxn,
+            args_list=zip(*iterables),
+            tags=tags,
+            chunksize=chunksize,
+        )
+
+    @staticmethod
+    def wait(workitems: list[WorkItem] | dict, timeout: float = None):
         """
         Waits for all futures to complete before returning a list of their results
+
+        All futures are checked together (a single query per check), rather
+        than waiting on each one at a time. If you'd like to process futures
+        as they finish, use `as_completed` instead.
         """
+        logging.info("waiting for workflows to finish")
+        futures = workitems.values() if isinstance(workitems, dict) else workitems
+        _, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            raise TimeoutError(
+                f"{len(not_done)} workitems did not complete within the time limit"
+            )
+
         # If a dictionary of {key1: future1, key2: future2, ...} is given,
         # then we return a dictionary of which futures replaced by results.
         # NOTE: this is really for compatibility with Prefect's FlowRunner.
         if isinstance(workitems, dict):
-            logging.info("waiting for workflows to finish")
-            import time
-
-            time.sleep(10)
-            for key, workitem in workitems.items():
-                print((key, workitem, workitem.pk, workitem.done()))
-                # print(future.result())
             return {key: workitem.result() for key, workitem in workitems.items()}
         # otherwise this is a list of futures, so return a list of results
         else:
             return [workitem.result() for workitem in workitems]
 
+    @staticmethod
+    def as_completed(workitems: list[WorkItem], timeout: float = None):
+        """
+        Returns an iterator that yields the given futures as they complete.
+
+        See `simmate.engine.execution.database.as_completed` for more details.
+        """
+        return as_completed(workitems, timeout=timeout)
+
     # -------------------------------------------------------------------------
     # These methods are for managing and monitoring the queue
     # I attach these directly to the Executor rather than having a separate
@@ -119,6 +270,7 @@ class SimmateExecutor:
             )
         else:
             WorkItem.objects.all().delete()
+            WorkItemPayload.delete_unused()
 
     @staticmethod
     def delete_finished(confirm: bool = False):
@@ -135,6 +287,78 @@ class SimmateExecutor:
             )
         else:
             WorkItem.objects.filter(status="F").delete()
+            WorkItemPayload.delete_unused()
+
+    @staticmethod
+    def archive_done(
+        older_than: timedelta = timedelta(days=1),
+        statuses: list[str] = ["F", "E", "C"],
+        chunksize: int = 1000,
+    ) -> int:
+        """
+        Moves done WorkItems (and their large pickled data) out of the queue
+        table and into the `WorkItemArchive` table. Workers query the queue
+        table constantly, so keeping it small keeps their queries fast.
+
+        Archived WorkItems keep their ids, so calling `result()` on them
+        still works. Returns the number of WorkItems that were archived.
+
+        #### Parameters
+
+        - `older_than`:
+            only archive WorkItems that were last updated before this long ago.
+            Defaults to 1 day.
+
+        - `statuses`:
+            which statuses to archive. Defaults to finished, errored, and
+            cancelled. PENDING and RUNNING WorkItems can never be archived.
+
+        - `chunksize`:
+            the number of rows to move within a single transaction
+        """
+
+        if set(statuses) & {"P", "R"}:
+            raise Exception("Only done WorkItems can be archived (F, E, or C)")
+
+        query = WorkItem.objects.filter(
+            status__in=statuses,
+            updated_at__lte=timezone.now() - older_than,
+        ).order_by("id")
+
+        columns = [
+            "id",
+            "created_at",
+            "updated_at",
+            "tags",
+            "status",
+            "command_not_found_failures",
+            "fxn",
+            "args",
+            "kwargs",
+            "result_binary",
+            "fxn_hash",
+            "args_hash",
+            "kwargs_hash",
+            "result_hash",
+        ]
+
+        narchived = 0
+        while True:
+            with transaction.atomic():
+                # lock the rows so they can't be changed while we move them
+                rows = list(query.select_for_update().values(*columns)[:chunksize])
+                if not rows:
+                    break
+
+                WorkItemArchive.objects.bulk_create(
+                    [WorkItemArchive(**row) for row in rows]
+                )
+                WorkItem.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+
+            narchived += len(rows)
+            logging.info(f"Archived {narchived} WorkItems so far")
+
+        return narchived
 
     @staticmethod
     def show_error_summary():
@@ -176,22 +400,45 @@ class SimmateExecutor:
         print(f"ERRORED:   {nerrored} ({error_percent:.2f}%)")
         print(f"CANCELED:  {ncanceled}")
 
-    # -------------------------------------------------------------------------
-    # Extra methods to add if I want to be consistent with other Executor classes
-    # -------------------------------------------------------------------------
+        # and then a summary of the workers that are currently running
+        workers = WorkerRecord.get_active().order_by("id")
+        print(f"\nWORKERS:   {len(workers)}")
+        if workers:
+            print(
+                "ID | HOSTNAME | TAGS | SLOTS | RUNNING | FINISHED | ERRORED | ITEMS/HR"
+            )
+        for worker in workers:
+            print(
+                f"{worker.id} | {worker.hostname} | {worker.tags} | {worker.nslots} | "
+                f"{len(worker.running_ids)} | {worker.nitems_finished} | "
+                f"{worker.nitems_errored} | {worker.throughput:.1f}"
+            )
 
-    # @staticmethod
-    # def map(fxn, iterables, timeout=None, chunksize=100):  # TODO
-    #     # chunksize indicates how many to add at one
-    #     # iterables is a list of (*args, **kwargs)
-    #     # add many fn(*args, **kwargs) to queue
+    @staticmethod
+    def shutdown_workers(worker_ids: list[int] = None) -> int:
+        """
+        Asks workers to stop grabbing new WorkItems and shut down once their
+        current WorkItems are done. If no ids are given, all running workers
+        are asked to shut down. Workers check for this with each heartbeat.
 
-    #     # TODO -- This is not supported at the moment. I should use the
-    #     # .bulk_create method to do this in the future:
-    #     # https://docs.djangoproject.com/en/3.1/ref/models/querysets/#bulk-create
+        Returns the number of workers that were asked to shut down.
+        """
+        return WorkerRecord.request_shutdown(worker_ids)
 
-    #     # raise an error to ensure user sees this isn't supported yet.
-    #     raise Exception("This method is not supported yet")
+    @staticmethod
+    def requeue_orphans(heartbeat_timeout: float = 600) -> int:
+        """
+        Puts RUNNING WorkItems back in the queue if their worker stopped
+        sending heartbeats. Workers already do this automatically, so this
+        is only needed when no workers are running.
+
+        Returns the number of WorkItems that were requeued.
+        """
+        return WorkerRecord.requeue_orphans(heartbeat_timeout)
+
+    # -------------------------------------------------------------------------
+    # Extra methods to add if I want to be consistent with other Executor classes
+    # -------------------------------------------------------------------------
 
     # @staticmethod
     # def shutdown(wait=True, cancel_futures=False):  # TODO
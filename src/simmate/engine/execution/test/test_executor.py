@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED
+from datetime import timedelta
+
+import cloudpickle
+import pytest
+from django.utils import timezone
+
+from simmate.engine.execution import (
+    SimmateExecutor,
+    WorkItem,
+    WorkItemArchive,
+    WorkItemPayload,
+    as_completed,
+    wait,
+)
+
+
+@pytest.mark.django_db
+def test_submit_many():
+    futures = SimmateExecutor.submit_many(
+        fxn=round,
+        args_list=[(1.234,), (5.678,), (9.1011,)],
+        kwargs_list=[{"ndigits": 1}, {"ndigits": 2}, {}],
+        tags=["test"],
+        chunksize=2,
+    )
+    assert len(futures) == 3
+    assert all(future.pk for future in futures)
+    assert WorkItem.objects.filter(tags=["test"]).count() == 3
+
+    # order of the futures should match the order of inputs
+    workitem = WorkItem.objects.get(pk=futures[1].pk)
+    assert cloudpickle.loads(workitem.args) == (5.678,)
+    assert cloudpickle.loads(workitem.kwargs) == {"ndigits": 2}
+
+    with pytest.raises(Exception):
+        SimmateExecutor.submit_many(round, args_list=[(1,)], kwargs_list=[])
+
+
+@pytest.mark.django_db
+def test_map():
+    futures = SimmateExecutor.map(pow, [2, 3, 4], [2, 2, 2], chunksize=2)
+    assert len(futures) == 3
+
+    workitems = WorkItem.objects.order_by("id").all()
+    assert [cloudpickle.loads(w.args) for w in workitems] == [(2, 2), (3, 2), (4, 2)]
+    assert cloudpickle.loads(workitems[0].fxn) == pow
+
+
+@pytest.mark.django_db
+def test_wait_and_as_completed():
+    futures = SimmateExecutor.map(pow, [2, 3, 4], [2, 2, 2])
+
+    # nothing is done yet, so we should hit the timeout
+    done, not_done = wait(futures, timeout=0.2, return_when=FIRST_COMPLETED)
+    assert not done and len(not_done) == 3
+    with pytest.raises(TimeoutError):
+        futures[0].result(timeout=0.2)
+
+    # emulate a worker finishing one of the workitems
+    WorkItem.objects.filter(pk=futures[1].pk).update(
+        status="F",
+        result_binary=cloudpickle.dumps(9),
+    )
+    done, not_done = wait(futures, timeout=0.2, return_when=FIRST_COMPLETED)
+    assert done == {futures[1]}
+    assert futures[1].result() == 9
+
+    done, not_done = wait(futures, timeout=0.2, return_when=ALL_COMPLETED)
+    assert done == {futures[1]} and len(not_done) == 2
+
+    # cancelled items count as done
+    futures[2].cancel()
+    assert [f.pk for f in as_completed(futures[1:])] == [f.pk for f in futures[1:]]
+    with pytest.raises(TimeoutError):
+        list(SimmateExecutor.as_completed(futures, timeout=0.2))
+
+
+@pytest.mark.django_db
+def test_filter_by_tags():
+    SimmateExecutor.submit(sum, [1, 2], tags=["simmate", "VASP"])
+    SimmateExecutor.submit_many(sum, args_list=[([1, 2],)], tags=["simmate"])
+    SimmateExecutor.submit(sum, [1, 2])
+
+    assert WorkItem.objects.first().tags_string == "|simmate|vasp|"
+    assert WorkItem.objects.filter_by_tags(["simmate"]).count() == 2
+    assert WorkItem.objects.filter_by_tags(["vasp", "simmate"]).count() == 1
+    assert WorkItem.objects.filter_by_tags(["sim"]).count() == 0
+    assert WorkItem.objects.filter_by_tags([]).count() == 1
+
+    # rows saved before the tags_string column existed are filled in
+    WorkItem.objects.update(tags_string="")
+    assert WorkItem.update_tags_strings(chunk_size=1) == 2
+    assert WorkItem.objects.filter_by_tags(["simmate"]).count() == 2
+    assert WorkItem.objects.filter_by_tags([]).count() == 1
+
+    # tags that don't fit in the tags_string column are rejected
+    with pytest.raises(Exception):
+        SimmateExecutor.submit(sum, [1, 2], tags=["a" * 300])
+
+
+@pytest.mark.django_db
+def test_archive_done():
+    futures = SimmateExecutor.map(pow, [2, 3, 4], [2, 2, 2])
+    created_at = timezone.now() - timedelta(days=5)
+    updated_at = timezone.now() - timedelta(days=2)
+    WorkItem.objects.filter(pk__in=[f.pk for f in futures[:2]]).update(
+        status="F",
+        result_binary=cloudpickle.dumps(4),
+        created_at=created_at,
+        updated_at=updated_at,
+    )
+
+    # nothing is old enough to archive yet
+    assert SimmateExecutor.archive_done(older_than=timedelta(days=3)) == 0
+
+    narchived = SimmateExecutor.archive_done(chunksize=1)
+    assert narchived == 2
+    assert WorkItem.objects.count() == 1
+    assert WorkItemArchive.objects.count() == 2
+
+    # the history of each workitem is kept
+    for archived in WorkItemArchive.objects.all():
+        assert archived.created_at == created_at
+        assert archived.updated_at == updated_at
+        assert archived.archived_at > updated_at
+
+    # archived items can still be waited on and give results
+    assert futures[0].result() == 4
+    done, not_done = wait(futures, timeout=0.2)
+    assert len(done) == 2 and not_done == {futures[2]}
+
+
+@pytest.mark.django_db
+def test_large_payloads():
+    # large inputs are stored (once) in the payload table rather than inline
+    big_list = list(range(1000))
+    futures = SimmateExecutor.submit_many(
+        fxn=sum,
+        args_list=[(big_list,), (big_list,), ([1, 2],)],
+    )
+    assert WorkItemPayload.objects.count() == 1
+
+    workitems = WorkItem.objects.order_by("id").all()
+    assert workitems[0].args_hash == workitems[1].args_hash
+    assert workitems[0].load_args() == (big_list,)
+    assert not workitems[2].args_hash
+    assert workitems[2].load_args() == ([1, 2],)
+    assert workitems[0].load_fxn() == sum
+
+    # large results are stored the same way
+    workitem = workitems[0]
+    result_fields = WorkItem.get_pickled_fields(
+        "result_binary", [cloudpickle.dumps(big_list)]
+    )
+    WorkItem.objects.filter(pk=workitem.pk).update(status="F", **result_fields[0])
+    assert futures[0].result() == big_list
+    assert WorkItemPayload.objects.count() == 2
+
+    # payloads are only removed once no workitems reference them
+    SimmateExecutor.delete_finished(confirm=True)
+    assert WorkItemPayload.objects.count() == 1
+    SimmateExecutor.delete_all(confirm=True)
+    assert WorkItemPayload.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_delete_unused_payloads(mocker):
+    big_list = list(range(1000))
+    payload_hash = WorkItemPayload.store_many([cloudpickle.dumps(big_list)])[0]
+
+    # A submission can reuse a payload and save its WorkItem while
+    # delete_unused is running. The payload must be kept.
+    get_unused = WorkItemPayload.get_unused
+    ncalls = []
+
+    def get_unused_with_submission():
+        if ncalls:
+            WorkItem.objects.create(fxn=cloudpickle.dumps(sum), args_hash=payload_hash)
+        ncalls.append(1)
+        return get_unused()
+
+    mocker.patch.object(WorkItemPayload, "get_unused", get_unused_with_submission)
+    assert WorkItemPayload.delete_unused() == 0
+    assert WorkItem.objects.get().load_args() == big_list
+
+    # if delete_unused removed the payload first, it is stored again
+    WorkItemPayload.objects.all().delete()
+    assert WorkItemPayload.store_many([cloudpickle.dumps(big_list)]) == [payload_hash]
+    assert WorkItem.objects.get().load_args() == big_list
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from simmate.engine.execution import (
+    SimmateExecutor,
+    SimmateWorker,
+    WorkerRecord,
+    WorkItem,
+)
+
+
+@pytest.mark.django_db
+def test_worker_serial():
+    futures = [SimmateExecutor.submit(sum, [n, 1], tags=["test"]) for n in range(3)]
+
+    worker = SimmateWorker(
+        nitems_max=2,
+        close_on_empty_queue=True,
+        waittime_on_empty_queue=0.1,
+        tags=["test"],
+    )
+    worker.start()
+
+    # only two of the three workitems should have been ran
+    assert WorkItem.objects.filter(status="F").count() == 2
+    assert futures[0].result() == 1
+    assert futures[1].result() == 2
+    assert WorkItem.objects.get(pk=futures[2].pk).status == "P"
+
+
+@pytest.mark.django_db
+def test_worker_slots(mocker):
+    # Threads each get their own database connection, which the in-memory test
+    # database can't handle well. So we only check that the slots are used
+    # and mock the function that runs (and saves) the workitem.
+    nactive = []
+    active_ids = set()
+    lock = threading.Lock()
+
+    def fake_run_workitem(self, workitem):
+        with lock:
+            active_ids.add(workitem.pk)
+            nactive.append(len(active_ids))
+        time.sleep(0.2)
+        with lock:
+            active_ids.discard(workitem.pk)
+        return True
+
+    mocker.patch.object(SimmateWorker, "_run_workitem", fake_run_workitem)
+    mocker.patch.object(SimmateWorker, "_run_workitem_in_thread", fake_run_workitem)
+
+    for n in range(5):
+        SimmateExecutor.submit(sum, [n, 1], tags=["test"])
+
+    worker = SimmateWorker(
+        nitems_max=4,
+        close_on_empty_queue=True,
+        waittime_on_empty_queue=0.1,
+        tags=["test"],
+        nslots=3,
+    )
+    worker.start()
+
+    # the limit applies accross all slots, and multiple slots ran at once
+    assert len(nactive) == 4
+    assert max(nactive) > 1
+    assert WorkItem.objects.filter(status="P").count() == 1
+
+
+def slow_workitem(duration: float) -> tuple[float]:
+    start = time.time()
+    time.sleep(duration)
+    return start, time.time()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_worker_slots_threaded():
+    # Unlike the test above, workitems are actually ran (and saved) in the
+    # threads, where each thread has its own database connection. This needs
+    # a transactional test so that the threads see the submitted workitems.
+    #
+    # The in-memory test database raises an error (rather than waiting) when
+    # two connections write at once. So both workitems are claimed together
+    # (claim_batch_size) and given different durations, which means their
+    # results are never saved at the same time.
+    durations = [0.4, 1.2]
+    futures = [
+        SimmateExecutor.submit(slow_workitem, duration, tags=["test"])
+        for duration in durations
+    ]
+
+    worker = SimmateWorker(
+        nitems_max=2,
+        tags=["test"],
+        nslots=2,
+        claim_batch_size=2,
+    )
+    time_start = time.time()
+    worker.start()
+
+    # both workitems completed and ran at the same time
+    assert WorkItem.objects.filter(status="F").count() == 2
+    (start1, end1), (start2, end2) = [future.result() for future in futures]
+    assert start1 < end2 and start2 < end1
+    assert time.time() - time_start < sum(durations)
+    assert WorkerRecord.objects.get().nitems_finished == 2
+
+
+@pytest.mark.django_db
+def test_worker_claim_batch():
+    futures = [SimmateExecutor.submit(sum, [n, 1], tags=["test"]) for n in range(5)]
+    SimmateExecutor.submit(sum, [1, 1], tags=["other"])
+
+    worker = SimmateWorker(tags=["test"])
+    workitems = worker._claim_workitems(limit=3)
+    assert [w.pk for w in workitems] == [f.pk for f in futures[:3]]
+    assert all(w.status == "R" for w in workitems)
+    assert WorkItem.objects.filter(status="R").count() == 3
+
+    # unstarted workitems are given back to the queue
+    worker._release_workitems(workitems[1:])
+    assert WorkItem.objects.filter(status="R").count() == 1
+    assert worker._running_ids == {futures[0].pk}
+
+    # the buffer of claimed workitems should never go over nitems_max
+    worker = SimmateWorker(
+        nitems_max=3,
+        close_on_empty_queue=True,
+        waittime_on_empty_queue=0.1,
+        tags=["test"],
+        claim_batch_size=10,
+    )
+    worker.start()
+    assert WorkItem.objects.filter(status="F").count() == 3
+    assert WorkItem.objects.filter(status="P").count() == 2
+
+
+@pytest.mark.django_db
+def test_worker_heartbeat():
+    future = SimmateExecutor.submit(sum, [1, 2], tags=["test"])
+
+    worker = SimmateWorker(tags=["test"])
+    workitem = worker._claim_workitems()[0]
+    assert workitem.pk == future.pk
+    assert worker._running_ids == {future.pk}
+
+    updated_at = WorkItem.objects.get(pk=future.pk).updated_at
+    worker.send_heartbeat()
+    assert WorkItem.objects.get(pk=future.pk).updated_at > updated_at
+
+
+@pytest.mark.django_db
+def test_worker_registry(monkeypatch):
+    future = SimmateExecutor.submit(sum, [1, 2], tags=["test"])
+
+    # workers record the cluster that submitted them
+    monkeypatch.setenv("SIMMATE_CLUSTER_ID", "cluster-1")
+    worker = SimmateWorker(tags=["test"], nitems_max=1)
+    worker.start()
+    record = WorkerRecord.objects.get()
+    assert record.stopped_at
+    assert record.nitems_finished == 1
+    assert record.cluster_id == "cluster-1"
+    assert WorkItem.objects.get(pk=future.pk).worker == record
+
+    # a worker that stopped sending heartbeats has its workitems requeued
+    future = SimmateExecutor.submit(sum, [1, 2], tags=["test"])
+    worker = SimmateWorker(tags=["test"])
+    worker.database_obj = WorkerRecord.objects.create(hostname="dead-host")
+    worker._claim_workitems()
+    assert WorkerRecord.requeue_orphans() == 0
+    WorkerRecord.objects.filter(hostname="dead-host").update(
+        last_heartbeat=timezone.now() - timedelta(hours=1)
+    )
+    assert WorkerRecord.requeue_orphans() == 1
+    assert WorkItem.objects.get(pk=future.pk).status == "P"
+
+    # workers check for shutdown requests with each heartbeat
+    assert SimmateExecutor.shutdown_workers() == 1
+    worker.send_heartbeat()
+    assert worker._shutdown_requested.is_set()
+
+
+@pytest.mark.django_db
+def test_worker_orphans():
+    dead_worker = WorkerRecord.objects.create(
+        hostname="dead-host",
+        last_heartbeat=timezone.now() - timedelta(hours=1),
+    )
+    live_worker = WorkerRecord.objects.create(hostname="live-host")
+    futures = [SimmateExecutor.submit(sum, [n, 1]) for n in range(3)]
+    WorkItem.objects.filter(pk=futures[0].pk).update(status="R", worker=dead_worker)
+    WorkItem.objects.filter(pk=futures[1].pk).update(status="R", worker=live_worker)
+    WorkItem.objects.filter(pk=futures[2].pk).update(
+        status="R",
+        worker=None,
+        updated_at=timezone.now() - timedelta(hours=1),
+    )
+
+    # PostgreSQL rejects "FOR UPDATE" on the nullable side of an outer join,
+    # so the locked query must never join the WorkerRecord table
+    query = WorkerRecord.get_orphans().select_for_update(skip_locked=True)
+    assert "JOIN" not in str(query.query)
+    assert sorted(query.values_list("id", flat=True)) == [
+        futures[0].pk,
+        futures[2].pk,
+    ]
+
+    # orphans with and without a worker are requeued
+    assert WorkerRecord.requeue_orphans() == 2
+    assert WorkItem.objects.get(pk=futures[0].pk).status == "P"
+    assert WorkItem.objects.get(pk=futures[1].pk).status == "R"
+    assert WorkItem.objects.get(pk=futures[2].pk).worker is None
+    assert WorkItem.objects.get(pk=futures[2].pk).status == "P"
@@ -7,10 +7,16 @@ def start_cluster(
     nworkers: int,
     cluster_type: str = "local",
     continuous: bool = False,
+    max_nworkers: int = None,
+    tags: list[str] = ["simmate"],
+    nitems_per_worker: int = 1,
 ):
     """
     Utilitiy that helps set up common cluster types with a specific number of
-    workers and optionally run a single-submit of workers
+    workers and optionally run a single-submit of workers.
+
+    When running continuously, the cluster can also autoscale between
+    `nworkers` and `max_nworkers`. See `Cluster.start_cluster` for details.
     """
     if cluster_type == "local":
         cluster = LocalCluster
@@ -20,7 +26,12 @@ def start_cluster(
         raise Exception(f"Unknown cluster type {cluster_type}. Choose local or slurm.")
 
     if continuous:
-        cluster.start_cluster(nworkers)
+        cluster.start_cluster(
+            nworkers,
+            max_nworkers=max_nworkers,
+            tags=tags,
+            nitems_per_worker=nitems_per_worker,
+        )
     else:
         jobs = cluster.submit_jobs(nworkers)
         if cluster_type == "local":
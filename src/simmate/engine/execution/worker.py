@@ -1,14 +1,24 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import os
+import socket
+import threading
 import time
 import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import cloudpickle  # needed to serialize Prefect workflow runs and tasks
-from django.db import transaction
+from django.db import connection, connections, transaction
+from django.utils import timezone
 from rich import print
 
-from simmate.engine.execution.database import WorkItem
+from simmate.engine.execution.database import (
+    WorkerRecord,
+    WorkItem,
+    notify_workitems_done,
+)
 
 # This string is just something fancy to display in the console when a worker
 # starts up.
@@ -30,17 +40,21 @@ class SimmateWorker:
     via the `run_cloud` method.
     """
 
-    # Consider making this a database object so that we can track workers in
-    # the UI and know how many are running. If linked to the database, we could
-    # even send an update for the worker to shut down.
-
-    # Ideally, this worker would involve multiple threads threads going. One
-    # thread would update the queue database with a "heartbeat" to let it know
-    # that it is still working on tasks. The other thread will run the given
-    # workitems in serial. I could even allow for more threads so that this
-    # worker can run multiple workitems at once and in parallel.
-    # However, if this level of implementation is needed, we should instead
-    # switch to using Prefect, which has it built in.
+    # Each worker registers itself in the WorkerRecord database table, which lets
+    # us track workers in the UI and know how many are running. The worker
+    # checks this table with each heartbeat, so it can also be asked to shut
+    # down from anywhere (see `WorkerRecord.request_shutdown`).
+
+    # This worker involves multiple threads. One thread updates the queue
+    # database with a "heartbeat" to let it know that it is still working on
+    # its WorkItems. When nslots=1, the main thread runs workitems in serial.
+    # Otherwise, a pool of threads runs several workitems at once and in
+    # parallel -- which is useful for many short tasks (e.g. toolkit and
+    # evolution-bookkeeping workflows). Threads are used instead of processes
+    # because nearly all of the heavy work is done in subprocesses (e.g. DFT
+    # commands) and each thread gets its own database connection.
+    # If more advanced scheduling is needed, we should instead switch to
+    # using Prefect, which has it built in.
 
     def __init__(
         self,
@@ -52,6 +66,11 @@ class SimmateWorker:
         close_on_empty_queue: bool = False,
         waittime_on_empty_queue: float = 15,
         tags: list[str] = ["simmate"],  # should default be empty...?
+        # settings for running multiple workitems at once
+        nslots: int = 1,
+        heartbeat_interval: float = 60,
+        claim_batch_size: int = 1,
+        orphan_timeout: float = 600,
     ):
         """
         Configures a worker that connects to the default executor backend.
@@ -61,11 +80,13 @@ class SimmateWorker:
 
         - `nitems_max`:
             The maximum number of workitems to run before closing down
-            if no limit was set, we can go to infinity.
+            if no limit was set, we can go to infinity. When nslots>1, this
+            limit applies to the total across all slots.
 
         - `timeout`:
             Don't start a new workitem after this time. The worker will be shut down.
-            if no timeout was set, use infinity so we wait forever.
+            if no timeout was set, use infinity so we wait forever. Any
+            workitems that are already running are allowed to finish.
 
         - `close_on_empty_queue`:
             whether to close if the queue is empty
@@ -78,17 +99,65 @@ class SimmateWorker:
             the tags to query tasks for. If no tags were given, the worker will
             query for tasks that have NO tags
 
+        - `nslots`:
+            the number of workitems to run at the same time. Each slot runs
+            in a separate thread. Defaults to 1, where workitems are ran in
+            serial by the main thread.
+
+        - `heartbeat_interval`:
+            the time (in seconds) between updates of the claimed workitems'
+            `updated_at` column. This lets others know that the workitems
+            are still alive and being worked on.
+
+        - `claim_batch_size`:
+            the maximum number of workitems to claim from the queue at once.
+            Claimed workitems are marked as RUNNING and kept in a local buffer
+            until a slot is available. This greatly reduces the number of
+            queries when there are many short workitems. Any workitems left
+            in the buffer are returned to the queue when the worker shuts down.
+            Defaults to 1, which grabs a single workitem at a time.
+
+        - `orphan_timeout`:
+            the time (in seconds) without a heartbeat before another worker is
+            considered dead. RUNNING workitems of dead workers are put back
+            in the queue. This must be longer than the `heartbeat_interval` of
+            all workers. Defaults to 10 minutes.
+
         """
         self.tags = tags
         self.nitems_max = nitems_max or float("inf")
         self.timeout = timeout or float("inf")
         self.close_on_empty_queue = close_on_empty_queue
         self.waittime_on_empty_queue = waittime_on_empty_queue
+        self.nslots = nslots
+        self.heartbeat_interval = heartbeat_interval
+        self.claim_batch_size = claim_batch_size
+        self.orphan_timeout = orphan_timeout
+
+        if self.nslots < 1:
+            raise Exception("A worker must have at least one slot (nslots>=1)")
+        if self.claim_batch_size < 1:
+            raise Exception("A worker must claim at least one workitem at a time")
 
         # whether to wait on the running workitems to finish before shutting down
         # the timedout worker.
         # self.wait_on_timeout = wait_on_timeout # # TODO
 
+        # The ids of WorkItems that are currently running. This is shared
+        # between the slots and the heartbeat thread, so it must be accessed
+        # with the lock.
+        self._running_ids = set()
+        self._running_lock = threading.Lock()
+        self._heartbeat_stop = threading.Event()
+
+        # The database entry for this worker, which is made once the worker
+        # starts. The counters are also shared between threads and reported
+        # to the database with each heartbeat.
+        self.database_obj = None
+        self._nitems_finished = 0
+        self._nitems_errored = 0
+        self._shutdown_requested = threading.Event()
+
     def start(self):
         """
         Starts the worker process to begin working through WorkItems
@@ -98,170 +167,386 @@ class SimmateWorker:
         print("[bold cyan]" + HEADER_ART)
 
         # loggin helpful info
-        logging.info(f"Starting worker with tags {list(self.tags)}")
+        logging.info(
+            f"Starting worker with tags {list(self.tags)} and {self.nslots} slot(s)"
+        )
+
+        # register this worker in the database so others can see it. We also
+        # take this chance to rescue any workitems left behind by dead workers
+        self.database_obj = WorkerRecord.objects.create(
+            hostname=socket.gethostname(),
+            pid=os.getpid(),
+            tags=list(self.tags),
+            nslots=self.nslots,
+            cluster_id=os.environ.get("SIMMATE_CLUSTER_ID"),
+        )
+        self.requeue_orphans()
 
         # establish starting point for the worker
         time_start = time.time()
         ntasks_finished = 0
+        shutdown_requested = False
+
+        queue_was_empty = False
+
+        # futures of the workitems running in the slots. This stays empty
+        # when running workitems in serial (nslots=1)
+        futures = set()
+
+        # workitems that we claimed from the queue (and marked as RUNNING) but
+        # haven't started yet. See the `claim_batch_size` parameter.
+        prefetched = deque()
+        pool = ThreadPoolExecutor(max_workers=self.nslots) if self.nslots > 1 else None
+
+        # The heartbeat runs in the background for the entire life of the worker
+        heartbeat_thread = self._start_heartbeat()
+
+        try:
+            # Loop endlessly until one of the following happens...
+            #   the timeout limit is hit
+            #   the queue is empty
+            #   the nitems limit is hit
+            #   a workitem signals that the worker should shut down
+            while True:
+                # collect any slots that finished since our last loop
+                finished = {future for future in futures if future.done()}
+                futures -= finished
+                for future in finished:
+                    if future.result():
+                        ntasks_finished += 1
+                    else:
+                        shutdown_requested = True
+
+                if shutdown_requested:
+                    logging.info("Shutting down to prevent repeated issues.")
+                    return
 
-        # Loop endlessly until one of the following happens...
-        #   the timeout limit is hit
-        #   the queue is empty
-        #   the nitems limit is hit
-        while True:
-            # check for timeout before starting a new workitem and exit
-            # if we've hit the limit.
-            if (time.time() - time_start) > self.timeout:
-                # TODO - check wait_on_timeout if running in parallel.
-                logging.info(
-                    "The time-limit for this worker has been hit. Shutting down."
-                )
-                return
-
-            # check the number of jobs completed so far, and exit if we hit
-            # the limit
-            if ntasks_finished >= self.nitems_max:
-                logging.info(
-                    f"Maximum number of WorkItems reached ({self.nitems_max}). "
-                    "Shutting down."
-                )
-                return
-
-            # check the length of the queue and while it is empty, we want to
-            # loop. The exception of looping endlessly is if we want the worker
-            # to shutdown instead.
-            while self.queue_size() == 0:
-                # if it is empty, we want to sleep for a little and check again
-                time.sleep(self.waittime_on_empty_queue)
-
-                # This is a special condition where we may want to close the
-                # worker if the queue stays empty
-                if self.close_on_empty_queue:
-                    # after we just waited, let's check the queue size again
-                    if self.queue_size() == 0:
-                        # if it's still empty, we should close the worker
+                # check if someone asked us to shut down via the database.
+                # Any workitems that are already running are allowed to finish
+                if self._shutdown_requested.is_set():
+                    logging.info("A shutdown was requested. Shutting down.")
+                    return
+
+                # check for timeout before starting a new workitem and exit
+                # if we've hit the limit.
+                if (time.time() - time_start) > self.timeout:
+                    # TODO - check wait_on_timeout if running in parallel.
+                    logging.info(
+                        "The time-limit for this worker has been hit. Shutting down."
+                    )
+                    return
+
+                # check the number of jobs completed (and currently running) so
+                # far, and exit if we hit the limit
+                if ntasks_finished + len(futures) >= self.nitems_max:
+                    if futures:
+                        wait(futures, return_when=FIRST_COMPLETED)
+                        continue
+                    logging.info(
+                        f"Maximum number of WorkItems reached ({self.nitems_max}). "
+                        "Shutting down."
+                    )
+                    return
+
+                # if all slots are busy, wait for one of them to open up
+                if len(futures) >= self.nslots:
+                    wait(futures, return_when=FIRST_COMPLETED)
+                    continue
+
+                # If we've made it this far, we're ready to grab a new WorkItem
+                # and run it! We only go to the database when our local buffer
+                # of prefetched workitems is empty, and then we claim up to
+                # `claim_batch_size` workitems at once -- without going over
+                # the nitems_max limit.
+                if not prefetched:
+                    nclaim = min(
+                        self.claim_batch_size,
+                        self.nitems_max - ntasks_finished - len(futures),
+                    )
+                    prefetched.extend(self._claim_workitems(int(nclaim)))
+
+                # If no workitems could be claimed, the queue is empty. While
+                # it is empty, we want to loop. The exception of looping
+                # endlessly is if we want the worker to shutdown instead.
+                if not prefetched:
+                    # If other slots are still busy, we wait on them instead of
+                    # sleeping blindly -- as they may finish in the meantime.
+                    if futures:
+                        wait(
+                            futures,
+                            timeout=self.waittime_on_empty_queue,
+                            return_when=FIRST_COMPLETED,
+                        )
+                        continue
+
+                    # This is a special condition where we may want to close the
+                    # worker if the queue stays empty. We already waited once
+                    # and checked the queue again, so it's still empty and we
+                    # should close the worker.
+                    if self.close_on_empty_queue and queue_was_empty:
                         logging.info("The task queue is empty. Shutting down.")
                         return
 
-            # make this atomic so that multiple workers don't accidentally
-            # grab the same job.
-            with transaction.atomic():
-                # If we've made it this far, we're ready to grab a new WorkItem
-                # and run it!
-                # Query for PENDING WorkItems, lock it for editting, and update
-                # the status to RUNNING. And grab the first result
-                workitem = (
-                    WorkItem.objects.select_for_update(skip_locked=True)
-                    .filter(status="P")
-                    .filter_by_tags(self.tags)
-                    .first()
+                    # if it is empty, we want to sleep for a little and check again
+                    queue_was_empty = True
+                    time.sleep(self.waittime_on_empty_queue)
+                    continue
+
+                queue_was_empty = False
+                workitem = prefetched.popleft()
+
+                # either run in serial (the main thread) or hand the workitem
+                # off to an open slot
+                if pool:
+                    futures.add(pool.submit(self._run_workitem_in_thread, workitem))
+                elif self._run_workitem(workitem):
+                    ntasks_finished += 1
+                else:
+                    shutdown_requested = True
+
+        finally:
+            # Any workitems that we claimed but never started are given back
+            # to the queue so other workers can grab them.
+            self._release_workitems(prefetched)
+
+            # Workitems that are already running are always allowed to finish
+            if pool:
+                pool.shutdown(wait=True)
+            self._heartbeat_stop.set()
+            heartbeat_thread.join()
+
+            # let everyone know this worker is no longer running
+            self.send_heartbeat()
+            WorkerRecord.objects.filter(pk=self.database_obj.pk).update(
+                stopped_at=timezone.now(),
+            )
+
+    def _claim_workitems(self, limit: int = 1) -> list[WorkItem]:
+        """
+        Grabs up to `limit` PENDING WorkItems, marks them as RUNNING, and
+        returns them in the order they were submitted. If no WorkItems are
+        available, an empty list is returned.
+
+        When the database supports it (PostgreSQL and SQLite 3.35+), this is
+        done in a single `UPDATE ... RETURNING` query. Otherwise, we fall back
+        to a locked SELECT followed by a bulk UPDATE.
+        """
+
+        if limit < 1:
+            return []
+
+        # make this atomic so that multiple workers don't accidentally
+        # grab the same job.
+        with transaction.atomic():
+            # Query for PENDING WorkItems and lock them for editting. Rows
+            # already locked by another worker are skipped (instead of waiting
+            # on them).
+            pending_ids = (
+                WorkItem.objects.select_for_update(skip_locked=True)
+                .filter(status="P")
+                .filter_by_tags(self.tags)
+                .order_by("id")
+                .values_list("id", flat=True)[:limit]
+            )
+
+            if connection.vendor in ["postgresql", "sqlite"] and (
+                connection.features.can_return_columns_from_insert
+            ):
+                # We use the query above as a subquery, so that finding,
+                # locking, and updating the workitems is all one round-trip.
+                pending_sql, pending_params = pending_ids.query.sql_with_params()
+                table = connection.ops.quote_name(WorkItem._meta.db_table)
+                workitems = list(
+                    WorkItem.objects.raw(
+                        f"UPDATE {table} "
+                        "SET status = %s, updated_at = %s, worker_id = %s "
+                        f"WHERE id IN ({pending_sql}) RETURNING *",
+                        ["R", timezone.now(), self.database_id, *pending_params],
+                    )
                 )
+                workitems.sort(key=lambda workitem: workitem.id)
+
+            else:
+                ids = list(pending_ids)
+                if not ids:
+                    return []
+
+                # update the status to running before starting them so no other
+                # worker tries to grab the same WorkItems.
+                # note: auto_now is not applied for update() calls, so we set
+                # the timestamp manually.
+                WorkItem.objects.filter(pk__in=ids).update(
+                    status="R",
+                    updated_at=timezone.now(),
+                    worker_id=self.database_id,
+                )
+                workitems = list(WorkItem.objects.filter(pk__in=ids).order_by("id"))
 
-                # Catch race condition where no workitems are available any more.
-                # If this is the case, we just restart the while loop.
-                if not workitem:
-                    continue
+        # let the heartbeat thread know about these workitems
+        with self._running_lock:
+            self._running_ids.update(workitem.pk for workitem in workitems)
+
+        return workitems
+
+    def _release_workitems(self, workitems: list[WorkItem]):
+        """
+        Resets WorkItems that were claimed but never started back to PENDING.
+        """
 
-                # update the status to running before starting it so no other
-                # worker tries to grab the same WorkItem
-                workitem.status = "R"
-                # TODO: indicate that the WorkItem is with this Worker (relationship)
-                workitem.save()
+        ids = [workitem.pk for workitem in workitems]
+        if not ids:
+            return
 
-            # Print out the job ID that is being ran for the user to see
-            logging.info(f"Running WorkItem with id {workitem.id}")
+        logging.info(f"Returning {len(ids)} unstarted WorkItem(s) to the queue")
+        WorkItem.objects.filter(pk__in=ids, status="R").update(
+            status="P",
+            updated_at=timezone.now(),
+            worker=None,
+        )
 
-            # now let's unpickle the WorkItem components
-            fxn = cloudpickle.loads(workitem.fxn)
-            args = cloudpickle.loads(workitem.args)
-            kwargs = cloudpickle.loads(workitem.kwargs)
+        with self._running_lock:
+            self._running_ids.difference_update(ids)
 
-            # Try running the WorkItem
-            try:
-                result = fxn(*args, **kwargs)
-            # if it fails, we want to "capture" the error and return it
-            # rather than have the Worker fail itself.
-            except Exception as exception:
-                traceback.print_exc()
+    def _run_workitem_in_thread(self, workitem: WorkItem) -> bool:
+        """
+        Runs `_run_workitem` within a slot of the thread pool.
 
-                logging.warning(
-                    "Task failed with the error shown above. \n\n"
-                    "If you are unfamilar with error tracebacks and find this error "
-                    "difficult to read, you can learn more about these errors "
-                    "here:\n https://realpython.com/python-traceback/\n\n"
-                    "Please open a new issue on our github page if you believe "
-                    "this is a bug:\n https://github.com/jacksund/simmate/issues/\n\n"
-                )
+        Django opens a new database connection for each thread, so we make
+        sure that connection is closed once the workitem is done.
+        """
+        try:
+            return self._run_workitem(workitem)
+        finally:
+            connections.close_all()
 
-                # local import to prevent circular import issues
-                from simmate.engine.s3_workflow import CommandNotFoundError
-
-                # The most common error (by far) is a command-not-found issue.
-                # We want to handle this separately -- whereas other exceptions
-                # we just pass on to the results.
-                if isinstance(exception, CommandNotFoundError):
-                    logging.warning(
-                        "This WorkItem failed with a 'command not found' error. "
-                        "This worker is likely improperly configured or "
-                        "you have a typo in your command."
-                    )
+    def _run_workitem(self, workitem: WorkItem) -> bool:
+        """
+        Runs a WorkItem that has already been claimed (and marked as RUNNING)
+        and then saves its result to the database.
 
-                    with transaction.atomic():
-                        nfailures = workitem.command_not_found_failures + 1
-
-                        # Check if this task is problematic. If this error happened
-                        # with another worker, we likely have a problematic task
-                        if nfailures == 2:
-                            logging.warning(
-                                "This is the 2nd occurance with this task causing "
-                                "a 'command not found' problem. In case this a typo "
-                                "in your command, we are marking the task as CANCELLED "
-                                "to prevent it from shutting down other workers."
-                            )
-                            workitem.status = "C"
-                            workitem.save()
-                            # the result will be set below
-
-                        # Otherwise the user likely just forgot to use module load
-                        else:
-                            logging.info(
-                                f"Resetting WorkItem {workitem.id} to 'Pending' so "
-                                "another worker can retry."
-                            )
-
-                            workitem.command_not_found_failures = nfailures
-                            workitem.status = "P"  # marked as PENDING to retry
-                            workitem.save()
-                    logging.info("Shutting down to prevent repeated issues.")
-                    return
+        Returns whether the worker should keep running. False is only returned
+        when the workitem failed with a 'command not found' error, in which
+        case the worker should shut down.
+        """
 
-                result = exception
+        try:
+            return self._execute_workitem(workitem)
+        finally:
+            with self._running_lock:
+                self._running_ids.discard(workitem.pk)
+
+    def _execute_workitem(self, workitem: WorkItem) -> bool:
+        # Print out the job ID that is being ran for the user to see
+        logging.info(f"Running WorkItem with id {workitem.id}")
+
+        # now let's unpickle the WorkItem components
+        fxn = workitem.load_fxn()
+        args = workitem.load_args()
+        kwargs = workitem.load_kwargs()
+
+        # Try running the WorkItem
+        try:
+            result = fxn(*args, **kwargs)
+        # if it fails, we want to "capture" the error and return it
+        # rather than have the Worker fail itself.
+        except Exception as exception:
+            traceback.print_exc()
+
+            logging.warning(
+                "Task failed with the error shown above. \n\n"
+                "If you are unfamilar with error tracebacks and find this error "
+                "difficult to read, you can learn more about these errors "
+                "here:\n https://realpython.com/python-traceback/\n\n"
+                "Please open a new issue on our github page if you believe "
+                "this is a bug:\n https://github.com/jacksund/simmate/issues/\n\n"
+            )
+
+            # local import to prevent circular import issues
+            from simmate.engine.s3_workflow import CommandNotFoundError
+
+            # The most common error (by far) is a command-not-found issue.
+            # We want to handle this separately -- whereas other exceptions
+            # we just pass on to the results.
+            if isinstance(exception, CommandNotFoundError):
+                logging.warning(
+                    "This WorkItem failed with a 'command not found' error. "
+                    "This worker is likely improperly configured or "
+                    "you have a typo in your command."
+                )
 
-            # whatever the result, we need to try to pickle it now
-            try:
-                result_pickled = cloudpickle.dumps(result)
-            # if this fails, we even want to pickle the error and return it
-            except Exception as exception:
-                # otherwise package the full error
-                result_pickled = cloudpickle.dumps(exception)
-
-            # our lock exists only within this transation
-            with transaction.atomic():
-                # requery the WorkItem to restart our lock
-                workitem = WorkItem.objects.select_for_update().get(pk=workitem.pk)
-
-                # pickle the result and update the workitem's result and status
-                # !!! should I have the pickle inside of a Try?
-                workitem.result_binary = result_pickled
-                # mark as finished or errored depending on result value
-                workitem.status = "E" if isinstance(result, Exception) else "F"
-                workitem.save()
-
-            # mark down that we've completed one WorkItem
-            ntasks_finished += 1
-
-            # Print out the job ID that was just finished for the user to see.
-            logging.info("Completed WorkItem")
+                with transaction.atomic():
+                    nfailures = workitem.command_not_found_failures + 1
+
+                    # Check if this task is problematic. If this error happened
+                    # with another worker, we likely have a problematic task
+                    if nfailures == 2:
+                        logging.warning(
+                            "This is the 2nd occurance with this task causing "
+                            "a 'command not found' problem. In case this a typo "
+                            "in your command, we are marking the task as CANCELLED "
+                            "to prevent it from shutting down other workers."
+                        )
+                        workitem.status = "C"
+                        workitem.save()
+                        notify_workitems_done([workitem.pk])
+                        # the result will be set below
+
+                    # Otherwise the user likely just forgot to use module load
+                    else:
+                        logging.info(
+                            f"Resetting WorkItem {workitem.id} to 'Pending' so "
+                            "another worker can retry."
+                        )
+
+                        workitem.command_not_found_failures = nfailures
+                        workitem.status = "P"  # marked as PENDING to retry
+                        workitem.save()
+
+                # we tell the main thread to shut down this worker
+                return False
+
+            result = exception
+
+        # whatever the result, we need to try to pickle it now
+        try:
+            result_pickled = cloudpickle.dumps(result)
+        # if this fails, we even want to pickle the error and return it
+        except Exception as exception:
+            # otherwise package the full error
+            result_pickled = cloudpickle.dumps(exception)
+
+        # our lock exists only within this transation
+        with transaction.atomic():
+            # large results are stored in the WorkItemPayload table. This must
+            # happen in the same transaction that saves the WorkItem (see
+            # WorkItemPayload.delete_unused).
+            result_fields = WorkItem.get_pickled_fields(
+                "result_binary", [result_pickled]
+            )
+
+            # requery the WorkItem to restart our lock
+            workitem = WorkItem.objects.select_for_update().get(pk=workitem.pk)
+
+            # pickle the result and update the workitem's result and status
+            # !!! should I have the pickle inside of a Try?
+            for column, value in result_fields[0].items():
+                setattr(workitem, column, value)
+            # mark as finished or errored depending on result value
+            workitem.status = "E" if isinstance(result, Exception) else "F"
+            workitem.save()
+
+            # let anyone waiting on this workitem know that it's done
+            notify_workitems_done([workitem.pk])
+
+        with self._running_lock:
+            if workitem.status == "E":
+                self._nitems_errored += 1
+            else:
+                self._nitems_finished += 1
+
+        # Print out the job ID that was just finished for the user to see.
+        logging.info(f"Completed WorkItem with id {workitem.id}")
+        return True
 
     def queue_size(self) -> int:
         """
@@ -276,6 +561,92 @@ class SimmateWorker:
         )
         return queue_size
 
+    # -------------------------------------------------------------------------
+    # Methods for the background heartbeat thread
+    # -------------------------------------------------------------------------
+
+    def _start_heartbeat(self) -> threading.Thread:
+        """
+        Starts a background (daemon) thread that periodically calls
+        `send_heartbeat` until the worker shuts down.
+        """
+        self._heartbeat_stop.clear()
+        thread = threading.Thread(
+            target=self._heartbeat_loop,
+            name="simmate-worker-heartbeat",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _heartbeat_loop(self):
+        # Event.wait returns False when the timeout is hit, and True once the
+        # main thread tells us to stop.
+        while not self._heartbeat_stop.wait(self.heartbeat_interval):
+            # A failed heartbeat should never take down the worker or its
+            # running workitems, so we just log the issue and try again later.
+            try:
+                self.send_heartbeat()
+                self.requeue_orphans()
+            except Exception:
+                logging.warning("Failed to send worker heartbeat", exc_info=True)
+
+        # this thread has its own database connection, which we close out
+        connections.close_all()
+
+    @property
+    def database_id(self) -> int:
+        """
+        The id of this worker in the WorkerRecord table (if it has been registered)
+        """
+        return self.database_obj.pk if self.database_obj else None
+
+    def send_heartbeat(self):
+        """
+        Updates the `updated_at` column of all WorkItems currently being ran
+        by this worker. This lets others know that the workitems are still
+        alive and being worked on.
+
+        The worker's own database entry is also updated with its latest
+        stats, and we check whether a shutdown was requested.
+        """
+        with self._running_lock:
+            running_ids = list(self._running_ids)
+            nitems_finished = self._nitems_finished
+            nitems_errored = self._nitems_errored
+
+        # note: auto_now is not applied for update() calls, so we set
+        # the timestamp manually.
+        if running_ids:
+            WorkItem.objects.filter(pk__in=running_ids, status="R").update(
+                updated_at=timezone.now()
+            )
+
+        if not self.database_obj:
+            return
+
+        WorkerRecord.objects.filter(pk=self.database_obj.pk).update(
+            last_heartbeat=timezone.now(),
+            updated_at=timezone.now(),
+            running_ids=running_ids,
+            nitems_finished=nitems_finished,
+            nitems_errored=nitems_errored,
+        )
+        requested_state = (
+            WorkerRecord.objects.values_list("requested_state", flat=True)
+            .filter(pk=self.database_obj.pk)
+            .first()
+        )
+        if requested_state == WorkerRecord.RequestedStateOptions.SHUTDOWN:
+            self._shutdown_requested.set()
+
+    def requeue_orphans(self) -> int:
+        """
+        Puts RUNNING workitems of dead workers back in the queue. See
+        `WorkerRecord.requeue_orphans` for details.
+        """
+        return WorkerRecord.requeue_orphans(heartbeat_timeout=self.orphan_timeout)
+
     @classmethod
     def run_singleflow_worker(cls):
         """
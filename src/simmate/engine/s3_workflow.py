@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import logging
 import os
 import platform
@@ -11,6 +12,7 @@ from pathlib import Path
 import pandas
 
 from simmate.engine import ErrorHandler, Workflow
+from simmate.engine.error_handler import FileScanner
 from simmate.utilities import get_directory, make_error_archive
 
 
@@ -75,15 +77,19 @@ class S3Workflow(Workflow):
     we run monitoring functions every 5 minutes (10x30=300s=5min).
     """
 
+    use_async: bool = False
+    """
+    Whether to supervise the command using asyncio (see `execute_async`)
+    instead of a polling loop. With asyncio, we know exactly when the command
+    completes, and each monitor runs on its own schedule. This is useful for
+    short commands, which otherwise lose up to `polling_timestep` seconds
+    each time they are ran.
+    """
+
     # cleanup_on_fail=False, # TODO I should add a Prefect state_handler that can
     # reset the working directory between task retries -- in some cases we may
     # want to delete the entire directory.
 
-    # OPTIMIZE: I think this class would greatly benefit from asyncio so that we
-    # know exactly when a shelltask completes, rather than looping and checking every
-    # set timestep.
-    # https://docs.python.org/3/library/asyncio-subprocess.html#asyncio.create_subprocess_exec
-
     @classmethod
     def run_config(
         cls,
@@ -163,19 +169,19 @@ class S3Workflow(Workflow):
 
             # run the shelltask and error supervision stages. This method returns
             # a list of any corrections applied during the run.
-            corrections = cls.execute(directory, command)
+            try:
+                corrections = cls.execute(directory, command)
+            finally:
+                # Scanners are shared by all handlers in a process (see
+                # FileScanner.get_scanner), so we remove this directory's once
+                # they are no longer needed. Otherwise, a long-running worker
+                # would keep one for every file it has ever checked.
+                FileScanner.forget(directory)
         else:
             logging.info("Calculation is already completed. Skipping execution.")
 
             # load the corrections from file for reference
-            corrections_filename = directory / "simmate_corrections.csv"
-            if corrections_filename.exists():
-                data = pandas.read_csv(corrections_filename)
-                corrections = data.values.tolist()
-            else:
-                corrections = []
-            # OPTIMIZE: this same code is at the start of the execute method.
-            # Consider making it into a utility.
+            corrections = cls._load_corrections(directory)
 
         # run the workup stage of the task. This is where the data/info is pulled
         # out from the calculation and is thus our "result".
@@ -318,6 +324,19 @@ class S3Workflow(Workflow):
 
         """
 
+        # If requested, we supervise the command using asyncio instead. This
+        # isn't possible when we are already inside of an event loop (e.g.
+        # Jupyter), in which case users should call execute_async directly.
+        if cls.use_async:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(cls.execute_async(directory, command))
+            logging.warning(
+                "An event loop is already running, so the command will be "
+                "supervised by polling instead. Use `execute_async` to avoid this."
+            )
+
         # some error_handlers run while the shelltask is running. These are known as
         # Monitors and are labled via the is_monitor attribute. It's good for us
         # to separate these out from other error_handlers.
@@ -325,15 +344,7 @@ class S3Workflow(Workflow):
 
         # in case this is a restarted calculation, check if there is a list
         # of corrections in the current directory and load those as the start point
-        corrections_filename = directory / "simmate_corrections.csv"
-        if corrections_filename.exists():
-            data = pandas.read_csv(corrections_filename)
-            corrections = data.values.tolist()
-        # Otherwise we start with zero corrections that we slowly add to. This
-        # can be thought of as a table with headers of...
-        #   ("applied_errorhandler", "correction_applied")
-        else:
-            corrections = []
+        corrections = cls._load_corrections(directory)
 
         # ------ start of main while loop ------
 
@@ -361,6 +372,9 @@ class S3Workflow(Workflow):
             # things in parallel without calling mpirun up-front.
             logging.info(f"Using {directory}")
             logging.info(f"Running '{command}'")
+            # output files are rewritten by the new command, so error handlers
+            # must scan them from the start again
+            FileScanner.forget(directory)
             process = subprocess.Popen(
                 command,
                 cwd=directory,
@@ -451,71 +465,13 @@ class S3Workflow(Workflow):
             output, errors = process.communicate()
 
             # check if the return code is non-zero and thus failed.
-            # The 'not has_error' is because terminate() will give a nonzero
-            # when a monitor is triggered. We don't want to raise that
-            # exception here but instead let the monitor handle that
-            # error in the code below.
-            if process.returncode != 0 and not has_error:
-                # convert the error from bytes to a string
-                errors = errors.decode("utf-8")
-                # and report the error to the user. Mac/Linux label this as exit
-                # code 127, whereas windows doesn't so the message needs to be
-                # read.
-                if process.returncode == 127 or (
-                    platform.system() == "Windows"
-                    and "is not recognized as an internal or external command"
-                ):
-                    raise CommandNotFoundError(
-                        f"The command ({command}) failed becauase it could not be found. "
-                        "This typically means that either (a) you have not installed "
-                        "the program required for this command or (b) you forgot to "
-                        "call 'module load ...' before trying to start the program. "
-                        f"The full error output was:\n\n {errors}"
-                    )
-                else:
-                    raise NonZeroExitError(
-                        f"The command ({command}) failed. The error output was...\n {errors}"
-                    )
-
-            # Check for errors again, because a non-monitor may be higher
-            # priority than the monitor triggered above (if there was one).
-            # Since the error_handlers are in order of priority, only the first
-            # will actually be applied and then we can retry the calc.
-            for error_handler in cls.error_handlers:
-                # check if there's an error with this error_handler and grab the
-                # error if there is one
-                error = error_handler.check(directory)
-                if error:
-                    # record the error in case it wasn't done so above
-                    has_error = True
-                    # make a copy of the directory contents and
-                    # store as an archive within the same directory
-                    make_error_archive(directory)
-                    # And apply the proper correction if there is one.
-                    # Some error_handlers will even raise an error here signaling
-                    # that the stagedtask is unrecoverable and a lost cause.
-                    correction = error_handler.correct(directory)
-                    # record what's been changed
-                    corrections.append((error_handler.name, correction))
-                    logging.info(
-                        f"Found error '{error_handler.name}'. Fixed with '{correction}'"
-                    )
-                    # break from the error_handler for-loop as we only apply the
-                    # highest priority fix and nothing else.
-                    break
+            cls._check_return_code(process.returncode, errors, command, has_error)
 
-            # write the log of corrections to file if there are any. This is written
-            # as a CSV file format and done every while-loop cycle because it
-            # lets the user monitor the calculation and error handlers applied
-            # as it goes. If no corrections were applied, we skip writing the file.
-            if corrections:
-                # compile the corrections metadata into a dataframe
-                data = pandas.DataFrame(
-                    corrections,
-                    columns=["error_handler", "correction_applied"],
-                )
-                # write the dataframe to a csv file
-                data.to_csv(corrections_filename, index=False)
+            # Check for errors again (and apply the highest priority fix)
+            has_error = cls._apply_correction(directory, corrections) or has_error
+
+            # write the log of corrections to file if there are any
+            cls._write_corrections(directory, corrections)
 
             # If there are no errors, we've finished the calculation and can
             # exit the while loop. Alternatively, some "soft" errors (such as
@@ -539,6 +495,249 @@ class S3Workflow(Workflow):
         # now return the corrections for them to stored/used elsewhere
         return corrections
 
+    @classmethod
+    async def execute_async(cls, directory: Path, command: str) -> list[tuple[str]]:
+        """
+        The asyncio version of `execute`, which gives the exact same result.
+
+        Rather than polling the command every `polling_timestep`, we await
+        the command directly and are told the moment it completes. Each
+        monitor runs concurrently as its own task and on its own schedule
+        (see `ErrorHandler.monitor_interval`), and their file checks are ran
+        in a separate thread so that they don't block the event loop.
+
+        Because this is a coroutine, many S3Workflow commands can be
+        supervised by a single event loop (and process). For example:
+
+        ``` python
+        import asyncio
+
+        async def run_all():
+            return await asyncio.gather(
+                MyWorkflow.execute_async(directory_1, command),
+                MyWorkflow.execute_async(directory_2, command),
+            )
+
+        all_corrections = asyncio.run(run_all())
+        ```
+
+        #### Parameters
+
+        - `directory`:
+            The directory to run everything in.
+        - `command`:
+            The command that will be called during execution.
+
+        #### Returns
+
+        - `corrections`
+            A list of tuples where each entry is a error identified and the
+            correction applied. Ex: [("ExampleError", "ExampleCorrection")]
+        """
+
+        # Note, we don't set cls.monitors here (like `execute` does) because
+        # several runs of this class may share the event loop.
+        monitors = [handler for handler in cls.error_handlers if handler.is_monitor]
+        corrections = cls._load_corrections(directory)
+
+        try:
+            while len(corrections) <= cls.max_corrections:
+                # See `execute` for why we start a new session here (this is the
+                # same as using preexec_fn=os.setsid).
+                logging.info(f"Using {directory}")
+                logging.info(f"Running '{command}'")
+                FileScanner.forget(directory)
+                process = await asyncio.create_subprocess_shell(
+                    command,
+                    cwd=directory,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=platform.system() != "Windows",
+                )
+
+                has_error = False
+                allow_retry = True
+
+                # communicate() reads stderr as the command runs and returns the
+                # moment the command completes.
+                process_task = asyncio.create_task(process.communicate())
+                monitor_tasks = []
+                if cls.monitor:
+                    monitor_tasks = [
+                        asyncio.create_task(cls._run_monitor(directory, handler))
+                        for handler in monitors
+                    ]
+
+                try:
+                    if monitor_tasks:
+                        await asyncio.wait(
+                            [process_task, *monitor_tasks],
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
+                    # A monitor task only ever completes if it found an error. If
+                    # several found one at the same time, the highest priority
+                    # monitor (the first in the list) is the one we act on.
+                    for handler, task in zip(monitors, monitor_tasks):
+                        if task.done() and not process_task.done():
+                            task.result()  # raises any error from the check itself
+                            has_error = True
+                            if not handler.has_custom_termination:
+                                allow_retry = cls._terminate_job(
+                                    directory=directory,
+                                    process=process,
+                                    command=command,
+                                )
+                            else:
+                                allow_retry = handler.terminate_job(
+                                    directory=directory,
+                                    process=process,
+                                    command=command,
+                                )
+                            break
+                finally:
+                    for task in monitor_tasks:
+                        task.cancel()
+
+                output, errors = await process_task
+
+                cls._check_return_code(process.returncode, errors, command, has_error)
+                has_error = cls._apply_correction(directory, corrections) or has_error
+                cls._write_corrections(directory, corrections)
+
+                if not has_error or not allow_retry:
+                    break
+        finally:
+            # see run_config for why scanners are removed
+            FileScanner.forget(directory)
+
+        if len(corrections) >= cls.max_corrections:
+            raise MaxCorrectionsError(
+                "The number of maximum corrections has been exceeded. Note the final "
+                "error and its fix are still listed in the corrections file, but it "
+                "was never used."
+            )
+        return corrections
+
+    @classmethod
+    async def _run_monitor(cls, directory: Path, error_handler: ErrorHandler):
+        """
+        Runs the check of a single monitor on its own schedule until it finds
+        an error. This is used by `execute_async` and is cancelled once the
+        command completes.
+        """
+        interval = error_handler.monitor_interval or (
+            cls.polling_timestep * cls.monitor_freq
+        )
+        while True:
+            await asyncio.sleep(interval)
+            # checks involve reading files, so we don't want to block the loop
+            if await asyncio.to_thread(error_handler.check, directory):
+                return
+
+    @staticmethod
+    def _load_corrections(directory: Path) -> list[tuple[str]]:
+        """
+        Loads the corrections that were applied in a previous run from the
+        "simmate_corrections.csv" file (if it exists).
+        """
+        corrections_filename = directory / "simmate_corrections.csv"
+        if corrections_filename.exists():
+            data = pandas.read_csv(corrections_filename)
+            corrections = data.values.tolist()
+        # Otherwise we start with zero corrections that we slowly add to. This
+        # can be thought of as a table with headers of...
+        #   ("applied_errorhandler", "correction_applied")
+        else:
+            corrections = []
+        return corrections
+
+    @staticmethod
+    def _check_return_code(
+        returncode: int,
+        errors: bytes,
+        command: str,
+        has_error: bool,
+    ):
+        """
+        Raises an error if the command failed with a non-zero exit code.
+        """
+        # The 'not has_error' is because terminate() will give a nonzero
+        # when a monitor is triggered. We don't want to raise that
+        # exception here but instead let the monitor handle that
+        # error in the code below.
+        if returncode != 0 and not has_error:
+            # convert the error from bytes to a string
+            errors = errors.decode("utf-8")
+            # and report the error to the user. Mac/Linux label this as exit
+            # code 127, whereas windows doesn't so the message needs to be
+            # read.
+            if returncode == 127 or (
+                platform.system() == "Windows"
+                and "is not recognized as an internal or external command"
+            ):
+                raise CommandNotFoundError(
+                    f"The command ({command}) failed becauase it could not be found. "
+                    "This typically means that either (a) you have not installed "
+                    "the program required for this command or (b) you forgot to "
+                    "call 'module load ...' before trying to start the program. "
+                    f"The full error output was:\n\n {errors}"
+                )
+            else:
+                raise NonZeroExitError(
+                    f"The command ({command}) failed. The error output was...\n {errors}"
+                )
+
+    @classmethod
+    def _apply_correction(cls, directory: Path, corrections: list) -> bool:
+        """
+        Checks the directory with all error handlers and applies the highest
+        priority fix. The correction is added to the `corrections` list and
+        we return whether an error was found.
+        """
+        has_error = False
+        # Check for errors again, because a non-monitor may be higher
+        # priority than the monitor triggered above (if there was one).
+        # Since the error_handlers are in order of priority, only the first
+        # will actually be applied and then we can retry the calc.
+        for error_handler in cls.error_handlers:
+            # check if there's an error with this error_handler and grab the
+            # error if there is one
+            error = error_handler.check(directory)
+            if error:
+                # record the error in case it wasn't done so above
+                has_error = True
+                # make a copy of the directory contents and
+                # store as an archive within the same directory
+                make_error_archive(directory)
+                # And apply the proper correction if there is one.
+                # Some error_handlers will even raise an error here signaling
+                # that the stagedtask is unrecoverable and a lost cause.
+                correction = error_handler.correct(directory)
+                # record what's been changed
+                corrections.append((error_handler.name, correction))
+                logging.info(
+                    f"Found error '{error_handler.name}'. Fixed with '{correction}'"
+                )
+                # break from the error_handler for-loop as we only apply the
+                # highest priority fix and nothing else.
+                break
+        return has_error
+
+    @staticmethod
+    def _write_corrections(directory: Path, corrections: list):
+        # write the log of corrections to file if there are any. This is written
+        # as a CSV file format and done every while-loop cycle because it
+        # lets the user monitor the calculation and error handlers applied
+        # as it goes. If no corrections were applied, we skip writing the file.
+        if corrections:
+            corrections_filename = directory / "simmate_corrections.csv"
+            # compile the corrections metadata into a dataframe
+            data = pandas.DataFrame(
+                corrections,
+                columns=["error_handler", "correction_applied"],
+            )
+            # write the dataframe to a csv file
+            data.to_csv(corrections_filename, index=False)
+
     @staticmethod
     def _terminate_job(
         directory: Path,
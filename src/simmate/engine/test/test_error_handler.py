@@ -4,7 +4,7 @@ from pathlib import Path
 
 import pytest
 
-from simmate.engine.error_handler import ErrorHandler
+from simmate.engine.error_handler import ErrorHandler, FileScanner
 
 
 class CheckREADME(ErrorHandler):
@@ -44,3 +44,38 @@ def test_error_handler():
 
     # This line tests nothing, but simply covers the abstract method's pass statement
     ErrorHandler.correct(None, None)
+
+
+def test_file_scanner(tmp_path):
+    filename = tmp_path / "output.txt"
+    scanner = FileScanner.get_scanner(filename)
+    assert FileScanner.get_scanner(filename) is scanner
+    scanner.add_messages(["ERROR A", "ERROR B"])
+
+    # missing files have no errors
+    assert scanner.scan() == set()
+
+    # only new content is read, including messages split between reads
+    filename.write_text("some output\nERR")
+    assert scanner.scan() == set()
+    with filename.open("a") as file:
+        file.write("OR A\nmore output\n")
+    assert scanner.scan() == {"ERROR A"}
+    assert scanner.offset == filename.stat().st_size
+
+    # newly added messages are searched for in the full file
+    scanner.add_messages(["some output"])
+    assert scanner.scan() == {"ERROR A", "some output"}
+
+    # rewritten files are scanned from the start again
+    filename.write_text("new output with ERROR B and nothing else")
+    assert scanner.scan() == {"ERROR B"}
+
+    # large files are read with mmap
+    scanner.mmap_min_size = 10
+    with filename.open("a") as file:
+        file.write("x" * 100 + "ERROR A")
+    assert scanner.scan() == {"ERROR A", "ERROR B"}
+
+    FileScanner.forget(tmp_path)
+    assert FileScanner.get_scanner(filename) is not scanner
@@ -17,11 +17,14 @@
 # catch error with a non-monitor
 # test max_errors limit
 
+import asyncio
 import shutil
+import time
 
 import pytest
 
 from simmate.engine import ErrorHandler, S3Workflow
+from simmate.engine.error_handler import FileScanner
 from simmate.engine.s3_workflow import (
     CommandNotFoundError,
     MaxCorrectionsError,
@@ -245,6 +248,107 @@ def test_s3workflow_8(tmp_path):
     )
 
 
+def test_s3workflow_async(tmp_path):
+    # the same checks as above, but supervised with asyncio
+
+    class Customized__Testing__DummyWorkflow(S3Workflow):
+        use_database = False
+        use_async = True
+        command = "echo dummy"
+        polling_timestep = 10  # unused when the command completes right away
+        error_handlers = [AlwaysPassesHandler(), AlwaysPassesMonitor()]
+
+    time_start = time.time()
+    output = Customized__Testing__DummyWorkflow.run_config(directory=tmp_path)
+    assert output == {"corrections": []}
+    assert time.time() - time_start < 5
+
+    # monitors can terminate a long-running command
+    class Customized__Testing__DummyWorkflow(S3Workflow):
+        use_database = False
+        use_async = True
+        command = "sleep 10"
+        polling_timestep = 0.01
+        monitor_freq = 1
+        max_corrections = 2
+        error_handlers = [AlwaysFailsMonitor()]
+
+    time_start = time.time()
+    pytest.raises(
+        MaxCorrectionsError,
+        Customized__Testing__DummyWorkflow.run_config,
+        directory=tmp_path,
+    )
+    assert time.time() - time_start < 5
+
+    class Customized__Testing__DummyWorkflow(S3Workflow):
+        use_database = False
+        use_async = True
+        command = "NonexistantCommand 404"
+        error_handlers = [AlwaysPassesHandler()]
+
+    pytest.raises(
+        CommandNotFoundError,
+        Customized__Testing__DummyWorkflow.run_config,
+        directory=tmp_path,
+    )
+
+    # many commands can share one event loop
+    class Customized__Testing__DummyWorkflow(S3Workflow):
+        use_database = False
+        command = "sleep 1"
+        error_handlers = [AlwaysPassesMonitor()]
+
+    directories = [tmp_path / f"run_{n}" for n in range(5)]
+    for directory in directories:
+        directory.mkdir()
+
+    async def run_all():
+        return await asyncio.gather(
+            *[
+                Customized__Testing__DummyWorkflow.execute_async(
+                    directory=directory,
+                    command=Customized__Testing__DummyWorkflow.command,
+                )
+                for directory in directories
+            ]
+        )
+
+    time_start = time.time()
+    assert asyncio.run(run_all()) == [[]] * 5
+    assert time.time() - time_start < 4
+
+
+def test_s3workflow_file_scanners(tmp_path):
+    # scanners of a directory's files are removed once its run finishes
+
+    class OutputHandler(ErrorHandler):
+        is_monitor = True
+        filename_to_check = "output.txt"
+        possible_error_messages = ["this error never happens"]
+
+        def correct(self, directory):
+            raise Exception
+
+    class Customized__Testing__DummyWorkflow(S3Workflow):
+        use_database = False
+        command = "echo dummy > output.txt && sleep 0.2"
+        polling_timestep = 0.01
+        monitor_freq = 1
+        error_handlers = [OutputHandler()]
+
+    for use_async in [False, True]:
+        Customized__Testing__DummyWorkflow.use_async = use_async
+        directory = tmp_path / f"use_async_{use_async}"
+        Customized__Testing__DummyWorkflow.run_config(directory=directory)
+        assert (directory / "output.txt").exists()
+        assert not [
+            filename
+            for filename in FileScanner._scanners
+            if directory.absolute() in filename.parents
+        ]
+
+
 # !!! Unitests to use with Prefect Executor
 # Test as a subflow
 # from prefect import flow
@@ -289,6 +289,61 @@ class Workflow:
 
         return state
 
+    @classmethod
+    def run_cloud_many(
+        cls,
+        parameters_list: list[dict],
+        tags: list[str] = None,
+        chunksize: int = 500,
+    ) -> list:
+        """
+        Submits many runs of this workflow to the cloud database at once, where
+        each entry of `parameters_list` gives the kwargs for a single run.
+
+        This is the same as calling `run_cloud` in a for-loop, but all of the
+        runs are added to the queue using bulk inserts (see
+        `SimmateExecutor.submit_many`). States are returned in the same order
+        as `parameters_list`.
+
+        #### Parameters
+
+        - `parameters_list`:
+            A list of dictionaries, where each gives the kwargs for one run.
+
+        - `tags`:
+            A list of flags/labels/tags that the workflow runs should be scheduled
+            with. Defaults to the `tags` property of the workflow.
+
+        - `chunksize`:
+            The maximum number of runs to add to the queue with a single query.
+        """
+
+        logging.info(
+            f"Submitting {len(parameters_list)} new runs of `{cls.name_full}` to cloud"
+        )
+
+        # same as run_cloud, except we collect all of the parameters before
+        # submitting them together
+        kwargs_list = []
+        for kwargs in parameters_list:
+            kwargs_cleaned = cls._load_input_and_register(
+                setup_directory=False,
+                write_metadata=False,
+                **kwargs,
+            )
+            kwargs_list.append(cls._serialize_parameters(**kwargs_cleaned))
+
+        states = SimmateExecutor.submit_many(
+            cls._run_full,
+            kwargs_list=kwargs_list,
+            tags=tags or cls.tags,
+            chunksize=chunksize,
+        )
+
+        logging.info(f"Successfully submitted {len(states)} workitems")
+
+        return states
+
     @classmethod
     def run_config(cls, **kwargs) -> any:
         """
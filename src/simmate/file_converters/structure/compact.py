@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module provides conversion between Simmate toolkit structures and the
+compact string format that is stored in the `structure` column of database
+tables (see `simmate.database.base_data_types.Structure`).
+
+This format is built-in to the base toolkit/database classes, so you typically
+never need to load this module directly:
+
+``` python
+from simmate.toolkit import Structure
+
+structure = Structure.from_file("example.cif")
+
+# convert to a compact string and back
+structure_string = structure.to_database_string()
+structure_new = Structure.from_database_string(structure_string)
+```
+
+The format is plain text (so it can be read in any database) with a
+versioned header and four or five more lines:
+
+```
+@simmate-structure v1
+5.6 0.0 0.0 0.0 5.6 0.0 0.0 0.0 5.6
+Na Cl
+0 0 0 0 1 1 1 1
+0.0 0.0 0.0 0.0 0.5 0.5 ...
+```
+
+1. the lattice matrix (9 values, row by row)
+2. a table of the unique species on sites. Disordered sites are written with
+   their occupancies (e.g. `Fe2+:0.5,Mn2+:0.5`)
+3. the index of each site's species within the table
+4. the fractional coordinates of every site (3 values per site)
+5. (only if the structure has any) the site properties, such as
+   `selective_dynamics`, `velocities` or `magmom`, written as JSON
+
+Numbers are written with python's shortest round-trip representation, so
+structures are stored without any loss of precision. Compared to POSCAR (for
+ordered structures) and CIF (for disordered structures), which were used
+before, this format has no extra headers and never repeats species names.
+Because each of these lines is just a list of numbers, they are read directly
+into numpy arrays.
+"""
+
+import json
+
+import numpy
+from monty.json import MontyDecoder, MontyEncoder
+from pymatgen.core import Composition, Lattice
+
+from simmate.toolkit import Structure as ToolkitStructure
+
+
+class CompactStringAdapter:
+    """
+    Adaptor for conversion between the Simmate ToolkitStructure object and
+    compact structure strings.
+    """
+
+    header: str = "@simmate-structure v1"
+    """
+    The first line of every compact string. The version number is increased
+    whenever the format changes.
+    """
+
+    @classmethod
+    def is_compact_string(cls, structure_string: str) -> bool:
+        """
+        Whether the string uses this format (of any version)
+        """
+        return structure_string.startswith("@simmate-structure")
+
+    @classmethod
+    def get_string(cls, structure: ToolkitStructure) -> str:
+        """
+        Converts a toolkit structure into a compact string
+        """
+        # Each unique species (or mix of species for disordered sites) is
+        # given an index. Compositions are hashable, so a dictionary lets us
+        # do this in a single pass.
+        species_indices = {}
+        site_indices = [
+            species_indices.setdefault(species, len(species_indices))
+            for species in structure.species_and_occu
+        ]
+        species_table = []
+        for species in species_indices.keys():
+            if len(species) == 1 and list(species.values())[0] == 1:
+                species_table.append(str(list(species.keys())[0]))
+            else:
+                species_table.append(
+                    ",".join(
+                        f"{element}:{amount!r}" for element, amount in species.items()
+                    )
+                )
+
+        lines = [
+            cls.header,
+            " ".join(map(repr, structure.lattice.matrix.ravel().tolist())),
+            " ".join(species_table),
+            " ".join(map(str, site_indices)),
+            " ".join(map(repr, structure.frac_coords.ravel().tolist())),
+        ]
+
+        # Site properties (e.g. selective dynamics for relaxations) are rare,
+        # so they get an optional line. We use the same JSON encoder as
+        # pymatgen's as_dict, which keeps numpy arrays as arrays.
+        if structure.site_properties:
+            lines.append(json.dumps(structure.site_properties, cls=MontyEncoder))
+
+        return "\n".join(lines)
+
+    @classmethod
+    def get_structure(cls, structure_string: str) -> ToolkitStructure:
+        """
+        Converts a compact string into a toolkit structure
+        """
+        (
+            header,
+            lattice,
+            species_table,
+            site_indices,
+            frac_coords,
+            *site_properties,
+        ) = structure_string.split("\n")
+        if header != cls.header:
+            raise Exception(
+                f"Unknown structure string format: '{header}'. This string may "
+                "have been made by a newer version of Simmate."
+            )
+
+        # Species are only parsed once for each entry in the table. Sites then
+        # share these compositions.
+        species_table = [
+            Composition(
+                {
+                    element: float(amount)
+                    for element, amount in (
+                        entry.split(":") for entry in species.split(",")
+                    )
+                }
+                if ":" in species
+                else {species: 1}
+            )
+            for species in species_table.split()
+        ]
+        site_indices = numpy.array(site_indices.split(), dtype=int)
+        frac_coords = numpy.array(frac_coords.split(), dtype=float).reshape(-1, 3)
+
+        return ToolkitStructure(
+            lattice=Lattice(numpy.array(lattice.split(), dtype=float).reshape(3, 3)),
+            species=[species_table[i] for i in site_indices],
+            coords=frac_coords,
+            site_properties=(
+                json.loads(site_properties[0], cls=MontyDecoder)
+                if site_properties
+                else None
+            ),
+        )
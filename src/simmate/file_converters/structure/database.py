@@ -55,6 +55,7 @@ database_structure = toolkit_structure.database_object
 
 from simmate.database import connect
 from simmate.database.base_data_types import Structure as DatabaseStructure
+from simmate.file_converters.structure.compact import CompactStringAdapter
 from simmate.toolkit import Structure as ToolkitStructure
 
 
@@ -128,6 +129,14 @@ class DatabaseAdapter:
 
         return structure_toolkit
 
+    @staticmethod
+    def get_database_string(structure: ToolkitStructure) -> str:
+        """
+        Converts a toolkit structure into the string that is stored in the
+        'structure' column for simmate.database.base_data_types.Structure.
+        """
+        return CompactStringAdapter.get_string(structure)
+
     @staticmethod
     def get_toolkit_from_database_string(structure_string: str) -> ToolkitStructure:
         """
@@ -139,12 +148,15 @@ class DatabaseAdapter:
         # I only have this separate for now because pymatgen's from_str doesn't
         # dynamically determine format from the string alone.
 
-        # convert the stored string to python dictionary.
+        # All new rows are stored with the compact format, but older databases
+        # (and archives) can still have rows that were written as "POSCAR" (for
+        # ordered structures) or "CIF" (for disordered structures). These can
+        # be rewritten with the `simmate database update-structure-strings`
+        # command. If the string starts with "#", then I know that I stored
+        # it as a "CIF".
+        if CompactStringAdapter.is_compact_string(structure_string):
+            return CompactStringAdapter.get_structure(structure_string)
         storage_format = "CIF" if (structure_string[0] == "#") else "POSCAR"
-        # OPTIMIZE: see my comment on storing strings in the from_toolkit method above.
-        # For now, I need to figure out if I used "CIF" or "POSCAR" and read the structure
-        # accordingly. In the future, I can just assume my new format.
-        # If the string starts with "#", then I know that I stored it as a "CIF".
 
         # convert the string to pymatgen Structure object
         if storage_format == "POSCAR":
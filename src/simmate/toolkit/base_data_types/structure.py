@@ -166,5 +166,10 @@ class Structure(PymatgenStructure):
 
         return DatabaseAdapter.get_toolkit_from_database_string(structure_string)
 
+    def to_database_string(self) -> str:
+        from simmate.file_converters.structure.database import DatabaseAdapter
+
+        return DatabaseAdapter.get_database_string(self)
+
     # TODO: from_cif, from_poscar, from_ase, from_jarvis, etc.
     # TODO: to_cif, to_poscar, to_ase, to_jarvis, etc.
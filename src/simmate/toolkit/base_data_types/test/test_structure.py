@@ -1,5 +1,51 @@
 # -*- coding: utf-8 -*-
 
+from pymatgen.core import Lattice
+
+from simmate.toolkit import Structure
+
 
 def test_sanitze(structure):
     structure.get_sanitized_structure()
+
+
+def test_database_string(structure):
+    structure_string = structure.to_database_string()
+    structure_new = Structure.from_database_string(structure_string)
+    # the format should be lossless
+    assert (structure_new.lattice.matrix == structure.lattice.matrix).all()
+    assert (structure_new.frac_coords == structure.frac_coords).all()
+    assert structure_new == structure
+
+    # older rows were stored as POSCAR or CIF strings and must still be read
+    structure_new = Structure.from_database_string(structure.to(fmt="POSCAR"))
+    assert structure_new.matches(structure)
+
+
+def test_database_string_disordered():
+    structure = Structure.from_spacegroup(
+        "Fm-3m",
+        Lattice.cubic(4.2),
+        [{"Fe2+": 0.5, "Mn3+": 0.25}, "O2-"],
+        [[0, 0, 0], [0.5, 0.5, 0.5]],
+    )
+    structure_new = Structure.from_database_string(structure.to_database_string())
+    assert structure_new.species_and_occu == structure.species_and_occu
+    assert structure_new == structure
+
+
+def test_database_string_site_properties():
+    # a partially occupied site along with site properties that relaxations use
+    structure = Structure(
+        Lattice.cubic(4.2),
+        [{"Fe2+": 0.5, "Mn3+": 0.25}, "O2-"],
+        [[0, 0, 0], [0.5, 0.5, 0.5]],
+        site_properties={
+            "selective_dynamics": [[True, True, False], [False, False, False]],
+            "velocities": [[0.1, 0.2, 0.3], [0.0, 0.0, 0.0]],
+        },
+    )
+    structure_new = Structure.from_database_string(structure.to_database_string())
+    assert structure_new == structure
+    assert structure_new.species_and_occu == structure.species_and_occu
+    assert structure_new.site_properties == structure.site_properties
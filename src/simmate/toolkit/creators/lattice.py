@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import numpy
 from numpy.random import choice
 from pymatgen.core.lattice import Lattice
 
@@ -320,3 +321,84 @@ class RSLSmartVolume:
         # maybe I can add an option to 'as_dict=False' if I don't
         # want this as a dict
         return lattice
+
+    def new_lattices(self, nlattices: int, spacegroup: int) -> numpy.ndarray:
+        """
+        Creates many lattices at once and returns their matrices as a 3D array
+        of shape (N, 3, 3). This gives the same distribution as calling
+        `new_lattice` repeatedly, but all lattices are made with numpy.
+        """
+        volume = self.volumes[spacegroup]
+        vector_generator = self.vector_generators[spacegroup]
+
+        matrices = []
+        nvalid = 0
+        while nvalid < nlattices:
+            # generate (a,b,c) and (alpha,beta,gamma) vectors for every lattice
+            nremaining = nlattices - nvalid
+            lengths = vector_generator.new_vectors(nremaining)
+            angles = self.angle_generator.new_vectors(nremaining)
+            new_matrices = get_lattice_matrices(spacegroup, lengths, angles)
+
+            # scale every lattice to the specified volume
+            volumes = numpy.abs(numpy.linalg.det(new_matrices))
+            new_matrices *= ((volume / volumes) ** (1 / 3))[:, None, None]
+
+            # in scaling, we might have broken the conditions of min/max_vectors
+            # so we throw these lattices out and make new ones
+            new_lengths = numpy.linalg.norm(new_matrices, axis=2)
+            is_valid = (new_lengths.min(axis=1) >= vector_generator.min_value) & (
+                new_lengths.max(axis=1) <= vector_generator.max_value
+            )
+            matrices.append(new_matrices[is_valid])
+            nvalid += is_valid.sum()
+
+        return numpy.concatenate(matrices)[:nlattices]
+
+
+def get_lattice_matrices(
+    spacegroup: int,
+    lengths: numpy.ndarray,
+    angles: numpy.ndarray,
+) -> numpy.ndarray:
+    """
+    Converts many (a,b,c) and (alpha,beta,gamma) vectors into lattice matrices,
+    where the lattice system of the spacegroup sets which of these values are
+    used. This gives the same matrices as the pymatgen Lattice methods used in
+    `RandomSymLattice.new_lattice`, but for many lattices at once.
+    """
+    a, b, c = numpy.array(lengths, dtype=float).T
+    alpha, beta, gamma = numpy.array(angles, dtype=float).T
+
+    if spacegroup <= 2:  # triclinic
+        pass
+    elif spacegroup <= 15:  # monoclinic
+        alpha = gamma = numpy.full_like(a, 90)
+    elif spacegroup <= 74:  # orthorhombic
+        alpha = beta = gamma = numpy.full_like(a, 90)
+    elif spacegroup <= 142:  # tetragonal
+        b = a
+        alpha = beta = gamma = numpy.full_like(a, 90)
+    elif spacegroup <= 194:  # trigonal and hexagonal (see new_lattice)
+        b = a
+        alpha = beta = numpy.full_like(a, 90)
+        gamma = numpy.full_like(a, 120)
+    elif spacegroup <= 230:  # cubic
+        b = c = a
+        alpha = beta = gamma = numpy.full_like(a, 90)
+
+    # this follows pymatgen's Lattice.from_parameters
+    alpha, beta, gamma = numpy.radians([alpha, beta, gamma])
+    cos_gamma_star = (numpy.cos(alpha) * numpy.cos(beta) - numpy.cos(gamma)) / (
+        numpy.sin(alpha) * numpy.sin(beta)
+    )
+    gamma_star = numpy.arccos(numpy.clip(cos_gamma_star, -1, 1))
+
+    matrices = numpy.zeros((len(a), 3, 3))
+    matrices[:, 0, 0] = a * numpy.sin(beta)
+    matrices[:, 0, 2] = a * numpy.cos(beta)
+    matrices[:, 1, 0] = -b * numpy.sin(alpha) * numpy.cos(gamma_star)
+    matrices[:, 1, 1] = b * numpy.sin(alpha) * numpy.sin(gamma_star)
+    matrices[:, 1, 2] = b * numpy.cos(alpha)
+    matrices[:, 2, 2] = c
+    return matrices
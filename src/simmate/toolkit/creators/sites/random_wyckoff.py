@@ -2,7 +2,9 @@
 
 import logging
 
+import numpy
 from numpy.random import choice, randint
+from numpy.random import random as numpy_random
 from rich.progress import track
 
 from simmate.toolkit import Composition
@@ -83,6 +85,12 @@ class RandomWySites:
         # only data for spacegroup_options?
         self.wy_data = loadWyckoffData().values
 
+        # For new_sites_many, the coordinate templates of wy_sites (e.g. "x,-x,z")
+        # are converted to affine transformations and the wyckoff combinations
+        # of each spacegroup are converted to arrays. These are made lazily.
+        self.wy_transforms = None
+        self.wy_arrays = {}
+
     def new_sites(self, spacegroup=None):
         # parse spacegroup or grab a random one (with necessary lazy-setup)
         spacegroup = self._init_spacegroup(spacegroup)
@@ -162,6 +170,139 @@ class RandomWySites:
         # objects and there's no direct conversion method
         return species_list, coords_list
 
+    def new_sites_many(self, nsets: int, spacegroup: int = None):
+        """
+        Creates many sets of sites for a single spacegroup at once, where all
+        random choices and coordinates are made together with numpy. This is
+        much faster than calling `new_sites` repeatedly.
+
+        Sets can have different numbers of sites, so the output is padded.
+        Returns (elements, coords), where `elements` is a 2D array of shape
+        (nsets, nsites_max) that gives the index of each site's element in
+        `composition.elements` (or -1 for padding) and `coords` is a 3D array
+        of shape (nsets, nsites_max, 3). Sites are always ordered by element.
+        If the spacegroup is incompatible with the composition, False is
+        returned.
+        """
+        # parse spacegroup or grab a random one (with necessary lazy-setup)
+        spacegroup = self._init_spacegroup(spacegroup)
+        if not spacegroup:
+            return False
+
+        coords_generator = self.coords_generators[spacegroup]
+        combo_groups, combo_elements, group_sites, group_nsites = self._get_wy_arrays(
+            spacegroup
+        )
+        wy_matrices, wy_shifts = self._get_wy_transforms()
+
+        # Randomly pick a wy_group combination for each set and then a wy_site
+        # for each of its wy_groups (see new_sites for details on these steps).
+        # Padding has a wy_group of -1, which picks a meaningless wy_site
+        # that is ignored below.
+        combo_indices = randint(0, len(combo_groups), size=nsets)
+        wy_groups = combo_groups[combo_indices]
+        elements = combo_elements[combo_indices]
+        is_site = wy_groups >= 0
+        site_choices = (numpy_random(wy_groups.shape) * group_nsites[wy_groups]).astype(
+            int
+        )
+        wy_site_indices = group_sites[wy_groups, site_choices]
+
+        # Each coordinate template is an affine transformation of a random
+        # (x,y,z) vector inside the asymmetric unit. For example, "x,-x,1/2"
+        # is the matrix [[1,0,0],[-1,0,0],[0,0,0]] with a shift of [0,0,1/2].
+        vectors = numpy.zeros(wy_groups.shape + (3,))
+        nvectors = is_site.sum()
+        if hasattr(coords_generator, "new_vectors"):
+            vectors[is_site] = coords_generator.new_vectors(nvectors)
+        else:
+            vectors[is_site] = [coords_generator.new_vector() for _ in range(nvectors)]
+        matrices = wy_matrices[wy_site_indices]
+        coords = numpy.einsum("csij,csj->csi", matrices, vectors)
+        coords += wy_shifts[wy_site_indices]
+        coords[~is_site] = numpy.nan
+
+        # new_sites never gives the same coordinates twice in a set, which
+        # can only happen when a special wy_site (e.g. 0,0,0) is picked
+        # twice. We throw out these sets and make new ones to replace them.
+        is_fixed = (matrices == 0).all(axis=(2, 3)) & is_site
+        keys = numpy.where(
+            is_fixed,
+            wy_site_indices,
+            -1 - numpy.arange(wy_groups.shape[1]),
+        )
+        keys.sort(axis=1)
+        is_repeated = (keys[:, 1:] == keys[:, :-1]).any(axis=1)
+        if is_repeated.any():
+            new_elements, new_coords = self.new_sites_many(
+                is_repeated.sum(), spacegroup
+            )
+            elements[is_repeated] = new_elements
+            coords[is_repeated] = new_coords
+
+        return elements, coords
+
+    def _get_wy_arrays(self, spacegroup: int):
+        # This stores the wyckoff combinations of a spacegroup as padded
+        # arrays, so that new_sites_many can make all of its random choices
+        # at once. wy_groups are given an integer id (their index in
+        # wy_groupinfo), and -1 is used for padding.
+        if spacegroup not in self.wy_arrays:
+            wy_groupinfo = self.wy_groupinfo[spacegroup]
+            wy_groupcombos = self.wy_groupcombos[spacegroup]
+            group_ids = {wy_group: i for i, wy_group in enumerate(wy_groupinfo)}
+
+            # the wy_site indexes of each wy_group (padded by repeating them)
+            group_nsites = numpy.array([len(sites) for sites in wy_groupinfo.values()])
+            group_sites = numpy.array(
+                [
+                    numpy.resize(sites, group_nsites.max())
+                    for sites in wy_groupinfo.values()
+                ]
+            )
+
+            # the wy_group and element index for each site of each combination
+            nslots = max(
+                sum(len(wy_groups) for wy_groups in combo) for combo in wy_groupcombos
+            )
+            combo_groups = numpy.full((len(wy_groupcombos), nslots), -1)
+            combo_elements = numpy.full((len(wy_groupcombos), nslots), -1)
+            for combo_index, combo in enumerate(wy_groupcombos):
+                slot = 0
+                for i, wy_groups in enumerate(combo):
+                    for wy_group in wy_groups:
+                        combo_groups[combo_index, slot] = group_ids[wy_group]
+                        combo_elements[combo_index, slot] = i
+                        slot += 1
+
+            self.wy_arrays[spacegroup] = (
+                combo_groups,
+                combo_elements,
+                group_sites,
+                group_nsites,
+            )
+        return self.wy_arrays[spacegroup]
+
+    def _get_wy_transforms(self):
+        # This converts the coordinate template of every wy_site into an
+        # affine transformation by evaluating it at the origin (for the shift)
+        # and unit vectors (for the matrix columns). All templates are linear
+        # in x,y,z. Results are indexed the same as wy_data.
+        if self.wy_transforms is None:
+            shifts = []
+            matrices = []
+            for wy_site in self.wy_data:
+                wy_coords = wy_site[5]  # index 5 is 'Coordinates'
+                shift = numpy.array(eval(wy_coords, None, dict(x=0, y=0, z=0)))
+                columns = [
+                    numpy.array(eval(wy_coords, None, dict(x=x, y=y, z=z))) - shift
+                    for x, y, z in numpy.eye(3)
+                ]
+                shifts.append(shift)
+                matrices.append(numpy.array(columns).T)
+            self.wy_transforms = (numpy.array(matrices), numpy.array(shifts))
+        return self.wy_transforms
+
     def _init_spacegroup(self, spacegroup):
         # This checks the spacegroup input from a user or grabs a random one.
         # We isolate this into a separate class because of the complex logic
@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import functools
+import itertools
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy
 from numpy.random import choice
+from pymatgen.symmetry.groups import SpaceGroup
 
 from simmate.toolkit import Composition, Structure
 from simmate.toolkit.creators.lattice import RSLSmartVolume
 from simmate.toolkit.creators.sites.random_wyckoff import RandomWySites
 from simmate.toolkit.creators.structure.base import StructureCreator
 from simmate.toolkit.creators.utils import NestedFixes
-from simmate.toolkit.validators.structure import SiteDistanceMatrix
+from simmate.toolkit.validators.structure import FastSiteDistanceMatrix
 
 
 class RandomSymStructure(StructureCreator):
@@ -32,7 +38,7 @@ class RandomSymStructure(StructureCreator):
         lattice_gen_options: dict = {},
         site_generation_method=RandomWySites,
         site_gen_options: dict = {},
-        validator_method=SiteDistanceMatrix,
+        validator_method=FastSiteDistanceMatrix,
         validator_options: dict = {},
         fixindicator_method=NestedFixes,
         fixindicator_options: dict = {
@@ -302,3 +308,356 @@ class RandomSymStructure(StructureCreator):
         #     # BUG: might hit a recursion depth error
 
         return structure
+
+    # -------------------------------------------------------------------------
+    # Batch creation
+    # -------------------------------------------------------------------------
+
+    max_attempts: int = 1500
+    """
+    When creating structures in batches, the maximum number of candidates to
+    try per structure requested. The default matches the default fixindicator
+    (15 lattices for each of 100 site sets).
+    """
+
+    batch_size: int = 2000
+    """
+    When creating structures in batches, the maximum number of candidates that
+    are generated and screened at once
+    """
+
+    def create_structures(
+        self,
+        n: int,
+        spacegroup: int = None,
+        nprocesses: int = 1,
+    ) -> list[Structure]:
+        """
+        Creates many structures at once. This is much faster than calling
+        `create_structure` repeatedly, which builds a pymatgen Structure for
+        every candidate and retries one candidate at a time.
+
+        Instead, candidates for a spacegroup are made in large batches, where
+        symmetry operations are applied to all sites at once and site distances
+        are screened with numpy. Structure objects are only built for the
+        candidates that pass this screening, and these are then checked with
+        the validator as usual.
+
+        Spacegroups are chosen randomly (same as `create_structure`), so the
+        returned structures are a mix of all spacegroup options. If a
+        spacegroup fails to give structures, replacements are made using other
+        spacegroups.
+
+        #### Parameters
+
+        - `n`:
+            the number of structures to create
+
+        - `spacegroup`:
+            the spacegroup to use for all structures. If not given, a random
+            spacegroup is chosen for each structure.
+
+        - `nprocesses`:
+            the number of processes to create structures with, where each
+            spacegroup is handled by a single process. If set to None or 0,
+            all available cores are used.
+        """
+        nprocesses = nprocesses or os.cpu_count()
+
+        structures = []
+        failed_spacegroups = []
+        while len(structures) < n:
+            # pick a spacegroup for each of the remaining structures
+            if spacegroup:
+                spacegroup_options = [spacegroup]
+            else:
+                spacegroup_options = [
+                    sg for sg in self.spacegroup_options if sg not in failed_spacegroups
+                ]
+            if not spacegroup_options:
+                break
+            spacegroups, counts = numpy.unique(
+                choice(spacegroup_options, size=n - len(structures)),
+                return_counts=True,
+            )
+            logging.info(
+                f"Creating {n - len(structures)} structures across "
+                f"{len(spacegroups)} spacegroups"
+            )
+
+            if nprocesses == 1 or len(spacegroups) == 1:
+                results = list(
+                    map(self._create_structures_for_spacegroup, spacegroups, counts)
+                )
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=nprocesses,
+                    initializer=_init_creator_process,
+                ) as executor:
+                    results = list(
+                        executor.map(
+                            self._create_structures_for_spacegroup,
+                            spacegroups,
+                            counts,
+                        )
+                    )
+
+            for sg, count, new_structures in zip(spacegroups, counts, results):
+                # False indicates the spacegroup is incompatible with the
+                # composition
+                if new_structures is False:
+                    failed_spacegroups.append(sg)
+                    continue
+                structures += new_structures
+                if len(new_structures) < count:
+                    logging.warning(
+                        f"Failed to create structures using spacegroup {sg}."
+                    )
+                    failed_spacegroups.append(sg)
+                    if self.remove_failed_spacegroups:
+                        self.removed_spacegroups.append(sg)
+                        self.spacegroup_options.remove(sg)
+
+            # When a spacegroup is requested, there are no others to try.
+            # Otherwise, we keep going with the remaining spacegroups. This
+            # always ends because every spacegroup in a round either gives
+            # all of its structures or is added to failed_spacegroups.
+            if spacegroup:
+                break
+
+        if len(structures) < n:
+            logging.warning(f"Only created {len(structures)} of {n} structures.")
+
+        # structures are grouped by spacegroup, so we shuffle them in case
+        # only some of them are used
+        structures = [structures[i] for i in numpy.random.permutation(len(structures))]
+        return structures
+
+    def _create_structures_for_spacegroup(self, spacegroup: int, n: int):
+        """
+        Creates up to `n` structures of a single spacegroup. Returns False if
+        the spacegroup is incompatible with the composition.
+        """
+        spacegroup = int(spacegroup)
+
+        # batches require a site generator that gives many site sets as
+        # arrays (e.g. RandomWySites). Otherwise, we make one at a time.
+        if not hasattr(self.site_generator, "new_sites_many"):
+            structures = [self.create_structure(spacegroup) for _ in range(n)]
+            return [structure for structure in structures if structure]
+
+        rotations, translations = _get_symmetry_operations(spacegroup)
+
+        # limit the batch size so that the images of all sites in a batch
+        # (nsites * noperations) fit in memory
+        nsites = int(self.composition.num_atoms)
+        max_batch_size = max(
+            1, min(self.batch_size, 2_000_000 // (nsites * len(rotations)))
+        )
+
+        # screening is only possible when the validator gives cutoffs for
+        # every site pair (e.g. FastSiteDistanceMatrix)
+        can_screen = hasattr(self.validator, "get_site_cutoffs")
+
+        structures = []
+        nattempts = 0
+        while len(structures) < n and nattempts < n * self.max_attempts:
+            # The batch size is scaled using the fraction of candidates that
+            # were valid in earlier batches. Until we see a valid candidate,
+            # we keep increasing the batch size.
+            nremaining = n - len(structures)
+            if structures:
+                ncandidates = int(nremaining * nattempts / len(structures) * 1.2) + 1
+            else:
+                ncandidates = max(nremaining, nattempts)
+            ncandidates = min(
+                ncandidates, max_batch_size, n * self.max_attempts - nattempts
+            )
+            nattempts += ncandidates
+
+            site_sets = self.site_generator.new_sites_many(ncandidates, spacegroup)
+            if site_sets is False:
+                return False
+            elements, coords = site_sets
+
+            if hasattr(self.lattice_generator, "new_lattices"):
+                lattices = self.lattice_generator.new_lattices(ncandidates, spacegroup)
+            else:
+                lattices = numpy.array(
+                    [
+                        self.lattice_generator.new_lattice(spacegroup).matrix
+                        for _ in range(ncandidates)
+                    ]
+                )
+
+            element_indices, frac_coords, indices = _apply_symmetry_operations(
+                elements, coords, rotations, translations
+            )
+            species = [self.composition.elements[i] for i in element_indices]
+            lattices = lattices[indices]
+
+            if can_screen:
+                cutoffs = self.validator.get_site_cutoffs([e.Z for e in species])
+                is_valid = _screen_distances(lattices, frac_coords, cutoffs)
+            else:
+                is_valid = numpy.ones(len(indices), dtype=bool)
+
+            for index in numpy.nonzero(is_valid)[0]:
+                if len(structures) == n:
+                    break
+                structure = Structure(
+                    lattice=lattices[index],
+                    species=species,
+                    coords=frac_coords[index],
+                )
+                if self.validator.check_structure(structure):
+                    structures.append(structure)
+
+        # same cleanup as create_structure
+        if self.cleanup:
+            structures = [
+                structure.get_primitive_structure() for structure in structures
+            ]
+            for structure in structures:
+                structure.sort()
+
+        return structures
+
+
+def _init_creator_process():
+    """
+    Prepares a new process for creating structures. Forked processes start
+    with the same random state as the parent, so we reseed to make sure each
+    process gives different structures.
+    """
+    numpy.random.seed()
+
+
+@functools.cache
+def _get_symmetry_operations(spacegroup: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Gives the rotation matrices and translation vectors of all symmetry
+    operations in a spacegroup
+    """
+    operations = SpaceGroup.from_int_number(spacegroup).symmetry_ops
+    rotations = numpy.array([op.rotation_matrix for op in operations])
+    translations = numpy.array([op.translation_vector for op in operations])
+    return rotations, translations
+
+
+def _apply_symmetry_operations(
+    elements: numpy.ndarray,
+    coords: numpy.ndarray,
+    rotations: numpy.ndarray,
+    translations: numpy.ndarray,
+    tolerance: float = 1e-5,
+) -> tuple[list[int], numpy.ndarray, numpy.ndarray]:
+    """
+    Applies all symmetry operations to the sites of many candidates at once.
+    This gives the same sites as `Structure.from_spacegroup`, which finds
+    the orbit of each site one symmetry operation at a time.
+
+    The input is the padded output of `RandomWySites.new_sites_many`. Every
+    wyckoff combination of a spacegroup gives the same number of sites for
+    each element once expanded, so the output is no longer padded. Returns
+    (elements, frac_coords, indices), where `elements` is the element index
+    of each expanded site, `frac_coords` has a shape of
+    (ncandidates, nsites, 3), and `indices` gives the position of each
+    candidate in the input.
+    """
+    # images have a shape of (ncandidates, nsites_max, noperations, 3)
+    images = numpy.tensordot(coords, rotations, axes=([2], [2])) + translations
+    images = numpy.mod(numpy.round(images, decimals=10), 1)
+
+    # An image is a duplicate if an earlier image of the same site is within
+    # the tolerance (this matches `SpaceGroup.get_orbit`). Rather than
+    # comparing every pair of images, we round images to the tolerance and
+    # give each a single integer key. A stable sort keeps the first image
+    # of each key in front, so all others are duplicates. Padding gives NaN,
+    # which we mark as a duplicate too.
+    is_padding = elements < 0
+    images[is_padding] = 0
+    grid = numpy.round(images / tolerance).astype(numpy.int64)
+    size = int(round(1 / tolerance)) + 1
+    keys = (grid[..., 0] * size + grid[..., 1]) * size + grid[..., 2]
+    order = numpy.argsort(keys, axis=-1, kind="stable")
+    sorted_keys = numpy.take_along_axis(keys, order, axis=-1)
+    is_duplicate = numpy.zeros(keys.shape, dtype=bool)
+    numpy.put_along_axis(
+        is_duplicate,
+        order[..., 1:],
+        sorted_keys[..., 1:] == sorted_keys[..., :-1],
+        axis=-1,
+    )
+    is_duplicate[is_padding] = True
+
+    # A site with free coordinates can (very rarely) land on a special
+    # position and have fewer images. We throw out these candidates, which
+    # always have fewer sites than the others.
+    nimages = (~is_duplicate).sum(axis=-1)
+    nsites = nimages.sum(axis=-1)
+    indices = numpy.nonzero(nsites == nsites.max())[0]
+
+    # boolean indexing keeps the (candidate, site, operation) order, and
+    # sites are always ordered by element
+    frac_coords = images[indices][~is_duplicate[indices]].reshape(len(indices), -1, 3)
+    site_elements = numpy.repeat(elements[indices[0]], nimages[indices[0]])
+    return site_elements.tolist(), frac_coords, indices
+
+
+# all 27 combinations of -1, 0, and 1 for shifting a fractional coordinate
+_NEIGHBOR_SHIFTS = numpy.array(list(itertools.product([-1, 0, 1], repeat=3)))
+
+
+def _screen_distances(
+    lattices: numpy.ndarray,
+    frac_coords: numpy.ndarray,
+    cutoffs: numpy.ndarray,
+    max_size: int = 1_000_000,
+) -> numpy.ndarray:
+    """
+    Quickly throws out candidates with sites that are too close together. This
+    gives a boolean array of which candidates pass the screening.
+
+    Screening is done in two passes. The first only uses the nearest periodic
+    image (in fractional coordinates) of each site pair, which removes most
+    candidates. The second checks the 27 neighboring images of each site pair
+    for the remaining candidates, which catches close pairs across cell
+    boundaries (e.g. in hexagonal cells). Every distance used is a real
+    distance between sites, so a candidate that fails here would always fail
+    the validator. Candidates that pass must still be checked by the validator.
+
+    #### Parameters
+
+    - `lattices`:
+        the lattice matrices with a shape of (ncandidates, 3, 3)
+
+    - `frac_coords`:
+        the fractional coordinates with a shape of (ncandidates, nsites, 3)
+
+    - `cutoffs`:
+        the minimum allowed distance for each site pair with a shape of
+        (nsites, nsites)
+
+    - `max_size`:
+        the maximum number of distances to compute at once
+    """
+    ncandidates, nsites, _ = frac_coords.shape
+    sites1, sites2 = numpy.triu_indices(nsites, k=1)
+    cutoffs_squared = cutoffs[sites1, sites2] ** 2
+
+    is_valid = numpy.ones(ncandidates, dtype=bool)
+    for shifts in [numpy.zeros((1, 3)), _NEIGHBOR_SHIFTS]:
+        # only candidates that passed the previous pass are checked again
+        indices = numpy.nonzero(is_valid)[0]
+        chunk_size = max(1, max_size // max(len(sites1) * len(shifts), 1))
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start : start + chunk_size]
+            differences = frac_coords[chunk][:, sites2] - frac_coords[chunk][:, sites1]
+            differences -= numpy.round(differences)
+            # differences has a shape of (ncandidates, npairs, nshifts, 3)
+            differences = differences[:, :, None, :] + shifts
+            vectors = numpy.matmul(differences, lattices[chunk][:, None])
+            distances_squared = (vectors**2).sum(axis=-1).min(axis=-1)
+            is_valid[chunk] = ~(distances_squared < cutoffs_squared).any(axis=-1)
+    return is_valid
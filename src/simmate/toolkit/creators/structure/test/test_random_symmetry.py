@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+
+from simmate.toolkit import Composition, Structure
+from simmate.toolkit.creators import RandomSymStructure
+from simmate.toolkit.creators.structure.random_symmetry import (
+    _apply_symmetry_operations,
+    _get_symmetry_operations,
+)
+
+
+@pytest.mark.parametrize("spacegroup", [14, 166, 225])
+def test_apply_symmetry_operations(spacegroup):
+    composition = Composition("Mg4Si8O12")
+    creator = RandomSymStructure(composition)
+    elements, coords = creator.site_generator.new_sites_many(10, spacegroup)
+    rotations, translations = _get_symmetry_operations(spacegroup)
+    site_elements, frac_coords, indices = _apply_symmetry_operations(
+        elements, coords, rotations, translations
+    )
+
+    # the sites must match those of Structure.from_spacegroup
+    lattice = creator.lattice_generator.new_lattice(spacegroup)
+    for frac_coords_expanded, index in zip(frac_coords, indices):
+        is_site = elements[index] >= 0
+        structure = Structure.from_spacegroup(
+            spacegroup,
+            lattice,
+            [composition.elements[i] for i in elements[index][is_site]],
+            coords[index][is_site],
+        )
+        assert numpy.allclose(structure.frac_coords, frac_coords_expanded)
+        assert structure.species == [composition.elements[i] for i in site_elements]
+
+
+def test_create_structures():
+    composition = Composition("Mg4Si8O12")
+    creator = RandomSymStructure(composition, spacegroup_include=[14, 62])
+
+    structures = creator.create_structures(6, nprocesses=2)
+    assert len(structures) == 6
+    for structure in structures:
+        assert (
+            structure.composition.reduced_composition == composition.reduced_composition
+        )
+        assert creator.validator.check_structure(structure)
+
+
+def test_create_structures_incompatible_spacegroups():
+    # Most spacegroups can't hold Ca2N, so many rounds draw only incompatible
+    # spacegroups. These must be skipped until all structures are made.
+    creator = RandomSymStructure(Composition("Ca2N"))
+    structures = creator.create_structures(30)
+    assert len(structures) == 30
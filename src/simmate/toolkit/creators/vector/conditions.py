@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import ast
+import functools
+
+import numpy
+
+
+class _SplitChainedComparisons(ast.NodeTransformer):
+    """
+    Rewrites chained comparisons (e.g. `0 <= x <= 1/2`) into the element-wise
+    `(0 <= x) & (x <= 1/2)`. Python evaluates chained comparisons with `and`,
+    which does not work for numpy arrays.
+    """
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        terms = [node.left] + node.comparators
+        comparisons = [
+            ast.Compare(left=left, ops=[op], comparators=[right])
+            for left, op, right in zip(terms[:-1], node.ops, terms[1:])
+        ]
+        return functools.reduce(
+            lambda left, right: ast.BinOp(left=left, op=ast.BitAnd(), right=right),
+            comparisons,
+        )
+
+
+# min() and max() are replaced with their element-wise numpy versions
+_CONDITION_FUNCTIONS = dict(
+    min=lambda *values: functools.reduce(numpy.minimum, values),
+    max=lambda *values: functools.reduce(numpy.maximum, values),
+)
+
+
+@functools.cache
+def compile_condition(condition: str):
+    """
+    Converts a condition string that uses x,y,z (e.g. `'y <= min(1 - x, x)'`)
+    into compiled code that can be evaluated with numpy arrays for x,y,z.
+    """
+    tree = ast.parse(condition.strip(), mode="eval")
+    tree = ast.fix_missing_locations(_SplitChainedComparisons().visit(tree))
+    return compile(tree, "<condition>", "eval")
+
+
+def check_conditions(vectors: numpy.ndarray, conditions: list[str]) -> numpy.ndarray:
+    """
+    Checks many (x,y,z) vectors against a list of conditions at once and gives
+    a boolean array of which vectors meet ALL conditions.
+
+    This gives the same result as calling `eval(condition, None, dict(x=x, y=y, z=z))`
+    on each vector, but it is much faster for many vectors.
+
+    #### Parameters
+
+    - `vectors`:
+        a 2D array of shape (N, 3)
+
+    - `conditions`:
+        a list of strings that use x,y,z for vector positions. For example,
+        `['x>=y', 'x<z*2', 'y<z+1']`
+    """
+    x, y, z = vectors.T
+    is_valid = numpy.ones(len(vectors), dtype=bool)
+    for condition in conditions:
+        result = eval(
+            compile_condition(condition),
+            _CONDITION_FUNCTIONS,
+            dict(x=x, y=y, z=z),
+        )
+        is_valid &= numpy.broadcast_to(result, is_valid.shape)
+    return is_valid
+
+
+def sample_vectors(
+    sample_function: callable,
+    nvectors: int,
+    is_valid_function: callable,
+    max_batch_size: int = 1_000_000,
+) -> numpy.ndarray:
+    """
+    Generates vectors in batches until `nvectors` valid ones are found (i.e.
+    rejection sampling). The batch size is scaled using the fraction of vectors
+    that were valid in earlier batches.
+
+    #### Parameters
+
+    - `sample_function`:
+        a function that is given a number of vectors and returns a 2D array of
+        random vectors with shape (N, 3)
+
+    - `nvectors`:
+        the number of valid vectors to return
+
+    - `is_valid_function`:
+        a function that is given a 2D array of vectors and returns a boolean
+        array of which vectors are valid
+
+    - `max_batch_size`:
+        the maximum number of vectors to generate at once
+    """
+    valid_vectors = []
+    nvalid = 0
+    nattempted = 0
+    while nvalid < nvectors:
+        nremaining = nvectors - nvalid
+        # until we see a valid vector, we keep increasing the batch size
+        fraction_valid = nvalid / nattempted if nvalid else 1 / max(nattempted, 1)
+        batch_size = min(int(nremaining / fraction_valid * 1.1) + 1, max_batch_size)
+
+        vectors = sample_function(batch_size)
+        vectors = vectors[is_valid_function(vectors)]
+        valid_vectors.append(vectors)
+        nvalid += len(vectors)
+        nattempted += batch_size
+
+    return numpy.concatenate(valid_vectors)[:nvectors]
@@ -2,6 +2,8 @@
 
 from numpy.random import normal as numpy_random_normal
 
+from simmate.toolkit.creators.vector.conditions import check_conditions, sample_vectors
+
 
 class NormallyDistributedVectors:
     # This class creates random coordinates (x,y,z) that follow a normal (Guassian)
@@ -60,3 +62,24 @@ class NormallyDistributedVectors:
             # while-loop will finish
 
         return vector
+
+    def new_vectors(self, nvectors: int):
+        """
+        Creates many vectors at once (as a 2D array of shape (N, 3)). This gives
+        the same distribution as calling `new_vector` repeatedly, but conditions
+        are checked for all vectors at once with numpy.
+        """
+
+        def is_valid_function(vectors):
+            is_valid = (vectors.min(axis=1) >= self.min_value) & (
+                vectors.max(axis=1) <= self.max_value
+            )
+            return is_valid & check_conditions(vectors, self.extra_conditions)
+
+        return sample_vectors(
+            sample_function=lambda n: numpy_random_normal(
+                loc=self.center, scale=self.standdev, size=(n, 3)
+            ),
+            nvectors=nvectors,
+            is_valid_function=is_valid_function,
+        )
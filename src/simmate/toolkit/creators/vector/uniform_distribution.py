@@ -2,6 +2,8 @@
 
 from numpy.random import random as numpy_random
 
+from simmate.toolkit.creators.vector.conditions import check_conditions, sample_vectors
+
 
 class UniformlyDistributedVectors:
     # This class creates random coordinates (x,y,z) that follow a uniform distribution.
@@ -46,3 +48,20 @@ class UniformlyDistributedVectors:
             # while-loop will finish
 
         return vector
+
+    def new_vectors(self, nvectors: int):
+        """
+        Creates many vectors at once (as a 2D array of shape (N, 3)). This gives
+        the same distribution as calling `new_vector` repeatedly, but conditions
+        are checked for all vectors at once with numpy.
+        """
+        return sample_vectors(
+            sample_function=lambda n: (
+                numpy_random((n, 3)) * (self.max_value - self.min_value)
+                + self.min_value
+            ),
+            nvectors=nvectors,
+            is_valid_function=lambda vectors: check_conditions(
+                vectors, self.extra_conditions
+            ),
+        )
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+
+import pytest
+
+from simmate.toolkit.symmetry import wyckoff
+from simmate.toolkit.symmetry.wyckoff import findValidWyckoffCombos
+
+
+def brute_force_combos(stoich, wy_groups):
+    # the original search: try every combination and filter
+    def availability(wy_group):
+        return wy_groups[wy_group].size if wy_group[1] == 1 else float("inf")
+
+    element_combos = []
+    for nsites in stoich:
+        combos = []
+        for size in range(1, nsites + 1):
+            for combo in itertools.combinations_with_replacement(wy_groups, size):
+                if sum(wy_group[0] for wy_group in combo) != nsites:
+                    continue
+                if all(combo.count(g) <= availability(g) for g in combo):
+                    combos.append(combo)
+        element_combos.append(combos)
+    return [
+        combo
+        for combo in itertools.product(*element_combos)
+        if all(
+            sum(element.count(g) for element in combo) <= availability(g)
+            for g in wy_groups
+        )
+    ]
+
+
+@pytest.mark.parametrize("spacegroup", [1, 14, 62, 166, 225])
+def test_find_valid_wyckoff_combos(spacegroup, tmp_path, monkeypatch):
+    monkeypatch.setattr(wyckoff, "WYCKOFF_CACHE_DIRECTORY", tmp_path)
+    wyckoff._findValidGroupCombos.cache_clear()
+
+    stoich = [4, 4, 12]
+    result = findValidWyckoffCombos(stoich, spacegroup)
+    expected = brute_force_combos(stoich, result["WyckoffGroups"])
+    assert result["ValidCombinations"] == expected
+
+    # results should be reloaded from disk once the memory cache is cleared
+    assert len(list(tmp_path.iterdir())) == 1
+    wyckoff._findValidGroupCombos.cache_clear()
+    result = findValidWyckoffCombos(stoich, spacegroup)
+    assert result["ValidCombinations"] == expected
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
-import itertools
+import functools
+import json
+import logging
+import os
 from pathlib import Path
 
 import pandas as pd
@@ -47,7 +50,12 @@ def loadWyckoffData():
     return data
 
 
-def findValidWyckoffCombos(stoich, spacegroup, wy_data=loadWyckoffData()):
+# findValidWyckoffCombos uses this by default. When it does, the wyckoff
+# groups of each spacegroup can be cached (see _getWyckoffGroups)
+_WYCKOFF_DATA = loadWyckoffData()
+
+
+def findValidWyckoffCombos(stoich, spacegroup, wy_data=_WYCKOFF_DATA):
     """
     Given a composition's stoichiometry (such as [4,4,12] for Mg4Si4O12) and
     a single spacegroup (1-230), this function will find all valid wyckoff
@@ -62,10 +70,11 @@ def findValidWyckoffCombos(stoich, spacegroup, wy_data=loadWyckoffData()):
     in the header, calling findValidWyckoffCombos() repetitively will not
     repetitively call loadWyckoffData() which yields a massive
     speed improvement.
-    """
 
-    # Grab all the wyckoff sites associated with the spacegroup given
-    wy_sg = wy_data.query("SpaceGroup == @spacegroup")
+    NOTE: results are cached by (stoich, spacegroup) both in memory and on
+    disk (in WYCKOFF_CACHE_DIRECTORY), so repeated calls -- even from new
+    python processes -- are nearly instant.
+    """
 
     # This separate wy_sites into unique (MultiplicityPrimitive, Availability)
     # groups. This is useful for massive speed-up in the function as we can
@@ -73,120 +82,222 @@ def findValidWyckoffCombos(stoich, spacegroup, wy_data=loadWyckoffData()):
     # wy_sites with Multiplicity = 2 and Availability = 2 will be treated as
     # one group when making combos then when that combo is used (in a
     # different function), it randomly grabs one wy_site from the group.
-    wy_groups = wy_sg.groupby(["MultiplicityPrimitive", "Availability"]).groups
-
-    # First, we need to find what the valid combinations are for each of the
-    # individual elements. This code finds all combinations of wyckoffs sites.
-    # Combinations can be up to nsites. So we go through all combinations
-    # and see which ones meet the following criteria:
-    #   1) total wyckoff sites used is less than nsites
-    #   2) the total multiplicity of all wyckoff sites is equal to nsites
-    #   3) no wyckoff site with an availability of 1 is used multiple times
-    wy_combos = []
-    for i, nsites in enumerate(stoich):
-        # Don't search for wyckoff combinations if it's already been done for
-        # a given nsite size. In [4,4,12] example, we run this code for
-        # nsites=4 twice, which is unneccessary. Instead, we want to copy the
-        # result of the first run, which is much faster. This IF statement
-        # (and all code in it) is therefore a shortcut. The algorithm works
-        # the same without this check, just slower.
-        if nsites in stoich[:i]:  # if nsites value is earlier in stoich list
-            # Find where in stoich that the nsites was done before
-            i_match = stoich.index(nsites)
-            # The index of the first occurence in stoich will match the
-            # index in wy_combos. Copy the result of that wy_combo result over.
-            wy_combos.append(wy_combos[i_match])
-            # then skip to the next nsites
-            continue
-        # Make an empty list that we can store all the valid combinations in
-        valid_group_combos = []
-        # Try each combination size up to the value of nsite
-        for s in range(1, nsites + 1):  # +1 because range stops at value prior
-            # Find all combinations at the combo size of s
-            combos = itertools.combinations_with_replacement(wy_groups, s)
-            # For each combination, check that criteria are met
-            for combo in combos:
-                # Say the combo is valid until proven otherwise
-                is_valid = True
-                # The total multiplicity of all wyckoff sites must be equal to
-                # nsites. Note, index 0 is "MultiplicityPrimitive".
-                mults = sum([wy_group[0] for wy_group in combo])
-                if mults != nsites:
-                    # No need to check further, so jump to the next combo.
-                    continue  # same as is_valid=False, but faster
-                # No wy_site with an availability of 1 can used multiple times.
-                # For example, site 0,0,0 cant be used more than once.
-                for wy_group in combo:
-                    # The 'uses' is total times that a given wy_group is used
-                    uses = combo.count(wy_group)
-                    # The 'avail_s' is the availabilitiy of a single wy_site
-                    # in the wy_group, which is either 1 or infinite (inf).
-                    avail_s = wy_group[1]
-                    # If a single wy_site in the group has Availability = 1
-                    if avail_s == 1:
-                        # The total times that a wy_group is allowed to be
-                        # used is the length of the group. For example, the
-                        # group of 6 wy_sites that have Availability = 1 can
-                        # be used a maximum of 6 times.
-                        avail_g = wy_groups[wy_group].size
-                    # If a single wy_site in the group has Availability = inf
-                    else:
-                        # The total times that this group can be used is inf.
-                        # Note index 1 grabs the'inf' availability value.
-                        avail_g = wy_group[1]
-                    # Now check if the site is overused.
-                    if uses > avail_g:
-                        is_valid = False
-                        break  # no need to check further in this combo
-                # If the combo has passed all tests if it reached this point,
-                # then add it to the valid list.
-                if is_valid:
-                    valid_group_combos.append(combo)
-        wy_combos.append(valid_group_combos)
+    if wy_data is _WYCKOFF_DATA:
+        wy_groups = _getWyckoffGroups(spacegroup)
+    else:
+        wy_groups = _groupWyckoffSites(wy_data, spacegroup)
+
+    # The combos only depend on the stoichiometry and the (multiplicity,
+    # availability, size) of each wy_group, so these make up the cache key.
+    # Including the group info (and not just the spacegroup) ensures that
+    # we never reuse results from different wyckoff data.
+    valid_combos = _findValidGroupCombos(
+        stoich=tuple(int(nsites) for nsites in stoich),
+        spacegroup=int(spacegroup),
+        group_keys=tuple(wy_groups.keys()),
+        group_sizes=tuple(int(sites.size) for sites in wy_groups.values()),
+    )
 
-    # We now need to find the unique combinations of wy_combos accross all
-    # elements. For example, we ensure that Mg and Si both can't use 0,0,0.
-    # Make an empty list that we can store all the valid combinations in
-    valid_combos = []
-    #!!! The "*" uses "star expression, which I don't fully understand but it
-    #!!! gives the desired output that I want.
-    combos = itertools.product(*wy_combos)
-    for combo in combos:
-        # say the combo is valid until proven otherwise
-        is_valid = True
-        # The combo is invalid if a wycoff sites use is more than it's total
-        # availibility. For example, the wyckoff site of (0,0,0) cannot be
-        # used by both Mg and Si, whereas the wyckoff site of (0,0,z) can be
-        # used by multiple elements.
-        for wy_group in wy_groups:
-            # The 'uses' is total times that a given wy_group is used
-            uses = sum([element.count(wy_group) for element in combo])
-            # The 'avail_s' is the availabilitiy of a single wy_site
-            # in the wy_group, which is either 1 or infinite (inf).
-            avail_s = wy_group[1]
-            # If a single wy_site in the group has Availability = 1
-            if avail_s == 1:
-                # The total times that a wy_group is allowed to be
-                # used is the length of the group. For example, the
-                # group of 6 wy_sites that have Availability = 1 can
-                # be used a maximum of 6 times.
-                avail_g = wy_groups[wy_group].size
-            # If a single wy_site in the group has Availability = inf
-            else:
-                # The total times that this group can be used is inf.
-                # Note index 1 grabs the'inf' availability value.
-                avail_g = wy_group[1]
-            if uses > avail_g:
-                is_valid = False
-                break  # no need to check further in this combo
-        # If the combo has passed all tests if it reached this point,
-        # then add it to the valid list.
-        if is_valid:
-            valid_combos.append(combo)
     # We want to return the valid combinations of wyckoff groups because
     # groups can refer to a number of wy_sites (a,b,c, etc.)
     #!!! TO-DO: add a better explanation of what's being returned here
-    return {"WyckoffGroups": wy_groups, "ValidCombinations": valid_combos}
+    return {"WyckoffGroups": wy_groups, "ValidCombinations": list(valid_combos)}
+
+
+def _groupWyckoffSites(wy_data, spacegroup):
+    # Grab all the wyckoff sites associated with the spacegroup given and
+    # group them by (MultiplicityPrimitive, Availability)
+    wy_sg = wy_data.query("SpaceGroup == @spacegroup")
+    return wy_sg.groupby(["MultiplicityPrimitive", "Availability"]).groups
+
+
+@functools.cache
+def _getWyckoffGroups(spacegroup):
+    return _groupWyckoffSites(_WYCKOFF_DATA, spacegroup)
+
+
+WYCKOFF_CACHE_DIRECTORY = Path.home() / "simmate" / "wyckoff_cache"
+"""
+The folder where results of findValidWyckoffCombos are saved. Each
+(stoich, spacegroup) pair is stored as a separate json file.
+"""
+
+
+@functools.lru_cache(maxsize=1024)
+def _findValidGroupCombos(
+    stoich: tuple[int],
+    spacegroup: int,
+    group_keys: tuple[tuple],
+    group_sizes: tuple[int],
+) -> tuple:
+    # This is the (in-memory) cached part of findValidWyckoffCombos. If the
+    # result isn't in memory yet, we check the disk before searching.
+    group_info = [[*key, size] for key, size in zip(group_keys, group_sizes)]
+    filename = (
+        WYCKOFF_CACHE_DIRECTORY
+        / f"{spacegroup}_{'-'.join(str(nsites) for nsites in stoich)}.json"
+    )
+
+    results = None
+    if filename.exists():
+        try:
+            with filename.open() as file:
+                data = json.load(file)
+            # the file is ignored if the wyckoff data has changed since
+            if data["WyckoffGroups"] == group_info:
+                results = data["ElementCombinations"], data["ValidCombinations"]
+        except (OSError, ValueError, KeyError):
+            logging.warning(f"Ignoring unreadable wyckoff cache file: {filename}")
+
+    if results is None:
+        results = _searchValidGroupCombos(
+            stoich,
+            multiplicities=[int(key[0]) for key in group_keys],
+            availabilities=[
+                size if key[1] == 1 else float("inf")
+                for key, size in zip(group_keys, group_sizes)
+            ],
+        )
+        # The cache is only a speed-up, so failing to write it (e.g. a
+        # read-only home directory) is not an error. We write to a temporary
+        # file first and then rename it, which is atomic. This way other
+        # processes never read a partially-written file.
+        try:
+            WYCKOFF_CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+            temp_filename = filename.with_suffix(f".{os.getpid()}.tmp")
+            with temp_filename.open("w") as file:
+                json.dump(
+                    {
+                        "WyckoffGroups": group_info,
+                        "ElementCombinations": results[0],
+                        "ValidCombinations": results[1],
+                    },
+                    file,
+                )
+            os.replace(temp_filename, filename)
+        except OSError:
+            logging.warning(f"Unable to write wyckoff cache file: {filename}")
+
+    # convert the wy_group indexes back to their (multiplicity, availability)
+    # labels, which is what findValidWyckoffCombos returns. Each element's
+    # wy_groups are only converted once and then shared between combos.
+    element_combos, valid_combos = results
+    element_options = [
+        [tuple(group_keys[g] for g in wy_groups) for wy_groups in combos]
+        for combos in element_combos
+    ]
+    return tuple(
+        tuple(map(list.__getitem__, element_options, combo)) for combo in valid_combos
+    )
+
+
+def _searchValidGroupCombos(
+    stoich: tuple[int],
+    multiplicities: list[int],
+    availabilities: list[float],
+) -> tuple[list, list]:
+    # This finds all valid wyckoff combinations, where wy_groups are referred
+    # to by their index. The output is in the same order as the original
+    # brute-force search (which went through itertools.combinations and
+    # itertools.product and then filtered the results).
+    #
+    # Two lists are returned: (1) the wy_group combos that each element can
+    # use on its own, and (2) the valid combos, where each element is given
+    # an index of list 1. This avoids storing the same per-element combo
+    # many times over.
+    #
+    # The criteria for a valid combo are the same as before:
+    #   1) the total multiplicity of all wyckoff sites is equal to nsites
+    #   2) no wyckoff group with an availability of 1 is used more times than
+    #      the number of wy_sites in it -- across all elements
+    #
+    # Rather than trying all combinations of wy_groups and throwing away ones
+    # that don't add up to nsites, we only build combos that can be finished.
+    # For each element, this is a search over how many times each wy_group is
+    # used (i.e. a partition of nsites into multiplicities).
+    ngroups = len(multiplicities)
+    fixed_groups = [i for i in range(ngroups) if availabilities[i] != float("inf")]
+
+    element_combos = {}
+    for nsites in set(stoich):
+        # the most times each wy_group can be used by this element
+        max_uses = [
+            int(min(availabilities[i], nsites // multiplicities[i]))
+            for i in range(ngroups)
+        ]
+
+        # This is the dynamic-programming table. is_reachable[i][n] says
+        # whether n sites can be made using wy_groups i and after. We use it
+        # to skip any partial combo that can't reach nsites.
+        is_reachable = [[False] * (nsites + 1) for _ in range(ngroups + 1)]
+        is_reachable[ngroups][0] = True
+        for i in reversed(range(ngroups)):
+            for n in range(nsites + 1):
+                is_reachable[i][n] = any(
+                    is_reachable[i + 1][n - uses * multiplicities[i]]
+                    for uses in range(min(max_uses[i], n // multiplicities[i]) + 1)
+                )
+
+        combos = []
+        uses_per_group = [0] * ngroups
+
+        def search_group(i, nremaining):
+            if i == ngroups:
+                combos.append(
+                    [g for g in range(ngroups) for _ in range(uses_per_group[g])]
+                )
+                return
+            for uses in range(min(max_uses[i], nremaining // multiplicities[i]) + 1):
+                nleft = nremaining - uses * multiplicities[i]
+                if is_reachable[i + 1][nleft]:
+                    uses_per_group[i] = uses
+                    search_group(i + 1, nleft)
+            uses_per_group[i] = 0
+
+        if is_reachable[0][nsites]:
+            search_group(0, nsites)
+
+        # itertools.combinations_with_replacement orders combos by their size
+        # and then by their wy_group indexes
+        combos.sort(key=lambda combo: (len(combo), combo))
+
+        # For the checks across elements below, we only need to know how
+        # many times each availability=1 group is used
+        element_combos[nsites] = [
+            (combo, [(g, combo.count(g)) for g in fixed_groups if g in combo])
+            for combo in combos
+        ]
+
+    # We now need to find the unique combinations of wy_combos accross all
+    # elements. For example, we ensure that Mg and Si both can't use 0,0,0.
+    # This goes through elements one at a time (in the same order as
+    # itertools.product would), but stops early when a special wy_group
+    # is overused.
+    valid_combos = []
+    current_combo = []
+    total_uses = [0] * ngroups
+
+    def search_element(i):
+        if i == len(stoich):
+            valid_combos.append(list(current_combo))
+            return
+        for option, (combo, fixed_uses) in enumerate(element_combos[stoich[i]]):
+            if any(total_uses[g] + uses > availabilities[g] for g, uses in fixed_uses):
+                continue
+            for g, uses in fixed_uses:
+                total_uses[g] += uses
+            current_combo.append(option)
+            search_element(i + 1)
+            current_combo.pop()
+            for g, uses in fixed_uses:
+                total_uses[g] -= uses
+
+    search_element(0)
+
+    return (
+        [[combo for combo, _ in element_combos[nsites]] for nsites in stoich],
+        valid_combos,
+    )
 
 
 def findValidWyckoffCombosForListofSpacegroups(
@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy
-import scipy
-from django.core.exceptions import MultipleObjectsReturned
 from django.utils import timezone
 from rich.progress import track
 
 from simmate.toolkit import Structure
 from simmate.toolkit.validators import Validator
-from simmate.utilities import chunk_list
+from simmate.toolkit.validators.fingerprint.cache import FingerprintCache
+from simmate.toolkit.validators.fingerprint.similarity_index import (
+    CosineIndex,
+    CustomIndex,
+    EuclideanIndex,
+    FingerprintIndex,
+    KDTreeIndex,
+)
+from simmate.utilities import init_worker_process
 
 
 class FingerprintValidator(Validator):
@@ -30,16 +38,50 @@ class FingerprintValidator(Validator):
     The value used to signify different structures
     """
 
+    similarity_index: str = "auto"
+    """
+    How the fingerprint pool is searched for similar fingerprints. Options are:
+        - auto (picks the best option below for the comparison_mode)
+        - brute_force (compares to all fingerprints using vectorized numpy)
+        - kdtree (only supported for the linalg_norm comparison_mode)
+
+    The 'custom' comparison_mode always compares fingerprints one at a time.
+    """
+
+    kdtree_max_features: int = 20
+    """
+    When similarity_index is 'auto', a KD-tree is only used for fingerprints
+    with this many features or fewer. KD-trees lose their advantage over a
+    brute-force search for long fingerprints.
+    """
+
+    featurize_chunk_size: int = 100
+    """
+    When featurizing in parallel, the number of structures sent to a process
+    at a time. Larger chunks reduce the overhead of passing data between
+    processes.
+    """
+
     def __init__(
         self,
         distance_tolerance: float = None,  # defaults to class attr
         structure_pool: list[Structure] = [],  # OR a queryset from a Structure table
         use_database: bool = False,
+        use_cache: bool = True,
+        nprocesses: int = 1,
         **kwargs,
     ):
         self.use_database = use_database
+        self.use_cache = use_cache
+        # a value of None or 0 uses all available cores
+        self.nprocesses = nprocesses or os.cpu_count()
         self.distance_tolerance = distance_tolerance or self.distance_tolerance
 
+        # The fingerprint index is built once we know the number of features
+        # in each fingerprint (i.e. when the first fingerprint is added)
+        self.fingerprint_index = None
+        self.source_pool = []
+
         # setup featurizer with the given composition
         self.featurizer = self.get_featurizer(**kwargs)
 
@@ -84,6 +126,11 @@ class FingerprintValidator(Validator):
             # BUG: There is a race condition here. If a pool is started up from
             # multiple locations, this could result in duplicate pools.
 
+            # Fingerprints that are already in the database are loaded from an
+            # on-disk copy, which is much faster than querying the full pool
+            if use_cache:
+                self.fingerprint_cache = FingerprintCache(self.database_pool)
+
             # we also keep a log of the last update so we only grab new structures
             # each time we update the database. To start, we set this as the
             # earliest possible date, which tells our update_fingerprint_pool
@@ -99,13 +146,7 @@ class FingerprintValidator(Validator):
         if isinstance(structure_pool, list):
             # If so, we generate the fingerprint for each of the initial input structures
             # We convert this to a numpy array for speed improvement at later stages
-            fingerprints = numpy.array(
-                [
-                    self._get_fingerprint(structure)
-                    for structure in track(structure_pool)
-                ]
-            )
-            # OPTIMIZE: this can be slow and I should support parallel featurization.
+            fingerprints = numpy.array(self._get_many_fingerprints(structure_pool))
 
             sources = [structure.source for structure in structure_pool]
 
@@ -114,8 +155,6 @@ class FingerprintValidator(Validator):
         # otherwise we have a queryset that should be used to populate the
         # fingerprint database
         else:
-            self.fingerprint_pool = numpy.array([])
-            self.source_pool = []
             self.update_fingerprint_pool()
 
     # -------------------------------------------------------------------------
@@ -140,6 +179,49 @@ class FingerprintValidator(Validator):
     def format_fingerprint(fingerprint):
         return fingerprint  # does nothing by default
 
+    def get_similarity_index(self, nfeatures: int) -> FingerprintIndex:
+        """
+        Builds an empty index that the fingerprint pool is stored and searched
+        in. This can be overwritten to use a custom FingerprintIndex subclass.
+
+        #### Parameters
+
+        - `nfeatures`:
+            the length of each fingerprint
+        """
+        if self.comparison_mode == "custom":
+            return CustomIndex(self.get_fingerprint_distance)
+
+        elif self.comparison_mode == "cos":
+            if self.similarity_index not in ["auto", "brute_force"]:
+                raise Exception(
+                    f"The '{self.similarity_index}' similarity_index is not "
+                    "supported for the 'cos' comparison_mode"
+                )
+            return CosineIndex()
+
+        elif self.comparison_mode == "linalg_norm":
+            if self.similarity_index == "kdtree" or (
+                self.similarity_index == "auto"
+                and nfeatures <= self.kdtree_max_features
+            ):
+                return KDTreeIndex()
+            elif self.similarity_index in ["auto", "brute_force"]:
+                return EuclideanIndex()
+            else:
+                raise Exception(f"Unknown similarity_index: {self.similarity_index}")
+
+        raise NotImplementedError("Unknown comparison_mode provided.")
+
+    @property
+    def fingerprint_pool(self) -> numpy.ndarray:
+        """
+        A 2D array of all fingerprints in the pool
+        """
+        if self.fingerprint_index is None:
+            return numpy.array([])
+        return self.fingerprint_index.fingerprints
+
     # -------------------------------------------------------------------------
     # Core methods that generate and compare fingerprints
     # -------------------------------------------------------------------------
@@ -157,7 +239,7 @@ class FingerprintValidator(Validator):
         fingerprint = self._get_fingerprint(structure)
 
         # compare this new fingerprint to all others
-        is_unique = self._check_fingerprint(fingerprint, self.fingerprint_pool)
+        is_unique = self._check_fingerprint(fingerprint, self.fingerprint_index)
 
         # add this new fingerprint to the database if it was requested.
         if is_unique and add_unique_to_pool:
@@ -174,39 +256,15 @@ class FingerprintValidator(Validator):
     def _check_fingerprint(
         self,
         fingerprint: numpy.array,
-        fingerprint_pool: list[numpy.array],
+        fingerprint_index: FingerprintIndex,
     ):
-        # We now want to get the distance of this fingerprint relative to all others.
-        # If the distance is within the specified tolerance, then the structures
-        # are too similar - and we return  for a failure.
-        is_unique = True  # consider it unique until proven otherwise
-        # min_dist = 9999  # start with high value
-        for fingerprint2 in fingerprint_pool:
-            # check fingerprint based on the mode set
-            if self.comparison_mode == "linalg_norm":
-                distance = numpy.linalg.norm(fingerprint - fingerprint2)
-            elif self.comparison_mode == "cos":
-                distance = scipy.spatial.distance.cosine(fingerprint, fingerprint2)
-            elif self.comparison_mode == "custom":
-                distance = self.get_fingerprint_distance(fingerprint, fingerprint2)
-            else:
-                raise NotImplementedError("Unknown comparison_mode provided.")
-
-            # keep track of the most similar structure
-            # if min_dist > distance:
-            #     min_dist = distance
-
-            # and determine if we have a match
-            if distance < self.distance_tolerance:
-                # we can end the whole for-loop as soon as one structure is
-                # deemed too similar
-                is_unique = False
-                break
-
-        # If we make it through all structures and no distance is below the
-        # tolerance, then we have a new and unique fingerprint
-
-        return is_unique
+        # We now want to see if any fingerprint in the pool is within the
+        # specified tolerance. If so, then the structures are too similar - and
+        # we return False for a failure. Otherwise, we have a new and unique
+        # fingerprint. An empty pool has no index yet.
+        if fingerprint_index is None:
+            return True
+        return not fingerprint_index.has_match(fingerprint, self.distance_tolerance)
 
     def _get_fingerprint(self, structure: Structure):
         # make the fingerprint for this structure into a numpy array for speed
@@ -217,6 +275,43 @@ class FingerprintValidator(Validator):
 
         return fingerprint
 
+    def _get_many_fingerprints(self, structures: list[Structure]) -> list:
+        """
+        Generates the fingerprint for each structure, using several processes
+        if `nprocesses` was set. Fingerprints are always returned in the same
+        order as the structures given.
+        """
+        if self.nprocesses == 1 or len(structures) <= self.featurize_chunk_size:
+            return [self._get_fingerprint(structure) for structure in track(structures)]
+
+        # NOTE: We previously attempted this with Dask, but it ended up
+        # crashing in many scenarios. A plain process pool is much simpler.
+        chunks = [
+            structures[i : i + self.featurize_chunk_size]
+            for i in range(0, len(structures), self.featurize_chunk_size)
+        ]
+        logging.info(
+            f"Featurizing {len(structures)} structures with {self.nprocesses} "
+            "processes"
+        )
+
+        fingerprints = []
+        with ProcessPoolExecutor(
+            max_workers=self.nprocesses,
+            initializer=init_worker_process,
+        ) as executor:
+            # map gives back results in the same order as the chunks
+            futures = executor.map(
+                _featurize_chunk,
+                [self.__class__] * len(chunks),
+                [self.featurizer] * len(chunks),
+                chunks,
+            )
+            for chunk_fingerprints in track(futures, total=len(chunks)):
+                fingerprints += chunk_fingerprints
+
+        return fingerprints
+
     # -------------------------------------------------------------------------
     # Methods that populate the pool and database with information
     # -------------------------------------------------------------------------
@@ -250,41 +345,42 @@ class FingerprintValidator(Validator):
         if self.use_database:
             logging.info("Checking database for already-calculated fingerprints")
 
-            # a single query might be too large for some querysets. Several
-            # smaller queries are more stable so we never grab more than 500
-            # fingerprints at a time.
-            all_results = []
+            if self.use_cache:
+                fingerprints, sources, existing_ids = self._load_from_cache(new_ids)
+            else:
+                from simmate.database.base_data_types import Fingerprint
 
-            for query_chunk in chunk_list(new_ids, chunk_size=1000):
+                # new_ids is still a queryset, so we can load all fingerprints
+                # in a single streaming query (using new_ids as a subquery)
                 query = self.database_pool.fingerprints.filter(
-                    database_id__in=query_chunk
-                )
-
-                # BUG: there is a race condition that sometimes adds duplicate
-                # fingerprints to the database. We add distinct to keep our
-                # query smaller and just grab one. Distinct is also not supported
-                # by sqlite
-                from simmate.configuration.django.settings import DATABASES
-
-                if DATABASES["default"]["ENGINE"] != "django.db.backends.sqlite3":
-                    query = query.distinct("database_id")
-
-                all_results += list(query)
-
-            # the query does not return the ids in the same order that new_ids
-            # was given. Order is important when finding unique structures, so
-            # we need to reorder the query results here
-            all_data_dict = {entry.database_id: entry for entry in all_results}
-            all_data_ordered = [
-                all_data_dict[id] for id in new_ids if id in all_data_dict.keys()
-            ]
+                    database_id__in=new_ids,
+                    fingerprint_binary__isnull=False,
+                ).values_list("database_id", "fingerprint_binary")
+                all_data_dict = {
+                    database_id: fingerprint_binary
+                    for database_id, fingerprint_binary in query.iterator(
+                        chunk_size=2000
+                    )
+                }
+
+                # the query does not return the ids in the same order that new_ids
+                # was given. Order is important when finding unique structures, so
+                # we need to reorder the query results here
+                existing_ids = [id for id in new_ids if id in all_data_dict]
+                fingerprints = [
+                    Fingerprint.decode_fingerprint(all_data_dict[id])
+                    for id in existing_ids
+                ]
+                table_name = self.database_pool.database_table
+                sources = [
+                    dict(database_table=table_name, database_id=id)
+                    for id in existing_ids
+                ]
 
-            fingerprints = [entry.fingerprint for entry in all_data_ordered]
-            sources = [entry.source for entry in all_data_ordered]
             self._add_many_to_pool(fingerprints, sources, skip_database=True)
 
             # reset the new_structures list to those that are actually still needed
-            existing_ids = [fp.database_id for fp in all_results]
+            existing_ids = set(existing_ids)
             new_ids = [i for i in new_ids if i not in existing_ids]
 
         # same as before -- exit if there aren't any new ids
@@ -297,43 +393,46 @@ class FingerprintValidator(Validator):
             id__in=new_ids
         ).to_toolkit()
 
-        # OPTIMIZE: I attempted to calculate fingerprints with Dask, but without
-        # any luck. Ends up crashing in many scenarios.
-        # from simmate.configuration.dask import get_dask_client
-        # with get_dask_client() as client:
-        #     futures = [client.submit(self._get_fingerprint, s) for s in new_structures]
-        #     fingerprints = [future.result() for future in track(futures)]
-
         # calculate each fingerprint and add it to the database
-        fingerprints = [
-            self._get_fingerprint(structure) for structure in track(new_structures)
-        ]
+        fingerprints = self._get_many_fingerprints(new_structures)
         sources = [structure.source for structure in new_structures]
         self._add_many_to_pool(fingerprints, sources)
 
+    def _load_from_cache(self, database_ids: list[int]) -> tuple:
+        """
+        Updates the on-disk fingerprint cache and then returns the
+        fingerprints and sources for the given ids, in the same order. Ids that
+        are not in the cache are skipped, so the ids found are also returned.
+        """
+        self.fingerprint_cache.update()
+        cached_ids, cached_fingerprints = self.fingerprint_cache.load()
+
+        rows = {id: row for row, id in enumerate(cached_ids.tolist())}
+        found_ids = [i for i in database_ids if i in rows]
+        fingerprints = cached_fingerprints[[rows[i] for i in found_ids]]
+        table_name = self.database_pool.database_table
+        sources = [dict(database_table=table_name, database_id=i) for i in found_ids]
+        return fingerprints, sources, found_ids
+
     def _add_many_to_pool(self, fingerprints, sources, skip_database: bool = False):
         """
         Efficiently adds many fingerprints to the pool.
         """
 
+        if len(fingerprints) == 0:
+            return
+
         # source
         self.source_pool += sources
 
         # fingerprint
-        # Numpy arrays begin differently when empty
-        if self.fingerprint_pool.size == 0:
-            self.fingerprint_pool = numpy.array(fingerprints)
-        else:
-            self.fingerprint_pool = numpy.append(
-                self.fingerprint_pool, fingerprints, axis=0
-            )
+        if self.fingerprint_index is None:
+            self.fingerprint_index = self.get_similarity_index(len(fingerprints[0]))
+        self.fingerprint_index.add_many(fingerprints)
 
         # store in database
         if not skip_database:
-            for fingerprint, source in zip(fingerprints, sources):
-                self._add_to_database(fingerprint, source)
-            # OPTIMIZE: I'm not sure how to do this in a single query
-            # https://stackoverflow.com/questions/27047630
+            self._add_many_to_database(fingerprints, sources)
 
     def _add_to_pool(
         self,
@@ -343,43 +442,41 @@ class FingerprintValidator(Validator):
     ):
         """
         Adds a new fingerprint to the pool.
-
-        This is very slow for >1000 additions though. For bulk additions, use
-        _add_many_to_pool method instead. See:
-            https://stackoverflow.com/questions/7133885
         """
 
         # source
         self.source_pool.append(source)
 
         # fingerprint
-        # Numpy arrays begin differently when empty
-        if self.fingerprint_pool.size == 0:
-            self.fingerprint_pool = numpy.array([fingerprint])
-        else:
-            self.fingerprint_pool = numpy.append(
-                self.fingerprint_pool, [fingerprint], axis=0
-            )
+        if self.fingerprint_index is None:
+            self.fingerprint_index = self.get_similarity_index(len(fingerprint))
+        self.fingerprint_index.add(fingerprint)
 
         # store in database
         if not skip_database:
             self._add_to_database(fingerprint, source)
 
     def _add_to_database(self, fingerprint, source):
-        # as an extra, we save the result to our database so that this
-        # fingerprint doesn't need to be calculated again
-        if self.use_database and source.get("database_id"):
-            try:
-                self.database_pool.fingerprints.update_or_create(
-                    database_id=source.get("database_id"),
-                    defaults=dict(fingerprint=list(fingerprint)),
-                )
-            # BUG: there is a race condition that sometimes triggers multiple
-            # fingerprints to be added. If this happens, we just move on. The
-            # key thing is that the fingerprint is there.
-            except MultipleObjectsReturned:
-                # TODO: maybe delete the duplicates here...?
-                pass
+        self._add_many_to_database([fingerprint], [source])
+
+    def _add_many_to_database(self, fingerprints, sources):
+        # as an extra, we save the results to our database so that these
+        # fingerprints don't need to be calculated again. Each structure can
+        # only have one fingerprint per pool, so if another process already
+        # added one (e.g. a race between two workers), it is just replaced.
+        if not self.use_database:
+            return
+
+        from simmate.database.base_data_types import Fingerprint
+
+        entries = [
+            (source["database_id"], fingerprint)
+            for fingerprint, source in zip(fingerprints, sources)
+            if source.get("database_id")
+        ]
+        if entries:
+            database_ids, fingerprints = zip(*entries)
+            Fingerprint.upsert_many(self.database_pool, database_ids, fingerprints)
 
     # -------------------------------------------------------------------------
     # Extra high level methods that are useful for analyzing a structure pool
@@ -397,7 +494,7 @@ class FingerprintValidator(Validator):
     def get_unique_from_pool(self) -> list[Structure]:
         # order of the input structures is important for this method
         if (
-            self.structure_pool_queryset
+            self.structure_pool_queryset != "local_only"
             and not self.structure_pool_queryset.query.order_by
         ):
             logging.warning(
@@ -408,24 +505,22 @@ class FingerprintValidator(Validator):
 
         logging.info("Isolating unique structures")
 
-        # The first structure in our pool is unique by default so this
-        # starts out our list
-        unique_sources = [self.source_pool[0]]
-        unique_fingerprints = numpy.array([self.fingerprint_pool[0]])
+        # an empty pool has no fingerprints to set the size of our index
+        if self.fingerprint_index is None:
+            return []
+
+        # The unique fingerprints are collected in their own index, which
+        # starts empty. The first structure in our pool is therefore always
+        # unique, and the rest are checked one at a time
+        unique_sources = []
+        unique_index = self.get_similarity_index(self.fingerprint_pool.shape[1])
 
-        # The rest need to be checked one at a time
         for source, fingerprint in track(
             list(zip(self.source_pool, self.fingerprint_pool))
         ):
-            is_unique = self._check_fingerprint(
-                fingerprint,
-                unique_fingerprints,
-            )
-            if is_unique:
+            if not unique_index.has_match(fingerprint, self.distance_tolerance):
                 unique_sources.append(source)
-                unique_fingerprints = numpy.append(
-                    unique_fingerprints, [fingerprint], axis=0
-                )
+                unique_index.add(fingerprint)
 
         logging.info(
             f"{len(unique_sources)} unique entries found. "
@@ -438,3 +533,20 @@ class FingerprintValidator(Validator):
         structures = DatabaseAdapter.get_toolkits_from_database_dicts(unique_sources)
 
         return structures
+
+
+# -----------------------------------------------------------------------------
+# Utilities for featurizing structures in separate processes
+# -----------------------------------------------------------------------------
+
+
+def _featurize_chunk(
+    validator_class: FingerprintValidator,
+    featurizer,
+    structures: list[Structure],
+) -> list:
+    fingerprints = []
+    for structure in structures:
+        fingerprint = numpy.array(featurizer.featurize(structure))
+        fingerprints.append(validator_class.format_fingerprint(fingerprint))
+    return fingerprints
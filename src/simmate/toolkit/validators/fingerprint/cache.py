@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy
+
+from simmate.utilities import get_directory
+
+# File locking is only available on unix systems. On windows, we skip locking,
+# which is safe as long as a single process updates a cache at a time.
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class FingerprintCache:
+    """
+    An on-disk copy of all fingerprints in a `FingerprintPool` database table.
+
+    Loading a pool from the database means decoding every fingerprint row,
+    which becomes slow for large pools (e.g. evolutionary searches that
+    rebuild their validator with every new individual). Instead, this cache
+    stores the fingerprints as a single binary matrix that is memory-mapped,
+    so every process on a node shares the same (zero-copy) data. Only rows
+    added to the database since the last update (the "watermark") are ever
+    pulled from the database.
+
+    The cache is made of three files in its directory:
+        - `fingerprints.bin`: a float64 matrix with one row per fingerprint
+        - `database_ids.bin`: the int64 database_id of each row
+        - `metadata.json`: the number of rows, features, and the watermark
+
+    New rows are always appended to the binary files before the metadata is
+    (atomically) replaced. Readers only map the number of rows given in the
+    metadata, so they never see a partially-written row.
+    """
+
+    base_directory: Path = Path.home() / "simmate" / "fingerprint_cache"
+    """
+    The folder where caches for all fingerprint pools are stored
+    """
+
+    watermark_overlap: timedelta = timedelta(minutes=5)
+    """
+    Rows are pulled from the database starting slightly before the watermark.
+    A row's `created_at` is set before its transaction commits, so a row can
+    become visible after rows with a later timestamp. Rows that are already
+    in the cache are skipped.
+    """
+
+    def __init__(self, database_pool):
+        self.database_pool = database_pool
+        self.directory = self.get_directory(database_pool)
+        self.fingerprints_filename = self.directory / "fingerprints.bin"
+        self.database_ids_filename = self.directory / "database_ids.bin"
+        self.metadata_filename = self.directory / "metadata.json"
+
+    @classmethod
+    def get_directory(cls, database_pool) -> Path:
+        """
+        Gives the cache folder for a FingerprintPool. Pool ids are only
+        unique within a single database, so caches are grouped by database.
+        """
+        from simmate.configuration.django.settings import DATABASES
+
+        database = DATABASES["default"]
+        database_label = hashlib.sha256(
+            f"{database['ENGINE']}{database.get('HOST')}{database['NAME']}".encode()
+        ).hexdigest()[:16]
+        return get_directory(
+            cls.base_directory / database_label / f"pool-{database_pool.id}"
+        )
+
+    # -------------------------------------------------------------------------
+    # Reading the cache
+    # -------------------------------------------------------------------------
+
+    def get_metadata(self) -> dict:
+        """
+        Loads the metadata of the cache. If the cache is empty or was made for
+        a different pool (e.g. the database was reset and pool ids reused),
+        then an empty cache is returned.
+        """
+        empty_metadata = dict(
+            pool_created_at=self.database_pool.created_at.isoformat(),
+            nrows=0,
+            nfeatures=None,
+            watermark=None,
+        )
+        if not self.metadata_filename.exists():
+            return empty_metadata
+
+        with self.metadata_filename.open() as file:
+            metadata = json.load(file)
+
+        if metadata["pool_created_at"] != empty_metadata["pool_created_at"]:
+            return empty_metadata
+        return metadata
+
+    def load(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Memory-maps the cache and returns the database ids and fingerprints
+        as read-only arrays.
+        """
+        metadata = self.get_metadata()
+        nrows = metadata["nrows"]
+        if not nrows:
+            return numpy.array([], dtype=numpy.int64), numpy.array([])
+
+        database_ids = numpy.memmap(
+            self.database_ids_filename,
+            dtype=numpy.int64,
+            mode="r",
+            shape=(nrows,),
+        )
+        fingerprints = numpy.memmap(
+            self.fingerprints_filename,
+            dtype=numpy.float64,
+            mode="r",
+            shape=(nrows, metadata["nfeatures"]),
+        )
+        return database_ids, fingerprints
+
+    # -------------------------------------------------------------------------
+    # Writing to the cache
+    # -------------------------------------------------------------------------
+
+    @contextmanager
+    def lock(self):
+        """
+        Prevents multiple processes from updating the cache at the same time
+        """
+        with (self.directory / "update.lock").open("w") as file:
+            if fcntl:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    def update(self):
+        """
+        Appends all fingerprints that were added to the database pool since
+        the last update.
+        """
+        from simmate.database.base_data_types import Fingerprint
+
+        with self.lock():
+            metadata = self.get_metadata()
+
+            # a reset cache may still have files from an old pool
+            if not metadata["nrows"]:
+                self.fingerprints_filename.unlink(missing_ok=True)
+                self.database_ids_filename.unlink(missing_ok=True)
+
+            query = self.database_pool.fingerprints.order_by("created_at")
+            if metadata["watermark"]:
+                watermark = datetime.fromisoformat(metadata["watermark"])
+                query = query.filter(created_at__gte=watermark - self.watermark_overlap)
+
+            cached_ids = set(self.load()[0].tolist())
+            watermark = metadata["watermark"]
+            new_ids = []
+            new_fingerprints = []
+            for database_id, fingerprint_binary, created_at in query.values_list(
+                "database_id", "fingerprint_binary", "created_at"
+            ).iterator(chunk_size=2000):
+                watermark = created_at.isoformat()
+                if database_id in cached_ids or fingerprint_binary is None:
+                    continue
+                cached_ids.add(database_id)
+                new_ids.append(database_id)
+                new_fingerprints.append(
+                    Fingerprint.decode_fingerprint(fingerprint_binary)
+                )
+
+            if new_ids:
+                new_fingerprints = numpy.asarray(new_fingerprints, dtype=numpy.float64)
+                if metadata["nfeatures"] is None:
+                    metadata["nfeatures"] = new_fingerprints.shape[1]
+
+                # the files are truncated to the rows in the metadata in case
+                # a previous update crashed after only writing some rows
+                self._append(
+                    self.database_ids_filename,
+                    numpy.asarray(new_ids, dtype=numpy.int64),
+                    offset=metadata["nrows"] * 8,
+                )
+                self._append(
+                    self.fingerprints_filename,
+                    new_fingerprints,
+                    offset=metadata["nrows"] * metadata["nfeatures"] * 8,
+                )
+                metadata["nrows"] += len(new_ids)
+                logging.info(f"Added {len(new_ids)} fingerprint(s) to the cache")
+
+            metadata["watermark"] = watermark
+            self._write_metadata(metadata)
+
+    @staticmethod
+    def _append(filename: Path, data: numpy.ndarray, offset: int):
+        with filename.open("ab") as file:
+            file.truncate(offset)
+            file.write(data.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _write_metadata(self, metadata: dict):
+        # writing to a separate file and then renaming it is atomic, so
+        # readers always see either the old or the new metadata
+        temp_filename = self.metadata_filename.with_suffix(".tmp")
+        with temp_filename.open("w") as file:
+            json.dump(metadata, file)
+        os.replace(temp_filename, self.metadata_filename)
+
+    def delete(self):
+        """
+        Removes all files of this cache
+        """
+        with self.lock():
+            for filename in [
+                self.fingerprints_filename,
+                self.database_ids_filename,
+                self.metadata_filename,
+            ]:
+                filename.unlink(missing_ok=True)
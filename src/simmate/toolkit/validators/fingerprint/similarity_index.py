@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""
+Backends for finding whether a fingerprint has a close match in a pool of
+fingerprints. These are used by `FingerprintValidator`, where the pool can
+grow to tens of thousands of fingerprints over an evolutionary search.
+
+All indexes store their fingerprints in a single array that grows in size
+by doubling (rather than copying the full array with each `numpy.append`).
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy
+from scipy.spatial import cKDTree
+
+
+class FingerprintIndex(ABC):
+    """
+    Abstract base class for a pool of fingerprints that can be searched for
+    close matches. Subclasses must define `has_match`.
+    """
+
+    block_size: int = 4096
+    """
+    The number of fingerprints to compare at once. This limits the memory
+    used when comparing against very large pools.
+    """
+
+    def __init__(self):
+        self._array = None
+        self.size = 0
+
+    @property
+    def fingerprints(self) -> numpy.ndarray:
+        """
+        A 2D array of all fingerprints in the pool (in the order they were added)
+        """
+        if self._array is None:
+            return numpy.array([])
+        return self._array[: self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, fingerprint: numpy.ndarray):
+        """
+        Adds a single fingerprint to the pool
+        """
+        self.add_many([fingerprint])
+
+    def add_many(self, fingerprints: list[numpy.ndarray]):
+        """
+        Adds many fingerprints to the pool
+        """
+        fingerprints = numpy.asarray(fingerprints, dtype=float)
+        if fingerprints.size == 0:
+            return
+        nnew = len(fingerprints)
+
+        if self._array is None:
+            self._array = numpy.empty((max(nnew, 16), fingerprints.shape[1]))
+        elif self.size + nnew > len(self._array):
+            # grow by doubling so that adding N fingerprints one at a time
+            # only takes O(N) copies in total
+            capacity = max(2 * len(self._array), self.size + nnew)
+            new_array = numpy.empty((capacity, self._array.shape[1]))
+            new_array[: self.size] = self._array[: self.size]
+            self._array = new_array
+
+        self._array[self.size : self.size + nnew] = fingerprints
+        self.size += nnew
+        self._on_add(self.size - nnew)
+
+    def _on_add(self, start: int):
+        """
+        Called after fingerprints are added, starting at index `start`. This
+        lets subclasses update any extra data they store.
+        """
+        pass
+
+    @abstractmethod
+    def has_match(self, fingerprint: numpy.ndarray, tolerance: float) -> bool:
+        """
+        Whether any fingerprint in the pool has a distance below the tolerance
+        """
+        pass
+
+
+class EuclideanIndex(FingerprintIndex):
+    """
+    Compares fingerprints by euclidean distance (the same as
+    `numpy.linalg.norm(fingerprint1 - fingerprint2)`), where the pool is
+    compared in blocks using vectorized numpy operations.
+    """
+
+    def has_match(self, fingerprint: numpy.ndarray, tolerance: float) -> bool:
+        return self._has_match_in_range(fingerprint, tolerance, 0, self.size)
+
+    def _has_match_in_range(
+        self,
+        fingerprint: numpy.ndarray,
+        tolerance: float,
+        start: int,
+        end: int,
+    ) -> bool:
+        fingerprint = numpy.asarray(fingerprint, dtype=float)
+        for block_start in range(start, end, self.block_size):
+            block = self._array[block_start : min(block_start + self.block_size, end)]
+            # comparing squared distances avoids a square root for every entry
+            distances = numpy.sum((block - fingerprint) ** 2, axis=1)
+            if (distances < tolerance**2).any():
+                return True
+        return False
+
+
+class KDTreeIndex(EuclideanIndex):
+    """
+    Compares fingerprints by euclidean distance using a KD-tree. This gives
+    the fastest searches when fingerprints have only a few dimensions, but
+    for long fingerprints (>~20 features) `EuclideanIndex` is often faster.
+
+    Rebuilding the tree with each new fingerprint would be slow. Instead,
+    new fingerprints are kept in a small "tail" that is compared directly,
+    and the tree is only rebuilt once the tail grows too large.
+    """
+
+    rebuild_fraction: float = 0.1
+    """
+    The tree is rebuilt once the tail is larger than this fraction of the
+    fingerprints in the tree
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._tree = None
+        self._tree_size = 0
+
+    def _on_add(self, start: int):
+        ntail = self.size - self._tree_size
+        if ntail > max(self.rebuild_fraction * self._tree_size, self.block_size):
+            self._tree = cKDTree(self._array[: self.size])
+            self._tree_size = self.size
+
+    def has_match(self, fingerprint: numpy.ndarray, tolerance: float) -> bool:
+        if self._tree is not None:
+            distance, _ = self._tree.query(fingerprint, k=1)
+            if distance < tolerance:
+                return True
+        return self._has_match_in_range(
+            fingerprint, tolerance, self._tree_size, self.size
+        )
+
+
+class CosineIndex(FingerprintIndex):
+    """
+    Compares fingerprints by cosine distance (the same as
+    `scipy.spatial.distance.cosine`). A normalized copy of every fingerprint
+    is stored, so that the distances to the full pool are a single
+    matrix-vector product.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._normalized = None
+
+    def _on_add(self, start: int):
+        if self._normalized is None or len(self._normalized) != len(self._array):
+            normalized = numpy.empty_like(self._array)
+            if self._normalized is not None:
+                normalized[:start] = self._normalized[:start]
+            self._normalized = normalized
+        self._normalized[start : self.size] = self._normalize(
+            self._array[start : self.size]
+        )
+
+    @staticmethod
+    def _normalize(fingerprints: numpy.ndarray) -> numpy.ndarray:
+        # zero vectors give NaN, which never counts as a match (this matches
+        # the behavior of scipy)
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            norms = numpy.linalg.norm(fingerprints, axis=-1, keepdims=True)
+            return fingerprints / norms
+
+    def has_match(self, fingerprint: numpy.ndarray, tolerance: float) -> bool:
+        fingerprint = self._normalize(numpy.asarray(fingerprint, dtype=float))
+        for block_start in range(0, self.size, self.block_size):
+            block_end = min(block_start + self.block_size, self.size)
+            block = self._normalized[block_start:block_end]
+            distances = 1 - block @ fingerprint
+            if (distances < tolerance).any():
+                return True
+        return False
+
+
+class CustomIndex(FingerprintIndex):
+    """
+    Compares fingerprints one at a time using a custom distance function. This
+    is the slowest option and is only used when no vectorized index applies.
+    """
+
+    def __init__(self, distance_function: callable):
+        super().__init__()
+        self.distance_function = distance_function
+
+    def has_match(self, fingerprint: numpy.ndarray, tolerance: float) -> bool:
+        for fingerprint2 in self.fingerprints:
+            if self.distance_function(fingerprint, fingerprint2) < tolerance:
+                return True
+        return False
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from simmate.database.base_data_types import Fingerprint, FingerprintPool
+from simmate.toolkit.validators.fingerprint.cache import FingerprintCache
+
+
+@pytest.mark.django_db
+def test_fingerprint_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(FingerprintCache, "base_directory", tmp_path)
+
+    pool = FingerprintPool.objects.create(method="test", database_table="Test")
+    Fingerprint.objects.bulk_create(
+        [Fingerprint(pool=pool, database_id=i, fingerprint_array=[i, i]) for i in [3, 1]]
+    )
+
+    cache = FingerprintCache(pool)
+    cache.update()
+    database_ids, fingerprints = cache.load()
+    assert database_ids.tolist() == [3, 1]
+    assert fingerprints.tolist() == [[3, 3], [1, 1]]
+
+    # only new rows are appended, and rows already cached are skipped
+    Fingerprint.objects.create(pool=pool, database_id=2, fingerprint_array=[2, 2])
+    cache.update()
+    database_ids, fingerprints = cache.load()
+    assert database_ids.tolist() == [3, 1, 2]
+    assert fingerprints.tolist() == [[3, 3], [1, 1], [2, 2]]
+
+    # a new cache object (e.g. in another process) reads the same files
+    assert FingerprintCache(pool).load()[0].tolist() == [3, 1, 2]
+
+    # a cache left over from a deleted pool is ignored
+    pool_id = pool.id
+    pool.delete()
+    new_pool = FingerprintPool.objects.create(id=pool_id, method="test")
+    assert FingerprintCache(new_pool).load()[0].tolist() == []
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+from simmate.toolkit.validators.fingerprint import RdfFingerprint
+
+
+def test_parallel_featurization(sample_structures, monkeypatch):
+    structures = list(sample_structures.values())
+
+    validator = RdfFingerprint(structure_pool=structures)
+
+    # use tiny chunks so that structures are split across several processes
+    monkeypatch.setattr(RdfFingerprint, "featurize_chunk_size", 2)
+    validator_parallel = RdfFingerprint(structure_pool=structures, nprocesses=2)
+
+    # results must be identical and in the same order
+    assert (validator_parallel.fingerprint_pool == validator.fingerprint_pool).all()
+    assert validator_parallel.source_pool == validator.source_pool
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from scipy.spatial.distance import cosine
+
+from simmate.toolkit.validators.fingerprint.similarity_index import (
+    CosineIndex,
+    CustomIndex,
+    EuclideanIndex,
+    FingerprintIndex,
+    KDTreeIndex,
+)
+
+
+@pytest.mark.parametrize(
+    "index_class, distance_function",
+    [
+        (EuclideanIndex, lambda fp1, fp2: numpy.linalg.norm(fp1 - fp2)),
+        (KDTreeIndex, lambda fp1, fp2: numpy.linalg.norm(fp1 - fp2)),
+        (CosineIndex, cosine),
+    ],
+)
+def test_similarity_index(index_class, distance_function):
+    generator = numpy.random.default_rng(seed=1)
+    fingerprints = generator.random((500, 5))
+    queries = generator.random((200, 5))
+    tolerance = 0.2 if index_class != CosineIndex else 0.01
+
+    # use small blocks so that block edges and tree rebuilds are tested
+    index = index_class()
+    index.block_size = 32
+    # mix single and bulk additions to test the array growth
+    index.add(fingerprints[0])
+    index.add_many(fingerprints[1:300])
+    for fingerprint in fingerprints[300:]:
+        index.add(fingerprint)
+    assert len(index) == 500
+    assert (index.fingerprints == fingerprints).all()
+
+    # the result must match a brute-force loop with the original distance
+    reference = CustomIndex(distance_function)
+    reference.add_many(fingerprints)
+    for query in queries:
+        assert index.has_match(query, tolerance) == reference.has_match(
+            query, tolerance
+        )
+
+
+def test_cosine_zero_vector():
+    index = CosineIndex()
+    index.add_many([[0, 0, 0], [1, 0, 0]])
+    assert not index.has_match([0, 0, 0], 0.1)
+    assert index.has_match([2, 0, 0], 0.1)
+
+
+def test_abstract_index():
+    # subclasses must define has_match
+    class IncompleteIndex(FingerprintIndex):
+        pass
+
+    with pytest.raises(TypeError):
+        FingerprintIndex()
+    with pytest.raises(TypeError):
+        IncompleteIndex()
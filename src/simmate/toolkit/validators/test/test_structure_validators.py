@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from simmate.toolkit import Composition
+from simmate.toolkit.validators.structure import (
+    FastSiteDistance,
+    FastSiteDistanceMatrix,
+    SiteDistance,
+    SiteDistanceMatrix,
+)
+
+
+@pytest.mark.parametrize("packing_factor", [0.5, 1.5])
+def test_fast_site_distance_matrix(sample_structures, packing_factor):
+    for structure in sample_structures.values():
+        composition = Composition(structure.composition)
+        # compressing the lattice gives structures that fail the check too
+        for scale in [1, 0.1]:
+            structure_scaled = structure.copy()
+            structure_scaled.scale_lattice(structure.volume * scale)
+
+            validator = SiteDistanceMatrix(
+                composition,
+                packing_factor=packing_factor,
+            )
+            validator_fast = FastSiteDistanceMatrix(
+                composition,
+                packing_factor=packing_factor,
+            )
+            assert validator_fast.check_structure(
+                structure_scaled
+            ) == validator.check_structure(structure_scaled)
+
+
+def test_fast_site_distance(sample_structures):
+    for structure in sample_structures.values():
+        if len(structure) < 2:
+            continue
+        for cutoff in [0.5, 2, 3]:
+            assert FastSiteDistance(cutoff).check_structure(structure) == SiteDistance(
+                cutoff
+            ).check_structure(structure)
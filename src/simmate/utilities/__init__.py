@@ -16,5 +16,6 @@ from .other import (
     get_class,
     get_conda_env,
     get_latest_version,
+    init_worker_process,
     str_to_datatype,
 )
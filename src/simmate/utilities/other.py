@@ -239,3 +239,31 @@ def get_app_submodule(
     has_submodule = importlib.util.find_spec(submodule_path) is not None
 
     return submodule_path if has_submodule else None
+
+
+_inherited_connections = None
+
+
+def init_worker_process():
+    """
+    Prepares a new process (e.g. of a `ProcessPoolExecutor`) for work that
+    may use the database, such as calculating the columns of database entries
+    or featurizing structures. Give this as the `initializer` of the pool.
+
+    On Linux, new processes are forked and therefore inherit the open database
+    connections of the main process. These connections must never be used (or
+    closed) by this process, as that would break the connection of the main
+    process. We therefore set them aside and give this process its own
+    connections, which django opens only if a query is made.
+    """
+    global _inherited_connections
+
+    from django.db import connections
+    from django.utils.connection import Local
+
+    # when processes are spawned instead (windows & mac), django must be
+    # set up again. This does nothing if django is already set up.
+    from simmate.database import connect  # noqa: F401
+
+    _inherited_connections = connections._connections
+    connections._connections = Local(connections.thread_critical)
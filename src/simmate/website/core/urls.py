@@ -69,6 +69,13 @@ urlpatterns = [
         name="workflows",
     ),
     #
+    # Status of the workflow engine (the queue and its workers)
+    path(
+        route="engine/",
+        view=include("simmate.website.engine.urls"),
+        name="engine",
+    ),
+    #
     # This app includes core functionality, such as views for crystal structures
     # in a 3D viewport.
     path(
@@ -29,10 +29,7 @@ def structure_to_url(structure):
     if isinstance(structure, DatabaseStructure):
         structure_string = structure.structure
     elif isinstance(structure, ToolkitStructure):
-        # !!! This code should be located within a method on the toolkit class
-        storage_format = "POSCAR" if structure.is_ordered else "CIF"
-        structure_string = structure.to(fmt=storage_format)
-        # !!!
+        structure_string = structure.to_database_string()
     else:
         raise Exception("Unknown format provided.")
 
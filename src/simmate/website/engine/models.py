@@ -4,4 +4,9 @@
 # they are located at. I do this based on the directions given by:
 # https://docs.djangoproject.com/en/3.1/topics/db/models/#organizing-models-in-a-package
 
-from simmate.engine.execution.database import WorkItem
+from simmate.engine.execution.database import (
+    WorkerRecord,
+    WorkItem,
+    WorkItemArchive,
+    WorkItemPayload,
+)
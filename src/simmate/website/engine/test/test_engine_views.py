@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from pytest_django.asserts import assertTemplateUsed
+
+from simmate.engine.execution import WorkerRecord
+
+
+@pytest.mark.django_db
+def test_engine_status_view(client):
+    WorkerRecord.objects.create(hostname="test-host", tags=["simmate"])
+    response = client.get("/engine/")
+    assert response.status_code == 200
+    assertTemplateUsed(response, "engine/status.html")
+    assert b"test-host" in response.content
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+from django.urls import path
+
+from simmate.website.engine import views
+
+urlpatterns = [
+    #
+    # Summary of the queue and the workers that are currently running
+    path(
+        route="",
+        view=views.engine_status,
+        name="engine_status",
+    ),
+]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from django.db.models import Count
+from django.shortcuts import render
+
+from simmate.engine.execution import WorkerRecord, WorkItem
+
+
+def engine_status(request):
+    # count the workitems of each status with a single query
+    status_counts = {status.label: 0 for status in WorkItem.StatusOptions}
+    for entry in WorkItem.objects.values("status").annotate(count=Count("id")):
+        label = WorkItem.StatusOptions(entry["status"]).label
+        status_counts[label] = entry["count"]
+
+    context = {
+        "status_counts": status_counts,
+        "workers": WorkerRecord.get_active().order_by("id").all(),
+    }
+    template = "engine/status.html"
+    return render(request, template, context)